@@ -0,0 +1,66 @@
+''' DataFrame-build benchmark: time to turn N workouts into the processed DataFrame.
+
+Compares the old path (`create_dictionary()` per workout, `pd.DataFrame` from the list of
+dicts, then `astype(DF_DTYPES_DICT)`) against `make_workouts_dataframe`, and checks that
+both produce the same frame.  Workouts are synthesized from the sample workouts in
+`data/workouts` (see `bench_ingest`), so no database is needed.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_dataframe [N ...]
+'''
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from benchmarks.bench_ingest import make_documents
+from peloton.handlers.dataframe_builder import make_workouts_dataframe
+from peloton.helpers.constants import DF_DTYPES_DICT
+from peloton.models import PelotonWorkoutData
+
+DEFAULT_SIZES = (1_000, 5_000, 20_000)
+
+
+def make_workouts(num_workouts: int) -> list[PelotonWorkoutData]:
+    ''' `num_workouts` workouts, each starting a day after the last (so the sort order is unambiguous). '''
+    documents = make_documents(num_workouts)
+    first_start = datetime.fromisoformat(documents[0]['summary']['start_time'])
+    for i, document in enumerate(documents):
+        start_time = first_start + timedelta(days=i)
+        document['summary']['start_time'] = start_time.isoformat(timespec='seconds')
+        document['summary']['end_time'] = (start_time + timedelta(minutes=30)).isoformat(timespec='seconds')
+    return [PelotonWorkoutData(**document) for document in documents]
+
+
+def make_dataframe_from_dicts(workouts: list[PelotonWorkoutData]) -> pd.DataFrame:
+    ''' The DataFrame build as `PelotonProcessor.make_dataframe` used to do it. '''
+    output_df = (pd.DataFrame([workout.create_dictionary() for workout in workouts])
+                 .dropna(axis='columns', how='all')
+                 .drop(columns=['duration'], errors='ignore')
+                 .sort_values(by='start_time')
+                 .reset_index(drop=True))
+    return output_df.astype({key: value for key, value in DF_DTYPES_DICT.items() if key in output_df.columns},
+                            errors='ignore')
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"{'workouts':>9} | {'create_dictionary':>17} | {'column-wise':>11} | {'speedup':>7}")
+    for num_workouts in sizes:
+        workouts = make_workouts(num_workouts)
+
+        start = time.perf_counter()
+        expected_df = make_dataframe_from_dicts(workouts)
+        old_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        output_df = make_workouts_dataframe(workouts)
+        new_seconds = time.perf_counter() - start
+
+        pd.testing.assert_frame_equal(output_df, expected_df)
+        print(f"{num_workouts:>9} | {old_seconds:>16.2f}s | {new_seconds:>10.2f}s | {old_seconds / new_seconds:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+''' Startup-ingest benchmark: time to turn N stored workout documents into `PelotonWorkoutData`.
+
+Compares full pydantic validation (what `ingest_workouts` does) against a trusted path that
+rebuilds the same models with `model_construct` (recursively, converting the stored ISO 
+timestamps back to datetimes) after checking only a schema version.  The documents are already
+deserialized and in memory, in the shape ingest reads them (no raw payloads, no per-interval 
+series), so only model construction is timed.  They're synthesized from the sample workouts in 
+`data/workouts`, so no database is needed.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_ingest [N ...]
+'''
+import json
+import sys
+import time
+import types
+import uuid
+from datetime import datetime
+from functools import cache
+from pathlib import Path
+from typing import Any, Callable, Union, get_args, get_origin
+
+from pydantic import BaseModel
+
+from peloton.helpers.constants import EASTERN_TIME
+from peloton.models import PelotonWorkoutData
+
+SAMPLE_DIR = Path(__file__).resolve().parent.parent.joinpath('data', 'workouts')
+DEFAULT_SIZES = (1_000, 5_000, 20_000)
+RAW_PAYLOAD_FIELDS = ('summary_raw', 'metrics_raw')
+SCHEMA_VERSION = 1
+
+
+def make_documents(num_workouts: int) -> list[dict]:
+    ''' `num_workouts` stored-format documents (as `model_dump()` writes them, minus the raw 
+    payloads & metric series), each with its own ID. '''
+    samples = []
+    for file in sorted(SAMPLE_DIR.glob('*.json')):
+        document = PelotonWorkoutData.model_validate_json(file.read_text()).model_dump(exclude=set(RAW_PAYLOAD_FIELDS))
+        for metric in document['metrics']['metrics']:
+            metric.pop('values', None)
+        samples.append({**document, 'schema_version': SCHEMA_VERSION})
+    documents = []
+    for i in range(num_workouts):
+        document = json.loads(json.dumps(samples[i % len(samples)]))   # deep copy, like a fresh DB read
+        workout_id = uuid.uuid4().hex
+        document['workout_id'] = document['summary']['workout_id'] = document['metrics']['workout_id'] = workout_id
+        documents.append(document)
+    return documents
+
+
+def _parse_datetime(value: Any) -> Any:
+    return datetime.fromisoformat(value).astimezone(tz=EASTERN_TIME) if isinstance(value, str) else value
+
+
+def _make_converter(annotation: Any) -> Callable[[Any], Any] | None:
+    ''' How to turn a stored value of type `annotation` back into its in-memory form (`None` = as-is). '''
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return lambda value: construct_model(annotation, value) if isinstance(value, dict) else value
+    origin = get_origin(annotation)
+    if origin is list:
+        item_converter = _make_converter(get_args(annotation)[0])
+        if item_converter is None:
+            return None
+        return lambda value: [item_converter(item) for item in value] if isinstance(value, list) else value
+    if origin is Union or origin is types.UnionType:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if datetime in args:
+            return _parse_datetime
+        converters = [converter for converter in map(_make_converter, args) if converter is not None]
+        return converters[0] if len(converters) == 1 else None
+    return None
+
+
+@cache
+def _get_converters(model_cls: type[BaseModel]) -> tuple[tuple[str, Callable | None], ...]:
+    return tuple((name, _make_converter(field.annotation)) for name, field in model_cls.model_fields.items())
+
+
+def construct_model(model_cls: type[BaseModel], data: dict) -> BaseModel:
+    return model_cls.model_construct(**{name: converter(data[name]) if converter is not None else data[name]
+                                        for name, converter in _get_converters(model_cls) if name in data})
+
+
+def load_trusted(document: dict) -> PelotonWorkoutData:
+    if document.get('schema_version') != SCHEMA_VERSION:
+        return load_validated(document)
+    return construct_model(PelotonWorkoutData, document)
+
+
+def load_validated(document: dict) -> PelotonWorkoutData:
+    return PelotonWorkoutData(**{key: value for key, value in document.items() if key != 'schema_version'})
+
+
+def time_load(documents: list[dict], load_func: Callable[[dict], PelotonWorkoutData]) -> float:
+    start = time.perf_counter()
+    for document in documents:
+        load_func(document)
+    return time.perf_counter() - start
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"{'workouts':>9} | {'validated':>9} | {'model_construct':>15} | {'speedup':>7}")
+    for num_workouts in sizes:
+        documents = make_documents(num_workouts)
+        validated = time_load(documents, load_validated)
+        trusted = time_load(documents, load_trusted)
+        print(f"{num_workouts:>9} | {validated:>8.2f}s | {trusted:>14.2f}s | {validated / trusted:>6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+''' JSON-encoding benchmark: payload size and p50/p99 latency of each DataFrame-backed endpoint's body.
+
+Compares the old path (`JSONResponse(json.loads(df.to_json(orient='records')))`, i.e. encode,
+decode, encode again) against `PelotonJSONResponse` in each layout (`records`, `columns`,
+`ndjson`), and checks that `records` decodes to the same objects as before.  The payloads are
+synthetic stand-ins for `/dataframe` (N processed workouts), `/month_table` and `/line_chart`
+(a 45-minute ride at 5-second resolution), so no database is needed.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_json [N ...]
+'''
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi.responses import JSONResponse
+
+from benchmarks.bench_dataframe import make_workouts
+from benchmarks.bench_pivots import make_rows
+from peloton.handlers import PelotonPivots
+from peloton.handlers.dataframe_builder import make_workouts_dataframe
+from peloton.helpers.responses import PelotonJSONResponse
+
+DEFAULT_SIZES = (1_000, 5_000)
+REPEATS = 50
+LAYOUTS = ('records', 'columns', 'ndjson')
+
+
+def make_line_chart_df(seconds: int = 45 * 60, seed: int = 0) -> pd.DataFrame:
+    ''' A `/line_chart` payload: one row per 5 seconds, five metrics plus the timestamp. '''
+    rng = np.random.default_rng(seed)
+    num_rows = seconds // 5
+    return pd.DataFrame({
+        'datetime': pd.date_range('2024-01-01 07:00', periods=num_rows, freq='5s', tz='America/New_York'),
+        'output': rng.integers(80, 300, size=num_rows),
+        'cadence': rng.integers(60, 110, size=num_rows),
+        'resistance': rng.integers(30, 60, size=num_rows),
+        'speed': rng.uniform(15, 25, size=num_rows),
+        'heart_rate': rng.uniform(110, 175, size=num_rows),
+    })
+
+
+def time_percentiles(func, repeats: int = REPEATS) -> tuple[float, float]:
+    ''' p50 & p99 wall time of `func()`, in milliseconds. '''
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    return float(np.percentile(seconds, 50)) * 1000, float(np.percentile(seconds, 99)) * 1000
+
+
+def make_payloads(sizes: list[int]) -> dict[str, pd.DataFrame]:
+    payloads = {f"/dataframe ({num_workouts})": make_workouts_dataframe(make_workouts(num_workouts))
+                for num_workouts in sizes}
+    payloads['/month_table'] = PelotonPivots(make_rows(10_000)).month_table
+    payloads['/line_chart'] = make_line_chart_df()
+    return payloads
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"{'endpoint':>18} | {'encoder':>18} | {'size':>9} | {'p50':>8} | {'p99':>8}")
+    for endpoint, df in make_payloads(sizes).items():
+        old_body = JSONResponse(json.loads(df.to_json(orient='records'))).body
+        assert json.loads(PelotonJSONResponse(df).body) == json.loads(old_body)
+
+        encoders = {'json.loads + dumps': lambda: JSONResponse(json.loads(df.to_json(orient='records'))).body}
+        for layout in LAYOUTS:
+            encoders[f"direct ({layout})"] = lambda layout=layout: PelotonJSONResponse(df, layout=layout).body
+        for encoder, func in encoders.items():
+            p50, p99 = time_percentiles(func)
+            print(f"{endpoint:>18} | {encoder:>18} | {len(func()) / 1024:>7.0f}kB | "
+                  f"{p50:>6.1f}ms | {p99:>6.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
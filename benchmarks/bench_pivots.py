@@ -0,0 +1,89 @@
+''' Pivot benchmark: time to derive the calendar columns and build the year & month tables.
+
+Compares the old path (a list comprehension over Timestamps per calendar column, then
+`pivot_table` with `pd.Series.nunique`) against `PelotonPivots`, and checks that both
+produce the same tables.  Rows are synthetic processed-DataFrame rows, so no database
+is needed.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_pivots [N ...]
+'''
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from peloton.handlers import PelotonPivots
+from peloton.helpers.constants import EASTERN_TIME
+
+DEFAULT_SIZES = (10_000, 100_000)
+TABLE_AGGFUNCS = {'title': 'count', 'date': pd.Series.nunique, 'hours': 'sum',
+                  'calories': 'mean', 'distance': 'sum', 'output/min': 'mean'}
+TABLE_COLUMNS = {'date': 'days', 'title': 'rides', 'calories': 'avg_calories', 'hours': 'total_hours',
+                 'distance': 'total_miles', 'output/min': 'avg_output/min'}
+
+
+def make_rows(num_rows: int, seed: int = 0) -> pd.DataFrame:
+    ''' `num_rows` processed-DataFrame rows (just the columns the pivots use), spread over ~10 years. '''
+    rng = np.random.default_rng(seed)
+    start_seconds = np.sort(rng.integers(1_500_000_000, 1_820_000_000, size=num_rows))
+    calories = rng.normal(400, 80, size=num_rows)
+    calories[rng.random(num_rows) < 0.05] = np.nan
+    return pd.DataFrame({
+        'start_time': pd.to_datetime(start_seconds, unit='s', utc=True).tz_convert(EASTERN_TIME),
+        'title': pd.array([f"{minutes} min Ride" for minutes in rng.choice([20, 30, 45], size=num_rows)],
+                          dtype='string'),
+        'calories': calories,
+        'distance': rng.uniform(3, 15, size=num_rows),
+        'output_per_min': rng.uniform(5, 10, size=num_rows),
+        'duration_hrs': rng.choice([1/3, 1/2, 3/4], size=num_rows),
+    })
+
+
+def make_tables_with_pivot_table(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    ''' The year & month tables as `PelotonPivots` used to build them. '''
+    df = df.copy()
+    df_dti_localized = pd.DatetimeIndex(df['start_time']).tz_convert(tz=EASTERN_TIME)
+    df_dti = df_dti_localized.tz_localize(tz=None)
+    df['annual_periods'] = [x.to_period(freq='Y') for x in df_dti]
+    df['monthly_periods'] = [x.to_period(freq='M') for x in df_dti]
+    df['weekly_periods'] = [x.to_period(freq='W') for x in df_dti]
+    df['month'] = [x.month_name() + " " + str(x.year) for x in df_dti_localized]
+    df['year'] = [x.year for x in df_dti_localized]
+    df['days'] = [x.day for x in df_dti_localized]
+    df['date'] = [f"{str(x.year)}-{str(x.month)}-{str(x.day)}" for x in df_dti_localized]
+    df = df.rename(columns={'duration_hrs': 'hours', 'output_per_min': 'output/min'})
+
+    tables = []
+    for index, label in [(['annual_periods', 'year'], 'year'),
+                         (['annual_periods', 'monthly_periods', 'month'], 'month')]:
+        table = df.pivot_table(values=list(TABLE_AGGFUNCS), index=index, aggfunc=TABLE_AGGFUNCS)
+        table = table.sort_values(by=[index[-2] if label == 'month' else index[0]])
+        table = table.reset_index().drop(columns=index[:-1]).round(2).rename(columns=TABLE_COLUMNS)
+        tables.append(table.reindex(columns=[label, 'rides', 'days', 'total_hours', 'total_miles',
+                                             'avg_calories', 'avg_output/min']))
+    return tables[0], tables[1]
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"{'rows':>9} | {'pivot_table':>11} | {'PelotonPivots':>13} | {'speedup':>7}")
+    for num_rows in sizes:
+        df = make_rows(num_rows)
+
+        start = time.perf_counter()
+        expected_year_table, expected_month_table = make_tables_with_pivot_table(df)
+        old_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pivots = PelotonPivots(df)
+        new_seconds = time.perf_counter() - start
+
+        pd.testing.assert_frame_equal(pivots.year_table, expected_year_table, check_dtype=False)
+        pd.testing.assert_frame_equal(pivots.month_table, expected_month_table, check_dtype=False)
+        print(f"{num_rows:>9} | {old_seconds:>10.2f}s | {new_seconds:>12.2f}s | {old_seconds / new_seconds:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import argparse
+from contextlib import asynccontextmanager
 from zoneinfo import ZoneInfo
 
 from fastapi import FastAPI
@@ -6,16 +7,23 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 
-from peloton.api import router, peloton
+from peloton.api import router, peloton, sync_manager
 from peloton.helpers.constants import (STATIC_DIR, 
-                                       WORKOUT_IMAGES_DIR, 
-                                       ACHIEVEMENT_IMAGES_DIR)
+                                       ACHIEVEMENT_IMAGES_DIR,
+                                       PELOTON_SYNC_INTERVAL_MINUTES)
 
 LOCAL_TZ = ZoneInfo('America/New_York')
 
 origins = ["*"]
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if PELOTON_SYNC_INTERVAL_MINUTES > 0:
+        sync_manager.start_scheduler(interval_seconds=(PELOTON_SYNC_INTERVAL_MINUTES * 60))
+    yield
+    sync_manager.stop_scheduler()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,10 +37,6 @@ app.mount('/static',
           StaticFiles(directory=STATIC_DIR, follow_symlink=True), 
           name='static')
 
-app.mount('/workout_images', 
-          StaticFiles(directory=WORKOUT_IMAGES_DIR, follow_symlink=True), 
-          name='workout_images')
-
 app.mount('/achievement_images', 
           StaticFiles(directory=ACHIEVEMENT_IMAGES_DIR, follow_symlink=True), 
           name='achievement_images')
@@ -1 +1 @@
-from .routes import router, peloton
\ No newline at end of file
+from .routes import router, peloton, sync_manager
\ No newline at end of file
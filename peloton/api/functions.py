@@ -1,10 +1,12 @@
+from typing import Callable, Hashable
 from zoneinfo import ZoneInfo
 
 import pandas as pd
-from fastapi import Request
+from fastapi import Request, Response
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
+from peloton.handlers.endpoint_cache import PelotonCachedEndpoint, PelotonEndpointCache
 from peloton.models import PelotonDataFrameRow, PelotonPivotTableRow
 
 LOCAL_TZ = ZoneInfo('America/New_York')
@@ -35,7 +37,12 @@ def construct_template_response_pivot(request: Request, df: pd.DataFrame) -> HTM
     
 def construct_template_response_dataframe(request: Request, 
                                           list_of_dicts: list[dict], 
-                                          reverse: bool = True) -> HTMLResponse:
+                                          reverse: bool | None = True,
+                                          next_page_url: str | None = None,
+                                          rows_only: bool = False) -> HTMLResponse:
+    ''' Renders processed-DataFrame rows as `table.html`.  `reverse=None` keeps the rows in the 
+    order given (already sorted); with `next_page_url`, the last row loads the next page when it 
+    scrolls into view, and `rows_only` renders just the `<tr>`s for appending to the table. '''
     desired_columns = ['date', 'time', 'title', 'image_url_html_local_thumb', 'instructor_name', 
                        'total_output', 'output_per_min', 'distance', 'calories', 'effort_score']
     column_headers = ['Date', 'Time', 'Title', 'Image', 'Instructor', 'Output', 'Output/min', 
@@ -45,14 +52,37 @@ def construct_template_response_dataframe(request: Request,
                         .model_validate(row)
                         .model_dump(include=(desired_columns + ['start_time'])) 
                         for row in list_of_dicts]
-    sorted_rows: list[dict] = sorted(rows, key=lambda row: row.get('start_time'), reverse=reverse)
+    sorted_rows: list[dict] = (rows if reverse is None 
+                               else sorted(rows, key=lambda row: row.get('start_time'), reverse=reverse))
     reordered_rows: list[dict] = [{key: row.get(key) for key in desired_columns} for row in sorted_rows]
     
     return templates.TemplateResponse(request=request, 
-                                      name='table.html', 
+                                      name=('table_rows.html' if rows_only else 'table.html'), 
                                       context={'col_header_names': column_headers,
                                                'columns': desired_columns,
-                                               'rows': reordered_rows})
+                                               'rows': reordered_rows,
+                                               'next_page_url': next_page_url})
+
+def construct_cached_response(request: Request,
+                              endpoint_cache: PelotonEndpointCache,
+                              version: int,
+                              make_response: Callable[[], Response],
+                              *key_parts: Hashable) -> Response:
+    ''' `make_response()`'s body, cached under the dataset `version`, the request's path & query 
+    parameters, whether it's an HTMX request and any extra `key_parts`.  Sent with a strong ETag; 
+    a request whose `If-None-Match` matches gets an empty `304 Not Modified`. '''
+    key = (version, request.url.path, tuple(sorted(request.query_params.multi_items())),
+           request.headers.get('hx-request') is not None, *key_parts)
+
+    def make_entry() -> PelotonCachedEndpoint:
+        response = make_response()
+        return PelotonCachedEndpoint.from_body(bytes(response.body), response.media_type)
+
+    entry = endpoint_cache.get_or_create(key, make_entry)
+    headers = {'ETag': entry.etag, 'Cache-Control': 'no-cache', 'Vary': 'HX-Request'}
+    if entry.matches(request.headers.get('if-none-match')):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type=entry.media_type, headers=headers)
 
 
 def main():
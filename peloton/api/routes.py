@@ -1,19 +1,27 @@
-import json
-from datetime import datetime
+import asyncio
+from datetime import date, datetime
 from pathlib import Path
 from typing import Annotated, Union
 
 import pandas as pd
-from fastapi import APIRouter, Header, HTTPException, Request
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from zoneinfo import ZoneInfo
 
 from peloton.api.functions import (rename_columns, 
+                                   construct_cached_response,
                                    construct_template_response_dataframe, 
                                    construct_template_response_pivot)
-from peloton.models import PelotonWorkoutData
+from peloton.models import PelotonDataFrameRow, PelotonWorkoutData
 from peloton import PelotonProcessor
+from peloton.handlers import PelotonEndpointCache, PelotonThumbnailCache
+from peloton.handlers.chart_series import DownsampleMethod
+from peloton.handlers.dataframe_index import DEFAULT_SORT
+from peloton.handlers.sync_jobs import PelotonSyncJob, PelotonSyncManager
+from peloton.handlers.thumbnail_cache import MAX_THUMBNAIL_WIDTH
+from peloton.helpers.constants import DATAFRAME_MAX_PAGE_SIZE, DATAFRAME_PAGE_SIZE, WORKOUT_IMAGES_DIR
+from peloton.helpers.responses import JSONLayout, PelotonJSONResponse, PelotonNDJSONStreamingResponse
 
 LOCAL_TZ = ZoneInfo('America/New_York')
 
@@ -21,6 +29,16 @@ router = APIRouter()
 templates = Jinja2Templates(directory='templates')
 
 peloton = PelotonProcessor()
+thumbnail_cache = PelotonThumbnailCache()
+endpoint_cache = PelotonEndpointCache()
+sync_manager = PelotonSyncManager(sync_func=peloton.check_for_new_workouts, 
+                                  on_finished=lambda job: endpoint_cache.clear())
+
+# Routes that touch the database, the caches or the metrics store (or build DataFrames) are plain
+# `def`, so FastAPI runs them in its threadpool instead of blocking the event loop.
+
+# Peloton gives every image a unique filename, so the bytes behind a given URL never change.
+IMMUTABLE_CACHE_HEADERS = {'Cache-Control': 'public, max-age=31536000, immutable'}
 
 @router.get("/", response_class=HTMLResponse)
 async def index(request: Request):
@@ -31,97 +49,253 @@ async def get_plotly_html(request: Request):
   return templates.TemplateResponse(request=request, name='plotly.html')
 
 @router.get('/dataframe')
-async def get_dataframe(request: Request, 
-                        hx_request: Annotated[Union[str | None], Header()] = None):
+def get_dataframe(request: Request, 
+                  hx_request: Annotated[Union[str | None], Header()] = None,
+                  cursor: str | None = None,
+                  offset: Annotated[int, Query(ge=0)] = 0,
+                  limit: Annotated[int | None, Query(ge=1, le=DATAFRAME_MAX_PAGE_SIZE)] = None,
+                  start: date | None = None,
+                  end: date | None = None,
+                  discipline: str | None = None,
+                  instructor: str | None = None,
+                  title: str | None = None,
+                  sort: str = DEFAULT_SORT,
+                  fields: Annotated[list[str] | None, Query()] = None,
+                  layout: JSONLayout = 'records'):
+    ''' Processed rows, filtered, sorted and paged on the server, e.g. 
+    `?discipline=cycling&title=climb&sort=-total_output&limit=20` (`start`/`end` are inclusive ISO 
+    dates; `instructor` is a name or ID; `fields` can be repeated).  Continue with `cursor=` set to 
+    the previous page's `X-Next-Cursor` header (or with `offset=`).  `layout=columns` sends 
+    `{"columns": [...], "data": [[...]]}`; `layout=ndjson` streams one record per line.
+
+    HTMX requests get `DATAFRAME_PAGE_SIZE` rows at a time, the last of which fetches the next
+    page when it scrolls into view; JSON requests get every matching row unless `limit` is set. '''
+    dataframe_index = peloton.dataset.dataframe_index
+    if dataframe_index is None:
+        return JSONResponse([]) if not hx_request else HTMLResponse('')
+    try:
+        page = dataframe_index.query(start=start, end=end, discipline=discipline, instructor=instructor,
+                                     title=title, sort=sort, cursor=cursor, offset=offset,
+                                     limit=(limit or DATAFRAME_PAGE_SIZE) if hx_request else limit,
+                                     fields=None if hx_request else fields)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
     if hx_request:
-        list_of_dicts = peloton.make_list_of_dicts()
-        return construct_template_response_dataframe(request, list_of_dicts)
+        df = page.rows.reindex(columns=[column for column in PelotonDataFrameRow.model_fields 
+                                        if column in page.rows.columns])
+        list_of_dicts = df.astype(object).where(df.notna(), None).to_dict('records')
+        next_page_url = None
+        if page.next_cursor is not None:
+            next_url = request.url.remove_query_params('offset').include_query_params(cursor=page.next_cursor)
+            next_page_url = f"{next_url.path}?{next_url.query}"
+        return construct_template_response_dataframe(request, list_of_dicts, reverse=None,
+                                                     next_page_url=next_page_url,
+                                                     rows_only=(cursor is not None))
     else:
-        df = peloton.processed_df
-        df_json = json.loads(df.to_json(orient='records'))
-        return JSONResponse(df_json)
+        headers = {'X-Total-Count': str(page.total)}
+        if page.next_cursor is not None:
+            headers['X-Next-Cursor'] = page.next_cursor
+            headers['X-Next-Offset'] = str(page.next_offset)
+        if layout == 'ndjson':
+            return PelotonNDJSONStreamingResponse(page.rows, headers=headers)
+        return PelotonJSONResponse(page.rows, layout=layout, headers=headers)
 
 @router.get('/month_table', response_class=HTMLResponse)
-async def month_table(request: Request, 
-                      hx_request: Annotated[Union[str | None], Header()] = None):
-    df = peloton.pivots.month_table.copy()
-    if hx_request:
-        df = rename_columns(df)
-        return construct_template_response_pivot(request, df)
-    else:
-        df_json = json.loads(df.to_json(orient='records'))
-        return JSONResponse(df_json)
+def month_table(request: Request, 
+                hx_request: Annotated[Union[str | None], Header()] = None,
+                layout: JSONLayout = 'records'):
+    dataset = peloton.dataset
+
+    def make_response():
+        df = dataset.pivots.month_table.copy()
+        if hx_request:
+            df = rename_columns(df)
+            return construct_template_response_pivot(request, df)
+        else:
+            return PelotonJSONResponse(df, layout=layout)
+
+    return construct_cached_response(request, endpoint_cache, dataset.version, make_response)
     
 @router.get('/year_table', response_class=HTMLResponse)
-async def year_table(request: Request, 
-                     hx_request: Annotated[Union[str | None], Header()] = None):
-    df = peloton.pivots.year_table.copy()
-    if hx_request:
-        df = rename_columns(df).drop(columns='Rides')
-        return construct_template_response_pivot(request, df)
-    else:
-        df_json = json.loads(df.to_json(orient='records'))
-        return JSONResponse(df_json)
+def year_table(request: Request, 
+               hx_request: Annotated[Union[str | None], Header()] = None,
+               layout: JSONLayout = 'records'):
+    dataset = peloton.dataset
+
+    def make_response():
+        df = dataset.pivots.year_table.copy()
+        if hx_request:
+            df = rename_columns(df).drop(columns='Rides')
+            return construct_template_response_pivot(request, df)
+        else:
+            return PelotonJSONResponse(df, layout=layout)
+
+    return construct_cached_response(request, endpoint_cache, dataset.version, make_response)
 
 @router.get('/totals_table')
-async def totals_table(request: Request, 
-                       hx_request: Annotated[Union[str | None], Header()] = None):
-    df = peloton.pivots.totals_table.copy()
-    if hx_request:
-        df = rename_columns(df)
-        return construct_template_response_pivot(request, df)
-    else:
-        df_json = json.loads(df.to_json(orient='records'))
-        return JSONResponse(df_json)
+def totals_table(request: Request, 
+                 hx_request: Annotated[Union[str | None], Header()] = None,
+                 layout: JSONLayout = 'records'):
+    dataset = peloton.dataset
+
+    def make_response():
+        df = dataset.pivots.totals_table.copy()
+        if hx_request:
+            df = rename_columns(df)
+            return construct_template_response_pivot(request, df)
+        else:
+            return PelotonJSONResponse(df, layout=layout)
+
+    return construct_cached_response(request, endpoint_cache, dataset.version, make_response)
+
+@router.get('/rollup')
+def get_rollup(grain: str = 'month',
+               by: Annotated[list[str] | None, Query()] = None,
+               start: date | None = None,
+               end: date | None = None,
+               fitness_discipline: str | None = None,
+               instructor_name: str | None = None,
+               workout_type: str | None = None,
+               layout: JSONLayout = 'records') -> list[dict]:
+    ''' Totals rolled up from the daily cube, e.g. `?grain=week&by=instructor_name&fitness_discipline=cycling`
+    (`by` can be repeated; `start`/`end` are inclusive ISO dates). '''
+    rollup_cube = peloton.dataset.rollup_cube
+    if rollup_cube is None:
+        return []
+    filters = {'fitness_discipline': fitness_discipline, 
+               'instructor_name': instructor_name, 
+               'workout_type': workout_type}
+    try:
+        df = rollup_cube.rollup(grain=grain, by=by or [], start=start, end=end,
+                                filters={key: value for key, value in filters.items() if value is not None})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return PelotonJSONResponse(df, layout=layout)
+
+@router.get('/workout_images/{image_filename}')
+def get_workout_image(image_filename: str, w: int = None, fmt: str = None) -> FileResponse:
+    ''' Serves a workout image; with `w` and/or `fmt` (e.g. `?w=250&fmt=webp`), serves a 
+    resized/re-encoded copy that's generated on first request and then cached on disk. '''
+    image_path = WORKOUT_IMAGES_DIR.joinpath(image_filename)
+    if Path(image_filename).name != image_filename or not image_path.is_file():
+        raise HTTPException(status_code=404, detail=f"Image not found: {image_filename}")
+    
+    if w is None and fmt is None:
+        return FileResponse(image_path, headers=IMMUTABLE_CACHE_HEADERS)
+    
+    try:
+        thumb_path = thumbnail_cache.get_thumbnail(image_path, 
+                                                   width=(w or MAX_THUMBNAIL_WIDTH), 
+                                                   image_format=fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FileResponse(thumb_path, 
+                        media_type=thumbnail_cache.get_media_type(thumb_path.suffix.lstrip('.')),
+                        headers=IMMUTABLE_CACHE_HEADERS)
 
 @router.get('/favicon.ico', include_in_schema=False)
 async def favicon():
     favicon_path = Path.cwd().joinpath('static', 'images', 'favicon.ico')
     return FileResponse(favicon_path)
 
-@router.post('/refresh_data')
-async def refresh_data() -> None:
-    peloton.check_for_new_workouts()
-    return None
+@router.post('/refresh_data', status_code=202)
+async def refresh_data() -> PelotonSyncJob:
+    ''' Starts a sync in the background (or returns the one already running). '''
+    return sync_manager.start_job().snapshot()
+
+def get_sync_job_or_404(job_id: str) -> PelotonSyncJob:
+    job = sync_manager.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No sync job with ID: {job_id}")
+    return job
+
+@router.get('/refresh_data/{job_id}')
+async def get_refresh_data_status(job_id: str) -> PelotonSyncJob:
+    return get_sync_job_or_404(job_id).snapshot()
+
+@router.get('/refresh_data/{job_id}/events')
+async def stream_refresh_data_status(job_id: str) -> StreamingResponse:
+    ''' Server-sent events: one progress snapshot per second until the job finishes. '''
+    job = get_sync_job_or_404(job_id)
+    
+    async def event_stream():
+        while True:
+            snapshot = job.snapshot()
+            yield f"data: {snapshot.model_dump_json()}\n\n"
+            if snapshot.is_finished:
+                break
+            await asyncio.sleep(1)
+            
+    return StreamingResponse(event_stream(), media_type='text/event-stream')
 
 @router.get('/stats_summary')
-async def get_stats_summary(end_date_ts: int = None) -> dict:
+def get_stats_summary(request: Request, end_date_ts: int = None) -> dict:
     end_date_dt = (datetime.fromtimestamp(end_date_ts, tz=LOCAL_TZ) 
                    if end_date_ts else datetime.now(tz=LOCAL_TZ))
-    return peloton.chart_maker.make_stats_summary(end_date_dt)
+    dataset = peloton.dataset
+    # the summary only depends on the end *date*, so "now" is cached per day
+    return construct_cached_response(request, endpoint_cache, dataset.version, 
+                                     lambda: JSONResponse(dataset.chart_maker.make_stats_summary(end_date_dt)),
+                                     end_date_dt.date())
+
+@router.get('/request_stats')
+def get_request_stats() -> dict:
+    return {**peloton.py_conn.get_latency_stats(), 
+            'database': peloton.db.get_latency_stats(),
+            'endpoint_cache': endpoint_cache.get_stats()}
 
 @router.get('/data')
-async def get_data(workout_id: str) -> PelotonWorkoutData:
-    return peloton.get_workout_object_from_id(workout_id)
+def get_data(workout_id: str) -> PelotonWorkoutData:
+    workout = peloton.get_workout_object_from_id(workout_id)
+    if workout is None:
+        raise HTTPException(status_code=404, detail=f"No workout with ID: {workout_id}")
+    return PelotonJSONResponse(peloton.load_raw_payloads([workout])[0])
 
 @router.get('/workout_id_list', response_class=HTMLResponse)
 async def get_data_for_plotly_workout_select_dropdown(request: Request) -> HTMLResponse:
-    workout_list = [workout for workout in peloton.workouts]
-    workout_list = sorted(workout_list, key=lambda x: x.summary.start_time, reverse=True)
+    workout_list = peloton.dataset.workout_index.newest_first
     return templates.TemplateResponse(request=request, 
                                       name='workout_select.html',
                                       context={'workout_list': workout_list})
 
 @router.get('/hr_zones')
-async def get_hr_zones_chart_df(workout_id: str) -> list[dict]:
-    df = peloton.chart_maker.make_hr_zones_chart_df(workout_id)
-    if isinstance(df, pd.DataFrame):
-        return json.loads(df.to_json(orient='records'))
-    else:
-        raise HTTPException(status_code=404, 
-                            detail=f"No HR-zone data for workout ID: {workout_id}")
+def get_hr_zones_chart_df(request: Request, workout_id: str, layout: JSONLayout = 'records') -> list[dict]:
+    dataset = peloton.dataset
+
+    def make_response():
+        df = dataset.chart_maker.make_hr_zones_chart_df(workout_id)
+        if isinstance(df, pd.DataFrame):
+            return PelotonJSONResponse(df, layout=layout)
+        else:
+            raise HTTPException(status_code=404, 
+                                detail=f"No HR-zone data for workout ID: {workout_id}")
+
+    return construct_cached_response(request, endpoint_cache, dataset.version, make_response)
 
 @router.get('/line_chart')
-async def get_line_chart_df(workout_id: str):
-    df = (peloton.chart_maker
-          .make_line_chart_df_new(workout_id)
-          .reset_index(names='datetime'))
-    df_json = df.to_json(orient='records')
-    return json.loads(df_json)
+def get_line_chart_df(request: Request, 
+                      workout_id: str, 
+                      points: Annotated[int | None, Query(ge=2)] = None,
+                      method: DownsampleMethod = 'lttb',
+                      layout: JSONLayout = 'records'):
+    ''' Every metric at 5-second resolution, or -- with `points` -- downsampled to at most that 
+    many rows, shared between the metrics (`method=lttb`, the default, keeps the shape; `minmax` 
+    keeps every spike). '''
+    dataset = peloton.dataset
+
+    def make_response():
+        try:
+            df = dataset.chart_maker.make_line_chart_df_new(workout_id, points=points, method=method)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return PelotonJSONResponse(df.reset_index(names='datetime'), layout=layout)
+
+    return construct_cached_response(request, endpoint_cache, dataset.version, make_response)
 
 @router.get('/line_chart_test', response_class=HTMLResponse)
 async def get_hr_zones_chart_plotly_json(workout_id: str) -> HTMLResponse:
-    plt = peloton.chart_maker.make_hr_zones_bar_chart(workout_id)
+    plt = peloton.dataset.chart_maker.make_hr_zones_bar_chart(workout_id)
     plt_html = plt.to_html(include_plotlyjs=False, full_html=False)
     return plt_html
 
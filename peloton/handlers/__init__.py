@@ -1,6 +1,13 @@
 from .sql_handler import PelotonSQL
 from .pivot_table_maker import PelotonPivots
+from .rollup_cube import PelotonRollupCube
+from .metrics_store import PelotonMetricsStore
 from .chart_maker import PelotonChartMaker
+from .dataset import PelotonDataset
 from .mongodb import PelotonMongoDB
+from .thumbnail_cache import PelotonThumbnailCache
+from .image_pipeline import PelotonImagePipeline
+from .response_cache import PelotonResponseCache
+from .endpoint_cache import PelotonEndpointCache
 from .pyloton_zmv import PylotonZMV
 from .peloton_processor import PelotonProcessor
\ No newline at end of file
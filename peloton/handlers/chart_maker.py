@@ -1,13 +1,21 @@
+import copy
 import random
-from datetime import timedelta, datetime
+from dataclasses import dataclass
+from typing import Callable, Mapping
+from datetime import date, timedelta, datetime
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objs as go
 
 from peloton.models import PelotonWorkoutData
-from peloton.handlers import PelotonPivots
-from peloton.helpers.constants import EASTERN_TIME
+from peloton.handlers import PelotonPivots, PelotonMetricsStore
+from peloton.handlers.chart_series import (DownsampleMethod, PelotonSeriesCache, downsample_series_df,
+                                           make_series_df, make_time_index)
+from peloton.handlers.stats_index import PelotonStatsIndex
+from peloton.handlers.workout_index import PelotonWorkoutIndex
+from peloton.helpers.constants import EASTERN_TIME, LINE_CHART_CACHE_MAX_ENTRIES
 
 STRIVE_SCORE_COLOR_MAP = {
     'Zone 1': '#88cfa5',
@@ -20,63 +28,118 @@ STRIVE_SCORE_COLOR_MAP = {
 def main():
     pass
 
+
+@dataclass(frozen=True)
+class DayTotals():
+    ''' Mergeable per-day aggregates behind `make_stats_summary`. '''
+    workouts: int = 0
+    duration: int = 0
+    calories: float = 0
+    strive_score: float = 0
+
+    def __add__(self, other: 'DayTotals') -> 'DayTotals':
+        return DayTotals(workouts=self.workouts + other.workouts,
+                         duration=self.duration + other.duration,
+                         calories=self.calories + other.calories,
+                         strive_score=self.strive_score + other.strive_score)
+
+    @classmethod
+    def from_workout(cls, workout: PelotonWorkoutData) -> 'DayTotals':
+        summaries = workout.metrics.summaries
+        return cls(workouts=1,
+                   duration=workout.summary.ride.ride_duration or 0,
+                   calories=(summaries[2].value or 0) if len(summaries) > 2 else 0,
+                   strive_score=(workout.metrics.effort_zones.effort_score 
+                                 if workout.metrics.effort_zones is not None else 0))
+
+
+def add_daily_totals(daily_totals: dict[date, DayTotals], workouts: list[PelotonWorkoutData]) -> dict[date, DayTotals]:
+    ''' `daily_totals` with `workouts` added in (a new dict; the argument is not modified). '''
+    output_dict = dict(daily_totals)
+    for workout in workouts:
+        day = workout.summary.start_time.date()
+        day_totals = DayTotals.from_workout(workout)
+        output_dict[day] = output_dict[day] + day_totals if day in output_dict else day_totals
+    return output_dict
+
+
 class PelotonChartMaker():
-    def __init__(self, workouts: list[PelotonWorkoutData], pivots: PelotonPivots):
+    def __init__(self, 
+                 workouts: list[PelotonWorkoutData], 
+                 pivots: PelotonPivots,
+                 metrics_store: PelotonMetricsStore | None = None,
+                 raw_payload_loader: Callable[[list[PelotonWorkoutData]], list[PelotonWorkoutData]] | None = None,
+                 workout_index: PelotonWorkoutIndex | None = None):
         self.workouts = workouts
         self.pivots = pivots
-        self.workouts_by_id = {workout.summary.workout_id: workout for workout in workouts}
-        self.stats_summary = self.make_stats_summary()
+        self.metrics_store = metrics_store
+        self.raw_payload_loader = raw_payload_loader
+        self.workout_index = workout_index if workout_index is not None else PelotonWorkoutIndex(workouts)
+        self.daily_totals = add_daily_totals({}, workouts)
+        self.stats_index = PelotonStatsIndex(self.daily_totals)
+        self.line_chart_cache = PelotonSeriesCache(max_entries=LINE_CHART_CACHE_MAX_ENTRIES)
+
+    def with_new_workouts(self, 
+                          new_workouts: list[PelotonWorkoutData], 
+                          pivots: PelotonPivots,
+                          workout_index: PelotonWorkoutIndex) -> 'PelotonChartMaker':
+        ''' A copy of this chart maker that also covers `new_workouts` (and uses the updated 
+        `pivots` & `workout_index`); the stats index is rebuilt from the merged per-day totals. 
+        The line-chart cache is shared, since a workout's series never change. '''
+        chart_maker = copy.copy(self)
+        chart_maker.workouts = self.workouts + list(new_workouts)
+        chart_maker.pivots = pivots
+        chart_maker.workout_index = workout_index
+        chart_maker.daily_totals = add_daily_totals(self.daily_totals, new_workouts)
+        chart_maker.stats_index = PelotonStatsIndex(chart_maker.daily_totals)
+        return chart_maker
+
+    @property
+    def workouts_by_id(self) -> Mapping[str, PelotonWorkoutData]:
+        return self.workout_index.by_id
+
+    @property
+    def stats_summary(self) -> dict:
+        ''' `make_stats_summary` as of right now. '''
+        return self.make_stats_summary()
 
     def get_achievements(self) -> pd.DataFrame:
-        achievements = [workout.summary_raw['achievement_templates'] for workout in self.workouts 
+        workouts = self.workouts
+        if self.raw_payload_loader is not None and not all(workout.has_raw_payloads for workout in workouts):
+            workouts = self.raw_payload_loader(workouts)
+        achievements = [workout.summary_raw['achievement_templates'] for workout in workouts 
                         if len(workout.summary_raw['achievement_templates']) > 0]
         return pd.DataFrame([item for row in achievements for item in row])
 
-    def make_stats_summary(self, end_date: datetime = datetime.now(tz=EASTERN_TIME)) -> dict:
+    def make_stats_summary(self, end_date: datetime | None = None) -> dict:
         '''
         Total workouts, total workout time, total calories, total strive score
 
         Total active days, difference in total active dates as compared to previous 30-day period
 
         Week streak
+
+        Answered from `stats_index` (a few binary searches), for any `end_date` (default: now).
         ''' 
         DAYS = 30
         output_dict = {}
 
-        end_date = end_date.date()
+        end_date = (end_date if end_date is not None else datetime.now(tz=EASTERN_TIME)).date()
         start_date = end_date - timedelta(days=(DAYS))  # was (DAYS - 1) (changed on 8/14/2024)
-        workouts = [workout for workout in self.workouts 
-                             if workout.summary.start_time.date() >= start_date
-                             and workout.summary.start_time.date() <= end_date]
+        window_totals = self.stats_index.window_totals(start_date, end_date)
 
-        output_dict['total_workouts'] = len(workouts)
-        output_dict['total_workout_days'] = len(set([workout.summary.start_time.date() for workout in workouts]))
+        output_dict['total_workouts'] = window_totals['workouts']
+        output_dict['total_workout_days'] = window_totals['workout_days']
 
-        total_duration = sum([workout.summary.ride.ride_duration for workout in workouts])
+        total_duration = window_totals['duration']
         output_dict['total_duration'] = total_duration
         output_dict['total_duration_str'] = f"{total_duration // 3600} hr {total_duration % 3600 // 60} min"
         output_dict['total_hours'] = total_duration / 3600
 
-        workout_metrics_summaries = [workout.metrics.summaries for workout in workouts]
-        output_dict['total_calories'] = sum([x[2].value for x in workout_metrics_summaries])
-
-        strive_score_total = sum([workout.metrics.effort_zones.effort_score for workout in workouts 
-                                       if workout.metrics.effort_zones is not None])
-        output_dict['total_strive_score'] = strive_score_total
-
-        active_weekly_streak = 0
-        last_monday = (end_date - timedelta(days=end_date.weekday()))
-        test_date = last_monday
-        while True:
-            if len([workout for workout in self.workouts
-                    if workout.summary.start_time.date() >= test_date
-                    and workout.summary.start_time.date() <= (test_date + timedelta(weeks=1))]) > 0:
-                active_weekly_streak += 1
-                test_date = test_date - timedelta(weeks=1)
-            elif test_date == last_monday:
-                test_date = test_date - timedelta(weeks=1)
-            else:
-                break
+        output_dict['total_calories'] = window_totals['calories']
+        output_dict['total_strive_score'] = window_totals['strive_score']
+
+        active_weekly_streak = self.stats_index.active_weekly_streak(end_date)
         output_dict['active_weekly_streak'] = active_weekly_streak
 
         return output_dict
@@ -120,6 +183,14 @@ class PelotonChartMaker():
 
         return fig
 
+    def get_metric_values(self, workout: PelotonWorkoutData, metric_index: int) -> np.ndarray:
+        ''' The series for `workout.metrics.metrics[metric_index]`, read from the columnar 
+        metrics store (empty if the store doesn't have it). '''
+        values = None
+        if self.metrics_store is not None:
+            values = self.metrics_store.get_series(workout.workout_id, workout.metrics.metrics[metric_index].slug)
+        return values if values is not None else np.empty(0, dtype=float)
+
     def make_hr_zones_chart_df(self, workout_id: str) -> pd.DataFrame | None:
         workout = self.workouts_by_id[workout_id]
         if len(workout.metrics.metrics) < 5:
@@ -171,53 +242,40 @@ class PelotonChartMaker():
 
         output_list = []
         for x in range(len(workout.metrics.metrics)):
+            values = self.get_metric_values(workout, x)
             if x == 4:
-                values = list(map(lambda x: max(100, x), workout.metrics.metrics[x].values))
-            else:
-                values = workout.metrics.metrics[x].values
+                values = np.maximum(values, 100)
             slug = workout.metrics.metrics[x].slug
-            df = pd.DataFrame(
-                {slug: values},
-                index = [(workout.summary.start_time + timedelta(seconds=(x))) 
-                         for x in range(0, (5 * len(workout.metrics.metrics[x].values)), 5)]
-            )
+            df = pd.DataFrame({slug: values}, index=make_time_index(workout.summary.start_time, len(values)))
             output_list.append(df)
 
         return output_list
 
-    def make_random_chart_dfs(self) -> list[pd.DataFrame]:
-        workout = self.workouts[random.randint(0, len(self.workouts))]
-        return self.make_chart_dfs(workout.workout_id)
-
-    def make_line_chart_df_new(self, workout_id: str) -> pd.DataFrame:
+    def make_line_chart_df_new(self, 
+                               workout_id: str, 
+                               points: int | None = None,
+                               method: DownsampleMethod = 'lttb') -> pd.DataFrame:
+        ''' Every metric of the workout as one column, on a 5-second `DatetimeIndex`; with `points`, 
+        downsampled (per metric, see `downsample_series_df`) for display.  Built once per 
+        (workout, `points`, `method`) and then served from `line_chart_cache` -- treat the 
+        returned DataFrame as read-only. '''
         workout = self.workouts_by_id[workout_id]
-        metrics = {'output': 'watts',
-                   'cadence': 'rpm',
-                   'resistance': '%',
-                   'speed': 'mph',
-                   'heart_rate': 'bpm'}
-
-        print(f"Start Time: {workout.summary.start_time.strftime('%a, %b %-d, %Y @ %-I:%M %p')}")
-        print(f"Title: {workout.summary.ride.title}")
 
-        output_list: list[pd.DataFrame] = []
-        for x in range(len(workout.metrics.metrics)):
-            if x == 4:
-                values = list(map(lambda x: max(100, x), workout.metrics.metrics[x].values))
-            else:
-                values = workout.metrics.metrics[x].values
-            slug = workout.metrics.metrics[x].slug
-            df = pd.DataFrame(
-                {slug: values},
-                index = [(workout.summary.start_time + timedelta(seconds=(x))) 
-                         for x in range(0, (5 * len(workout.metrics.metrics[x].values)), 5)]
-            )
-            output_list.append(df)
+        def make_df() -> pd.DataFrame:
+            if points is not None:
+                return downsample_series_df(self.make_line_chart_df_new(workout_id), points, method)
+            print(f"Start Time: {workout.summary.start_time.strftime('%a, %b %-d, %Y @ %-I:%M %p')}")
+            print(f"Title: {workout.summary.ride.title}")
+            series = {}
+            for x in range(len(workout.metrics.metrics)):
+                values = self.get_metric_values(workout, x)
+                series[workout.metrics.metrics[x].slug] = np.maximum(values, 100) if x == 4 else values
+            return make_series_df(workout.summary.start_time, series)
 
-        return output_list[0].join(output_list[1:])
+        return self.line_chart_cache.get_or_create((workout_id, points, method if points is not None else None), make_df)
 
     def make_random_chart_dfs(self) -> list[pd.DataFrame]:
-        workout = self.workouts[random.randint(0, len(self.workouts))]
+        workout = random.choice(self.workouts)
         return self.make_line_chart_dfs(workout.workout_id)
 
 if __name__ == '__main__':
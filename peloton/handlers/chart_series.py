@@ -0,0 +1,136 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Hashable, Literal
+
+import numpy as np
+import pandas as pd
+
+DownsampleMethod = Literal['lttb', 'minmax']
+METRIC_INTERVAL_SECONDS = 5   # Peloton reports one value per metric every 5 seconds
+
+
+def make_time_index(start_time: datetime, num_points: int, interval_seconds: int = METRIC_INTERVAL_SECONDS) -> pd.DatetimeIndex:
+    ''' `start_time`, `start_time + interval`, ... (`num_points` timestamps). '''
+    return pd.date_range(start=start_time, periods=num_points, freq=pd.Timedelta(seconds=interval_seconds))
+
+
+def make_series_df(start_time: datetime, series: dict[str, np.ndarray]) -> pd.DataFrame:
+    ''' One column per metric on a shared time index as long as the *first* series; longer
+    series are cut to that length and shorter ones padded with NaN (the same alignment -- and,
+    when lengths differ, the same all-float columns -- as joining per-metric DataFrames onto
+    the first one). '''
+    if len(series) == 0:
+        return pd.DataFrame(index=make_time_index(start_time, 0))
+    num_points = len(next(iter(series.values())))
+    same_lengths = all(len(values) == num_points for values in series.values())
+    columns = {}
+    for slug, values in series.items():
+        values = np.asarray(values) if same_lengths else np.asarray(values, dtype=float)[:num_points]
+        if len(values) < num_points:
+            values = np.concatenate([values, np.full(num_points - len(values), np.nan)])
+        columns[slug] = values
+    return pd.DataFrame(columns, index=make_time_index(start_time, num_points))
+
+
+def lttb_positions(values: np.ndarray, points: int) -> np.ndarray:
+    ''' Positions of the `points` samples that Largest-Triangle-Three-Buckets keeps: the first
+    and last samples, plus, from each of `points - 2` equal buckets in between, the sample
+    forming the largest triangle with the previously kept sample and the next bucket's mean.
+    (x is the sample position, which is evenly spaced in time.) '''
+    num_values = len(values)
+    if points >= num_values:
+        return np.arange(num_values)
+    if points < 3:
+        return np.array([0, num_values - 1])
+    values = np.nan_to_num(np.asarray(values, dtype=float))
+    edges = np.linspace(1, num_values - 1, points - 1).astype(np.int64)
+    positions = np.empty(points, dtype=np.int64)
+    positions[0], positions[-1] = 0, num_values - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else num_values
+        next_x = (end + next_end - 1) / 2
+        next_y = values[end:next_end].mean()
+        candidates = np.arange(start, end)
+        areas = np.abs((previous - next_x) * (values[candidates] - values[previous])
+                       - (previous - candidates) * (next_y - values[previous]))
+        previous = start + int(np.argmax(areas))
+        positions[bucket + 1] = previous
+    return positions
+
+
+def minmax_positions(values: np.ndarray, points: int) -> np.ndarray:
+    ''' Positions of each bucket's minimum and maximum (`points // 2` equal buckets), in order --
+    keeps every spike, at the cost of ignoring the shape between them. '''
+    num_values = len(values)
+    num_buckets = points // 2
+    if points >= num_values:
+        return np.arange(num_values)
+    values = np.nan_to_num(np.asarray(values, dtype=float))
+    buckets = np.arange(num_values) * num_buckets // num_values
+    by_bucket_then_value = np.lexsort((values, buckets))
+    bucket_starts = np.searchsorted(buckets[by_bucket_then_value], np.arange(num_buckets), side='left')
+    bucket_ends = np.append(bucket_starts[1:], num_values) - 1
+    return np.unique(np.concatenate([by_bucket_then_value[bucket_starts], by_bucket_then_value[bucket_ends]]))
+
+
+DOWNSAMPLERS: dict[str, Callable[[np.ndarray, int], np.ndarray]] = {
+    'lttb': lttb_positions,
+    'minmax': minmax_positions,
+}
+
+
+def downsample_series_df(df: pd.DataFrame, points: int, method: DownsampleMethod = 'lttb') -> pd.DataFrame:
+    ''' At most `points` rows of `df`: each column gets an equal share of the budget, and the
+    rows kept are those `method` picks for *any* column, so every metric keeps its own peaks
+    and troughs.  (LTTB always keeps the first & last rows, so those count once, not per column.)
+
+    Raises:
+        ValueError: If `method` isn't one of `DOWNSAMPLERS`, or `df` needs downsampling and `points` 
+            leaves a column fewer than 2.
+    '''
+    if method not in DOWNSAMPLERS:
+        raise ValueError(f"Unknown downsampling method '{method}' (expected one of: {', '.join(DOWNSAMPLERS)})")
+    if len(df) <= points:
+        return df
+    num_columns = max(len(df.columns), 1)
+    points_per_column = (2 + (points - 2) // num_columns) if method == 'lttb' else points // num_columns
+    if points < 2 or points_per_column < 2:
+        raise ValueError(f"`points` must be at least {2 if method == 'lttb' else 2 * num_columns} "
+                         f"to downsample {num_columns} metric(s) with '{method}'")
+    downsample = DOWNSAMPLERS[method]
+    positions = np.unique(np.concatenate([downsample(df[column].to_numpy(dtype=float), points_per_column)
+                                          for column in df.columns]))
+    return df.iloc[positions]
+
+
+class PelotonSeriesCache():
+    ''' Small thread-safe LRU of built chart series, keyed by (workout ID, resolution, method).
+    Workouts never change once synced, so entries stay valid across dataset snapshots. '''
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, pd.DataFrame] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key: Hashable, make_df: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        with self._lock:
+            df = self._entries.get(key)
+            if df is not None:
+                self._entries.move_to_end(key)
+                return df
+        df = make_df()
+        with self._lock:
+            self._entries[key] = df
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return df
+
+
+def main():
+    print("This is a module, not a script.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+from collections.abc import Iterable
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from peloton.helpers.constants import DF_DTYPES_DICT, EASTERN_TIME
+from peloton.models import PelotonSummary, PelotonWorkoutData
+from peloton.models.ride import PelotonRideColumn
+
+# Same columns (and order) that `PelotonWorkoutData.create_dictionary()` produces from `model_dump()`
+SUMMARY_COLUMNS = tuple(name for name in [*PelotonSummary.model_fields, *PelotonSummary.model_computed_fields]
+                        if name != 'ride')
+RIDE_COLUMNS = (*PelotonRideColumn.model_fields, *PelotonRideColumn.model_computed_fields)
+DROPPED_COLUMNS = ('duration',)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+class _ColumnCollector():
+    ''' One Python list per column, created (pre-filled with `None`) the first time a column
+    shows up, so the columns keep the order they'd have in `pd.DataFrame(list_of_dicts)`. '''
+    def __init__(self, num_rows: int):
+        self.num_rows = num_rows
+        self.columns: dict[str, list] = {}
+
+    def set(self, column: str, row: int, value) -> None:
+        values = self.columns.get(column)
+        if values is None:
+            values = self.columns[column] = [None] * self.num_rows
+        values[row] = value
+
+
+def _dump(value):
+    ''' `model_dump()` for nested models (and lists of them), so object columns match `create_dictionary()`. '''
+    if isinstance(value, list):
+        return [_dump(item) for item in value]
+    return value.model_dump() if hasattr(value, 'model_dump') else value
+
+
+def _make_column(values: list, dtype: str | None) -> pd.Series | np.ndarray:
+    ''' Converts one collected column straight to its final dtype.  Where that cast isn't
+    possible (e.g. an `int64` column with missing values) it falls back to what
+    `DataFrame.astype(..., errors='ignore')` would have left behind. '''
+    try:
+        if dtype == 'int64' or dtype == 'float64':
+            return np.array(values, dtype=dtype)
+        elif dtype == 'string':
+            return pd.array(values, dtype='string')
+        elif dtype is not None and dtype.startswith('datetime64'):
+            microseconds = np.array([(value - EPOCH) // ONE_MICROSECOND for value in values], dtype=np.int64)
+            return pd.to_datetime(microseconds, unit='us', utc=True).tz_convert(EASTERN_TIME).astype(dtype)
+    except (TypeError, ValueError):
+        pass
+    column = pd.Series(values)
+    return column.astype(dtype, errors='ignore') if dtype is not None else column
+
+
+def make_workouts_dataframe(workouts: Iterable[PelotonWorkoutData]) -> pd.DataFrame:
+    ''' Builds the processed DataFrame (one row per workout, sorted by start time) in a single
+    pass over the models: attributes are read directly (no `model_dump()` per workout, and the
+    per-second metric values are never touched) into one list per column, and each column is
+    converted once to its final dtype from `DF_DTYPES_DICT`.
+
+    Produces the same frame as the old `create_dictionary()` -> `pd.DataFrame` -> `astype` path:
+    same columns and order, all-null columns and `duration` dropped.
+    '''
+    workouts = list(workouts)
+    collector = _ColumnCollector(len(workouts))
+    for row, workout in enumerate(workouts):
+        summary, ride, metrics = workout.summary, workout.summary.ride, workout.metrics
+        for column in SUMMARY_COLUMNS:
+            collector.set(column, row, _dump(getattr(summary, column)))
+        for column in RIDE_COLUMNS:
+            collector.set(column, row, _dump(getattr(ride, column)))
+
+        for metric_summary in metrics.summaries:
+            collector.set(metric_summary.slug, row, metric_summary.value)
+        for metric in metrics.metrics:
+            collector.set(f"avg_{metric.slug}", row, metric.average_value)
+        for metric in metrics.metrics:
+            collector.set(f"max_{metric.slug}", row, metric.max_value)
+        hr_zones = next((metric.zones for metric in metrics.metrics if metric.zones is not None), None)
+        for zone in hr_zones or []:
+            collector.set(f"hr_{zone.slug}", row, zone.duration)
+        if metrics.effort_zones is not None:
+            collector.set('effort_score', row, metrics.effort_zones.effort_score)
+
+        collector.set('output_per_min', row, workout.output_per_min)
+        collector.set('duration_hrs', row, workout.duration_hrs)
+
+    data = {}
+    for column, values in collector.columns.items():
+        if column in DROPPED_COLUMNS or all(value is None for value in values):
+            continue
+        data[column] = _make_column(values, DF_DTYPES_DICT.get(column))
+
+    output_df = pd.DataFrame(data, copy=False)
+    if 'start_time' in output_df.columns:
+        output_df = output_df.iloc[np.argsort(output_df['start_time'].to_numpy(), kind='stable')]
+    return output_df.reset_index(drop=True)
+
+
+def append_workouts_dataframe(processed_df: pd.DataFrame, new_df: pd.DataFrame) -> pd.DataFrame:
+    ''' `processed_df` with the rows of `new_df` (both from `make_workouts_dataframe`) added, still
+    sorted by start time -- the same frame a full rebuild would produce, without revisiting the
+    old workouts.  Returns a new frame; neither argument is modified.
+
+    Columns that only one side has are filled with nulls (an `int64` column that ends up with
+    nulls becomes `float64`, just as the full build's dtype cast would leave it), and the summary
+    & ride columns are kept in front, in the order the full build puts them.
+    '''
+    output_df = pd.concat([processed_df, new_df], ignore_index=True)
+    if not new_df.columns.isin(processed_df.columns).all():
+        leading_columns = [column for column in (*SUMMARY_COLUMNS, *RIDE_COLUMNS) if column in output_df.columns]
+        output_df = output_df[[*leading_columns, *output_df.columns.difference(leading_columns, sort=False)]]
+    if len(processed_df) > 0 and new_df['start_time'].min() < processed_df['start_time'].max():
+        output_df = output_df.iloc[np.argsort(output_df['start_time'].to_numpy(), kind='stable')]
+    return output_df.reset_index(drop=True)
+
+
+def main():
+    print("This is a module, not a script.")
+
+if __name__ == '__main__':
+    main()
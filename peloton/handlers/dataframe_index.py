@@ -0,0 +1,164 @@
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, time
+
+import numpy as np
+import pandas as pd
+
+from peloton.helpers.constants import EASTERN_TIME
+
+DEFAULT_SORT = '-start_time'
+
+
+@dataclass(frozen=True)
+class PelotonDataFramePage():
+    ''' One page of `PelotonDataFrameIndex.query` results. '''
+    rows: pd.DataFrame
+    total: int                  # matching rows across all pages
+    next_cursor: str | None     # pass back as `cursor` to get the following page
+    next_offset: int | None
+
+
+class PelotonDataFrameIndex():
+    ''' Prebuilt lookup arrays over one snapshot's processed DataFrame, so `/dataframe` can filter,
+    sort and page through it with a few vectorized operations per request:
+
+        - start times as int64 nanoseconds (the frame is sorted by start time, so date ranges
+          are two `searchsorted`s)
+        - lower-cased titles (fixed-width, for `np.char.find`), disciplines & instructor 
+          names/IDs for the filters
+        - one stable sort order per column, computed on first use and then cached
+
+    Built once per dataset snapshot and never modified (apart from the sort-order cache).
+    '''
+
+    def __init__(self, processed_df: pd.DataFrame):
+        self.df = processed_df
+        self.start_times = processed_df['start_time'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        self.workout_ids = processed_df['workout_id'].to_numpy(dtype=object)
+        self.titles = self._get_lowercase_column('title').astype(str)
+        self.disciplines = self._get_lowercase_column('fitness_discipline')
+        self.instructor_names = self._get_lowercase_column('instructor_name')
+        self.instructor_ids = self._get_lowercase_column('instructor_id')
+        self._sort_orders: dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def _get_lowercase_column(self, column: str) -> np.ndarray:
+        if column not in self.df.columns:
+            return np.full(len(self.df), '', dtype=object)
+        return self.df[column].astype('string').str.lower().fillna('').to_numpy(dtype=object)
+
+    def get_sort_order(self, sort: str) -> np.ndarray:
+        ''' Row positions ordered by `sort` (a column name, prefixed with `-` for descending);
+        stable, with missing values last either way. '''
+        column = sort.removeprefix('-')
+        if column not in self.df.columns:
+            raise ValueError(f"Can't sort by unknown column '{column}'")
+        order = self._sort_orders.get(sort)
+        if order is not None:
+            return order
+
+        values = self.df[column].to_numpy()
+        is_missing = self.df[column].isna().to_numpy()
+        present = np.flatnonzero(~is_missing)
+        try:
+            order = present[np.argsort(values[present], kind='stable')]
+        except TypeError:   # e.g. a column of lists/dicts
+            raise ValueError(f"Can't sort by column '{column}'") from None
+        if sort.startswith('-'):
+            order = self._reverse_keeping_ties(values[order], order)
+        order = np.concatenate([order, np.flatnonzero(is_missing)])
+        with self._lock:
+            self._sort_orders[sort] = order
+        return order
+
+    @staticmethod
+    def _reverse_keeping_ties(sorted_values: np.ndarray, order: np.ndarray) -> np.ndarray:
+        ''' `order` (ascending by `sorted_values`) flipped to descending, with equal values
+        staying in their original relative order. '''
+        is_new_value = np.concatenate([[True], sorted_values[1:] != sorted_values[:-1]])
+        value_ranks = np.cumsum(is_new_value)
+        return order[np.lexsort((np.arange(len(order)), -value_ranks))]
+
+    def get_date_range(self, start: date | None = None, end: date | None = None) -> tuple[int, int]:
+        ''' The slice of rows (by position) that started on or after `start` and on or before `end`. '''
+        first, last = 0, len(self.df)
+        if start is not None:
+            start_ns = pd.Timestamp(datetime.combine(start, time.min, tzinfo=EASTERN_TIME)).value
+            first = int(np.searchsorted(self.start_times, start_ns, side='left'))
+        if end is not None:
+            end_ns = pd.Timestamp(datetime.combine(end, time.max, tzinfo=EASTERN_TIME)).value
+            last = int(np.searchsorted(self.start_times, end_ns, side='right'))
+        return first, max(first, last)
+
+    def query(self,
+              start: date | None = None,
+              end: date | None = None,
+              discipline: str | None = None,
+              instructor: str | None = None,
+              title: str | None = None,
+              sort: str = DEFAULT_SORT,
+              cursor: str | None = None,
+              offset: int = 0,
+              limit: int | None = None,
+              fields: list[str] | None = None) -> PelotonDataFramePage:
+        '''
+        Filters, sorts and pages through the processed rows.
+
+        Args:
+            start, end (date, optional): Only workouts that started on/after `start` and on/before `end`.
+            discipline (str, optional): Fitness discipline (case-insensitive).
+            instructor (str, optional): Instructor name or ID (case-insensitive).
+            title (str, optional): Case-insensitive substring of the title.
+            sort (str): Column to sort by, `-`-prefixed for descending (default: newest first).
+            cursor (str, optional): `next_cursor` of the previous page -- continue right after that
+                workout (stable across syncs, unlike `offset`).
+            offset (int): Rows to skip (after `cursor`, if both are given).
+            limit (int, optional): Page size; all remaining rows if omitted.
+            fields (list[str], optional): Columns to return (default: all).
+
+        Returns:
+            PelotonDataFramePage: The rows plus `total` and the cursor/offset for the next page.
+        '''
+        unknown_fields = [field for field in (fields or []) if field not in self.df.columns]
+        if len(unknown_fields) > 0:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown_fields)}")
+        if offset < 0 or (limit is not None and limit < 1):
+            raise ValueError("`offset` must be >= 0 and `limit` >= 1")
+
+        first, last = self.get_date_range(start, end)
+        mask = np.zeros(len(self.df), dtype=bool)
+        mask[first:last] = True
+        if discipline is not None:
+            mask &= self.disciplines == discipline.lower()
+        if instructor is not None:
+            mask &= (self.instructor_names == instructor.lower()) | (self.instructor_ids == instructor.lower())
+        if title is not None:
+            mask[mask] = np.char.find(self.titles[mask], title.lower()) >= 0
+
+        order = self.get_sort_order(sort)
+        rows = order[mask[order]]
+        if cursor is not None:
+            cursor_position = np.flatnonzero(self.workout_ids[rows] == cursor)
+            if len(cursor_position) == 0:
+                raise ValueError(f"Unknown cursor: {cursor}")
+            rows = rows[cursor_position[0] + 1:]
+        page_rows = rows[offset:] if limit is None else rows[offset:offset + limit]
+        has_next_page = offset + len(page_rows) < len(rows)
+
+        page_df = self.df.iloc[page_rows]
+        if fields:
+            page_df = page_df[list(dict.fromkeys(fields))]
+        return PelotonDataFramePage(
+            rows=page_df,
+            total=int(mask.sum()),
+            next_cursor=str(self.workout_ids[page_rows[-1]]) if has_next_page else None,
+            next_offset=(offset + len(page_rows)) if has_next_page else None,
+        )
+
+
+def main():
+    print("This is a module, not a script.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Mapping
+
+import pandas as pd
+
+from peloton.helpers.constants import EASTERN_TIME
+from peloton.models import PelotonWorkoutData
+from peloton.handlers import PelotonChartMaker, PelotonMetricsStore, PelotonPivots, PelotonRollupCube
+from peloton.handlers.dataframe_builder import append_workouts_dataframe, make_workouts_dataframe
+from peloton.handlers.dataframe_index import PelotonDataFrameIndex
+from peloton.handlers.workout_index import PelotonWorkoutIndex
+
+
+@dataclass(frozen=True)
+class PelotonDataset():
+    ''' An immutable, versioned snapshot of everything derived from the workout history.
+
+    A sync (or reprocess) builds a complete new snapshot off to the side and then swaps it in
+    with a single attribute assignment, so request handlers that grab `peloton.dataset` once
+    always see workouts, DataFrame, pivots and stats from the same build -- without locks.
+    Nothing here is mutated after construction; callers that need to modify a DataFrame
+    must `.copy()` it first (as the routes already do).
+
+    Attributes:
+        - `version` (int): Increases by one with every rebuild; usable as a cache key.
+        - `built_at` (datetime): When this snapshot was built.
+        - `workouts` (tuple[PelotonWorkoutData, ...]): Every workout, in database order.
+        - `workout_index` (PelotonWorkoutIndex): Workouts by ID and by start time.
+        - `processed_df` (pd.DataFrame | None): One row per workout, sorted by start time.
+        - `dataframe_index` (PelotonDataFrameIndex | None): Filter/sort/page lookups over `processed_df`, for `/dataframe`.
+        - `pivots` (PelotonPivots | None): Year, month and totals tables.
+        - `rollup_cube` (PelotonRollupCube | None): Daily totals by discipline/instructor/type, for `/rollup`.
+        - `chart_maker` (PelotonChartMaker): Chart/stats helper bound to this snapshot.
+    '''
+    version: int
+    workouts: tuple[PelotonWorkoutData, ...]
+    workout_index: PelotonWorkoutIndex
+    processed_df: pd.DataFrame | None
+    dataframe_index: PelotonDataFrameIndex | None
+    pivots: PelotonPivots | None
+    rollup_cube: PelotonRollupCube | None
+    chart_maker: PelotonChartMaker
+    built_at: datetime = field(default_factory=lambda: datetime.now(tz=EASTERN_TIME))
+
+    @property
+    def workouts_by_id(self) -> Mapping[str, PelotonWorkoutData]:
+        return self.workout_index.by_id
+
+    @property
+    def stats_summary(self) -> dict:
+        return self.chart_maker.stats_summary
+
+    @classmethod
+    def build(cls,
+              workouts: list[PelotonWorkoutData],
+              processed_df: pd.DataFrame | None,
+              version: int,
+              metrics_store: PelotonMetricsStore | None = None,
+              raw_payload_loader: Callable[[list[PelotonWorkoutData]], list[PelotonWorkoutData]] | None = None
+              ) -> 'PelotonDataset':
+        ''' Factory method: derives pivots, rollups, stats and indexes from `workouts` & `processed_df`. '''
+        workouts = tuple(workouts)
+        pivots = PelotonPivots(processed_df) if processed_df is not None else None
+        workout_index = PelotonWorkoutIndex(workouts)
+        return cls(version=version,
+                   workouts=workouts,
+                   workout_index=workout_index,
+                   processed_df=processed_df,
+                   dataframe_index=PelotonDataFrameIndex(processed_df) if processed_df is not None else None,
+                   pivots=pivots,
+                   rollup_cube=PelotonRollupCube(processed_df) if processed_df is not None else None,
+                   chart_maker=PelotonChartMaker(list(workouts), pivots, metrics_store, raw_payload_loader,
+                                                 workout_index))
+
+    def with_new_workouts(self, new_workouts: list[PelotonWorkoutData], version: int) -> 'PelotonDataset':
+        ''' A new snapshot with `new_workouts` (none of which are in this one) appended.  Only the
+        new workouts are processed: their rows are appended to the sorted DataFrame and folded
+        into the pivots' year/month totals, the rollup cube and the chart maker's daily totals.
+        This snapshot is left as it is.
+
+        Falls back to a full `build` if this snapshot (or `new_workouts`) is empty. '''
+        new_workouts = list(new_workouts)
+        workouts = (*self.workouts, *new_workouts)
+        if self.processed_df is None or self.pivots is None or len(new_workouts) == 0:
+            return self.build(workouts, make_workouts_dataframe(workouts) if len(workouts) > 0 else None, version,
+                              self.chart_maker.metrics_store, self.chart_maker.raw_payload_loader)
+        new_df = make_workouts_dataframe(new_workouts)
+        pivots = self.pivots.with_new_rows(new_df)
+        workout_index = self.workout_index.with_new_workouts(new_workouts)
+        processed_df = append_workouts_dataframe(self.processed_df, new_df)
+        return PelotonDataset(version=version,
+                              workouts=workouts,
+                              workout_index=workout_index,
+                              processed_df=processed_df,
+                              dataframe_index=PelotonDataFrameIndex(processed_df),
+                              pivots=pivots,
+                              rollup_cube=self.rollup_cube.with_new_rows(new_df),
+                              chart_maker=self.chart_maker.with_new_workouts(new_workouts, pivots, workout_index))
+
+def main():
+    print("This is a module, not a script.")
+
+if __name__ == '__main__':
+    main()
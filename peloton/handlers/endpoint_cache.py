@@ -0,0 +1,93 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Hashable
+
+from peloton.helpers.constants import ENDPOINT_CACHE_MAX_BYTES
+
+
+@dataclass(frozen=True)
+class PelotonCachedEndpoint():
+    body: bytes
+    media_type: str
+    etag: str
+
+    @classmethod
+    def from_body(cls, body: bytes, media_type: str) -> 'PelotonCachedEndpoint':
+        ''' Strong ETag: a hash of the exact bytes, so an unchanged table keeps its ETag across syncs. '''
+        return cls(body=body, media_type=media_type, etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+
+    def matches(self, if_none_match: str | None) -> bool:
+        ''' Whether an `If-None-Match` header value lists this entry's ETag (or is `*`). '''
+        if if_none_match is None:
+            return False
+        etags = [etag.strip().removeprefix('W/') for etag in if_none_match.split(',')]
+        return '*' in etags or self.etag in etags
+
+
+class PelotonEndpointCache():
+    ''' In-memory, size-bounded (LRU) cache of rendered API responses.
+
+    Keys start with the dataset version (then whatever identifies the request -- path, query
+    parameters, HTMX or not), so a response is never served for a snapshot it wasn't built
+    from.  `clear()` is called when a sync finishes, dropping entries for the old snapshot
+    instead of waiting for them to be evicted.
+    '''
+
+    def __init__(self, max_bytes: int = ENDPOINT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+        self._entries: OrderedDict[Hashable, PelotonCachedEndpoint] = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> PelotonCachedEndpoint | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+
+    def put(self, key: Hashable, entry: PelotonCachedEndpoint) -> None:
+        if len(entry.body) > self.max_bytes:
+            return None
+        with self._lock:
+            previous_entry = self._entries.pop(key, None)
+            if previous_entry is not None:
+                self._total_bytes -= len(previous_entry.body)
+            self._entries[key] = entry
+            self._total_bytes += len(entry.body)
+            while self._total_bytes > self.max_bytes:
+                _, evicted_entry = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted_entry.body)
+                self.stats['evicted'] += 1
+
+    def get_or_create(self, key: Hashable, make_entry: Callable[[], PelotonCachedEndpoint]) -> PelotonCachedEndpoint:
+        ''' The cached entry for `key`, or `make_entry()`'s (which is then cached).  Exceptions
+        from `make_entry` propagate and nothing is cached. '''
+        entry = self.get(key)
+        if entry is None:
+            entry = make_entry()
+            self.put(key, entry)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, 'entries': len(self._entries), 'bytes': self._total_bytes,
+                    'max_bytes': self.max_bytes}
+
+
+def main():
+    print("This is a module, not a script.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+import json
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Literal
+
+from peloton.helpers.constants import (ACHIEVEMENT_IMAGES_DIR, IMAGE_MANIFEST_JSON,
+                                       WORKOUT_IMAGES_DIR)
+from peloton.helpers.exceptions import PelotonImageError
+from peloton.helpers.functions import download_image, hash_image_bytes, process_image
+from peloton.handlers.sync_jobs import PelotonSyncJob
+from peloton.models import PelotonWorkoutData
+
+
+@dataclass(frozen=True)
+class PelotonImageJob():
+    image_url: str
+    image_filename: str
+    local_dir: Path
+    thumbnail_sizes: tuple[int, ...] = ()
+
+    @property
+    def local_path(self) -> Path:
+        return self.local_dir.joinpath(self.image_filename)
+
+
+class PelotonImagePipeline():
+    ''' Downloads workout & achievement images in parallel and saves them (plus any thumbnail 
+    sizes requested up front -- by default none, since `/workout_images` resizes on demand).
+
+    - Downloads share one connection pool and run on a thread pool.
+    - Each image is decoded/resized once, on the same thread that downloaded it (Pillow releases
+      the GIL while it decodes, resizes & encodes, so the threads really do run in parallel).
+    - Images are skipped if their URL is already in the manifest (or the file already exists),
+      and an image whose content hash matches one already saved is copied, not re-encoded.
+    '''
+
+    def __init__(self,
+                 max_download_workers: int = 8,
+                 workout_thumbnail_sizes: tuple[int, ...] = (),
+                 manifest_file: Path = IMAGE_MANIFEST_JSON):
+        self.max_download_workers = max_download_workers
+        self.workout_thumbnail_sizes = workout_thumbnail_sizes
+        self.manifest_file = manifest_file
+        self._manifest_lock = threading.Lock()
+        self.manifest = self._read_manifest()
+        self._paths_by_hash = {entry['sha256']: Path(entry['path']) for entry in self.manifest.values()}
+
+    def _read_manifest(self) -> dict[str, dict]:
+        ''' `{image_url: {'path': ..., 'sha256': ...}}` for every image already saved. '''
+        try:
+            with open(self.manifest_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return dict()
+
+    def _write_manifest(self) -> None:
+        with self._manifest_lock:
+            with open(self.manifest_file, 'w') as f:
+                json.dump(self.manifest, f, indent=4)
+
+    def make_jobs(self, workouts: list[PelotonWorkoutData]) -> list[PelotonImageJob]:
+        ''' One job per distinct image across all `workouts` (achievement badges are shared). '''
+        jobs: dict[str, PelotonImageJob] = {}
+        for workout in workouts:
+            ride = workout.summary.ride
+            if ride.image_url is not None and ride.image_url not in jobs:
+                jobs[ride.image_url] = PelotonImageJob(image_url=ride.image_url,
+                                                       image_filename=ride.image_local_filename,
+                                                       local_dir=WORKOUT_IMAGES_DIR,
+                                                       thumbnail_sizes=self.workout_thumbnail_sizes)
+            for achievement in (workout.summary.achievements or []):
+                if achievement.image_url is not None and achievement.image_url not in jobs:
+                    jobs[achievement.image_url] = PelotonImageJob(image_url=achievement.image_url,
+                                                                  image_filename=achievement.image_local_filename,
+                                                                  local_dir=ACHIEVEMENT_IMAGES_DIR)
+        return list(jobs.values())
+
+    def _is_present(self, job: PelotonImageJob) -> bool:
+        entry = self.manifest.get(job.image_url)
+        if entry is not None and Path(entry['path']).exists():
+            return True
+        return job.local_path.exists()   # saved before the manifest existed
+
+    def _find_file_with_hash(self, sha256: str) -> Path | None:
+        with self._manifest_lock:
+            path = self._paths_by_hash.get(sha256)
+        return path if path is not None and path.exists() else None
+
+    def _save_image(self, job: PelotonImageJob) -> Literal['downloaded', 'deduplicated']:
+        ''' Downloads `job`'s image and saves it (a copy of an identical image already on disk, 
+        if there is one and no thumbnails are wanted).
+
+        Raises:
+            PelotonImageError: If the image can't be downloaded.
+        '''
+        image_data = download_image(job.image_url)
+        if image_data is None:
+            raise PelotonImageError(f"no image data from {job.image_url}")
+        image_bytes = image_data.getvalue()
+
+        sha256 = hash_image_bytes(image_bytes)
+        duplicate = self._find_file_with_hash(sha256)
+        if duplicate is not None and len(job.thumbnail_sizes) == 0:
+            shutil.copyfile(duplicate, job.local_path)
+            self._add_to_manifest(job, sha256)
+            return 'deduplicated'
+
+        process_image(image_bytes, job.image_filename, job.local_dir, job.thumbnail_sizes)
+        self._add_to_manifest(job, sha256)
+        return 'downloaded'
+
+    def process_workouts(self, 
+                         workouts: list[PelotonWorkoutData], 
+                         progress: PelotonSyncJob | None = None) -> dict[str, int]:
+        ''' Downloads & saves every image for `workouts` that isn't on disk yet.
+
+        Args:
+            progress (PelotonSyncJob, optional): Gets the number of images to download as the 
+                `images` stage total, an `advance` per image (saved or not), and a warning for 
+                every image that fails.
+
+        Returns:
+            dict[str, int]: Counts of images `downloaded`, `skipped`, `deduplicated` and `failed`.
+        '''
+        jobs = self.make_jobs(workouts)
+        pending_jobs = [job for job in jobs if not self._is_present(job)]
+        counts = {'downloaded': 0, 'skipped': len(jobs) - len(pending_jobs), 'deduplicated': 0, 'failed': 0}
+        if progress is not None:
+            progress.set_total('images', len(pending_jobs))
+        if len(pending_jobs) == 0:
+            return counts
+
+        print(f"Downloading {len(pending_jobs)} images ({counts['skipped']} already on disk)...")
+        with ThreadPoolExecutor(max_workers=self.max_download_workers, thread_name_prefix='images') as pool:
+            futures = {pool.submit(self._save_image, job): job for job in pending_jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                if progress is not None:
+                    progress.advance('images')
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    message = f"ERROR saving image {job.image_filename}: {type(e).__name__}: {e}"
+                    print(message)
+                    if progress is not None:
+                        progress.add_warning(message)
+                    counts['failed'] += 1
+                    continue
+                counts[outcome] += 1
+
+        self._write_manifest()
+        print(f"Images: {counts}")
+        return counts
+
+    def _add_to_manifest(self, job: PelotonImageJob, sha256: str) -> None:
+        with self._manifest_lock:
+            self.manifest[job.image_url] = {'path': str(job.local_path), 'sha256': sha256}
+            self._paths_by_hash.setdefault(sha256, job.local_path)
+
+
+def main():
+    print("This is a module, not a script.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+import json
+import os
+import shutil
+import threading
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from pathlib import Path
+
+import numpy as np
+
+from peloton.helpers.constants import METRICS_STORE_DIR, METRICS_STORE_MAX_SEGMENTS
+from peloton.models import PelotonWorkoutData
+
+METRICS_DTYPE = np.float64
+INDEX_FILENAME = 'index.json'
+TMP_SUFFIX = '.tmp'
+
+
+def get_metrics_raw_series(metrics_raw: dict) -> dict[str, list[float]]:
+    ''' `{slug: values}` for every metric series in a raw `/performance_graph` payload. '''
+    return {metric['slug']: metric['values'] for metric in metrics_raw.get('metrics') or []
+            if metric.get('values') is not None}
+
+
+class PelotonMetricsStore():
+    ''' Columnar on-disk store for the per-interval metric series (output, cadence, resistance,
+    speed, heart rate...) from `PelotonWorkoutData.metrics.metrics[].values` -- the only place 
+    they're kept once written (the database documents & loaded models leave them out).
+
+    Layout: append-only, numbered segment directories, each holding one `.npy` file per metric
+    slug with the series of the workouts written in that batch concatenated, plus an `index.json`
+    mapping `workout_id -> [[slug, offset, length], ...]` (in the workout's original metric order).
+    Arrays are memory-mapped on first use, so reading one metric for one workout touches only
+    those bytes; nothing is deserialized from the documents.
+
+    A write never touches an existing segment: the new one is built in a temp directory and then
+    published with a single `os.rename`, so a crash leaves either all of it or none of it.  When
+    a workout is in several segments, the newest one wins.  Segments nothing points to any more
+    are deleted, and once there are more than `max_segments` the live series are compacted into
+    one new segment (arrays already handed out by `get_series` stay valid either way).
+    '''
+
+    def __init__(self, store_dir: Path = METRICS_STORE_DIR, max_segments: int = METRICS_STORE_MAX_SEGMENTS):
+        self.store_dir = store_dir
+        self.max_segments = max_segments
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()          # guards the indexes & mapped arrays (swapped together)
+        self._write_lock = threading.Lock()     # one writer at a time
+        self._indexes: dict[str, dict[str, list]] = {}   # segment -> workout_id -> [[slug, offset, length], ...]
+        self._segments_by_id: dict[str, str] = {}
+        self._arrays: dict[tuple[str, str], np.ndarray] = {}   # (segment, slug) -> memory-mapped array
+        for path in sorted(self.store_dir.iterdir()):
+            if path.name.endswith(TMP_SUFFIX):
+                shutil.rmtree(path, ignore_errors=True)   # a write that never got published
+            elif path.is_dir():
+                with open(path.joinpath(INDEX_FILENAME), 'r') as f:
+                    self._indexes[path.name] = json.load(f)
+        for segment, index in self._indexes.items():   # oldest first, so newer segments win
+            self._segments_by_id.update({workout_id: segment for workout_id in index})
+
+    def __contains__(self, workout_id: str) -> bool:
+        return workout_id in self._segments_by_id
+
+    def __len__(self) -> int:
+        return len(self._segments_by_id)
+
+    def _get_array(self, segment: str, slug: str) -> np.ndarray:
+        with self._lock:
+            array = self._arrays.get((segment, slug))
+            if array is None:
+                array = np.load(self.store_dir.joinpath(segment, f"{slug}.npy"), mmap_mode='r')
+                self._arrays[(segment, slug)] = array
+        return array
+
+    def get_slugs(self, workout_id: str) -> list[str]:
+        ''' The metric slugs stored for `workout_id`, in the workout's original order. '''
+        with self._lock:
+            segment = self._segments_by_id.get(workout_id)
+            if segment is None:
+                return list()
+            return [slug for slug, _, _ in self._indexes[segment][workout_id]]
+
+    def get_series(self, workout_id: str, slug: str) -> np.ndarray | None:
+        ''' One metric series for one workout, as a read-only array (`None` if not stored). '''
+        with self._lock:
+            segment = self._segments_by_id.get(workout_id)
+            if segment is None:
+                return None
+            for stored_slug, offset, length in self._indexes[segment][workout_id]:
+                if stored_slug == slug:
+                    return self._get_array(segment, slug)[offset:offset + length]
+        return None
+
+    def get_workout_series(self, workout_id: str) -> dict[str, np.ndarray]:
+        ''' Every metric series for one workout, keyed by slug (in the original metric order). '''
+        return {slug: self.get_series(workout_id, slug) for slug in self.get_slugs(workout_id)}
+
+    def iter_metric(self, slug: str) -> Iterator[tuple[str, np.ndarray]]:
+        ''' Yields `(workout_id, series)` for every stored workout that has metric `slug`. '''
+        with self._lock:
+            workout_ids = list(self._segments_by_id)
+        for workout_id in workout_ids:
+            series = self.get_series(workout_id, slug)
+            if series is not None:
+                yield workout_id, series
+
+    def write_workouts(self, workouts: Iterable[PelotonWorkoutData]) -> int:
+        ''' Adds (or replaces) the series for `workouts` as one new segment.
+
+        Returns:
+            int: Number of workouts written
+        '''
+        return self.write_series({workout.workout_id: {metric.slug: metric.values
+                                                       for metric in workout.metrics.metrics
+                                                       if metric.values is not None}
+                                  for workout in workouts})
+
+    def write_series(self, series_by_id: Mapping[str, Mapping[str, Sequence[float]]]) -> int:
+        ''' Adds (or replaces) `{workout_id: {slug: values}}` as one new segment.
+
+        Returns:
+            int: Number of workouts written
+        '''
+        if len(series_by_id) == 0:
+            return 0
+        with self._write_lock:
+            self._publish_segment({workout_id: {slug: np.asarray(values, dtype=METRICS_DTYPE)
+                                                for slug, values in series.items()}
+                                   for workout_id, series in series_by_id.items()})
+            if len(self._indexes) > self.max_segments:
+                self._compact()
+        return len(series_by_id)
+
+    def _compact(self) -> None:
+        ''' Rewrites every live series into one new segment (which then makes all the others dead). '''
+        print(f"Compacting the metrics store ({len(self._indexes)} segments)...")
+        with self._lock:
+            locations = dict(self._segments_by_id)
+        self._publish_segment({workout_id: {slug: self._get_array(segment, slug)[offset:offset + length]
+                                            for slug, offset, length in self._indexes[segment][workout_id]}
+                               for workout_id, segment in locations.items()})
+
+    def _publish_segment(self, series_by_id: dict[str, dict[str, np.ndarray]]) -> None:
+        segment = f"{int(max(self._indexes, default='0')) + 1:08d}"
+        tmp_dir = self.store_dir.joinpath(f"{segment}{TMP_SUFFIX}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir()
+
+        series_by_slug: dict[str, list[np.ndarray]] = {}
+        offsets_by_slug: dict[str, int] = {}
+        index: dict[str, list] = {}
+        for workout_id, series in series_by_id.items():
+            index[workout_id] = []
+            for slug, values in series.items():
+                offset = offsets_by_slug.get(slug, 0)
+                series_by_slug.setdefault(slug, []).append(values)
+                offsets_by_slug[slug] = offset + len(values)
+                index[workout_id].append([slug, offset, len(values)])
+
+        for slug, series_list in series_by_slug.items():
+            with open(tmp_dir.joinpath(f"{slug}.npy"), 'wb') as f:
+                np.save(f, np.concatenate(series_list).astype(METRICS_DTYPE, copy=False))
+        with open(tmp_dir.joinpath(INDEX_FILENAME), 'w') as f:
+            json.dump(index, f)
+
+        with self._lock:
+            os.rename(tmp_dir, self.store_dir.joinpath(segment))
+            self._indexes[segment] = index
+            self._segments_by_id.update({workout_id: segment for workout_id in index})
+            live_segments = set(self._segments_by_id.values())
+            dead_segments = [name for name in self._indexes if name not in live_segments]
+            for dead_segment in dead_segments:
+                del self._indexes[dead_segment]
+                for key in [key for key in self._arrays if key[0] == dead_segment]:
+                    del self._arrays[key]
+        for dead_segment in dead_segments:
+            shutil.rmtree(self.store_dir.joinpath(dead_segment), ignore_errors=True)
+
+
+def main():
+    print("This is a module, not a script.")
+
+if __name__ == '__main__':
+    main()
@@ -1,89 +1,205 @@
-from pymongo import MongoClient
+import threading
+from collections.abc import Iterable
+from itertools import batched
+
+from bson import Binary
+from pymongo import MongoClient, UpdateOne
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure
 
 from peloton.helpers.constants import (MONGODB_HOSTNAME, MONGODB_DATABASE,
-                               MONGODB_COLLECTION, MONGODB_INSTRUCTORS_COLLECTION)
+                               MONGODB_COLLECTION, MONGODB_INSTRUCTORS_COLLECTION,
+                               MONGODB_MAX_POOL_SIZE, MONGODB_BULK_WRITE_CHUNK_SIZE)
+from peloton.helpers.functions import compress_json, decompress_json
+from peloton.helpers.latency import LatencyStats
 from peloton.models import PelotonWorkoutData
 
+# Raw API payloads are stored zlib-compressed under `<field>_zlib`; documents written
+# before that keep them as plain sub-documents under `<field>`, which are still read.
+RAW_PAYLOAD_FIELDS = ('summary_raw', 'metrics_raw')
+RAW_PAYLOAD_PROJECTION = {field: False for name in RAW_PAYLOAD_FIELDS for field in (name, f"{name}_zlib")}
+# The per-interval series live in the metrics store; documents written before that still have
+# them here until `drop_metric_values` removes them, and they're never read back.
+METRIC_VALUES_FIELD = 'metrics.metrics.values'
+METRIC_VALUES_EXCLUDE = {'metrics': {'metrics': {'__all__': {'values'}}}}
+
 
 class MongoDBConnection():
-    """ MongoDB Connection """    
-    def __init__(self, host: str = MONGODB_HOSTNAME, port: int = 27017):
+    """ MongoDB Connection
+
+    Holds a single `MongoClient` (which is thread-safe and maintains its own connection pool)
+    for the life of the process; it's created on first use and reused by every `with` block.
+    """
+    def __init__(self,
+                 host: str = MONGODB_HOSTNAME,
+                 port: int = 27017,
+                 max_pool_size: int = MONGODB_MAX_POOL_SIZE):
         self.host = host
         self.port = port
-        self.connection = None    
+        self.max_pool_size = max_pool_size
+        self.connection = None
+        self._lock = threading.Lock()
 
     def __enter__(self) -> 'MongoDBConnection':
-        self.connection = MongoClient(self.host, self.port)
-        return self    
+        if self.connection is None:
+            with self._lock:
+                if self.connection is None:
+                    self.connection = MongoClient(self.host, self.port, maxPoolSize=self.max_pool_size)
+        return self
 
     def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
-        self.connection.close()
+        pass   # connections go back to the client's pool; see `close()`
+
+    def close(self) -> None:
+        with self._lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
 
 
 class PelotonMongoDB():
     def __init__(self):
         self.mongodb_client = MongoDBConnection()
+        self.latency_stats = LatencyStats()
+        self.create_indexes()
+
+    def _get_collection(self, collection_name: str = MONGODB_COLLECTION) -> Collection:
+        with self.mongodb_client as client:
+            return client.connection[MONGODB_DATABASE][collection_name]
+
+    def create_indexes(self) -> None:
+        ''' Ensures unique indexes on `workout_id` & `instructor_id` (a no-op if they exist). '''
+        for collection_name, key in [(MONGODB_COLLECTION, 'workout_id'),
+                                     (MONGODB_INSTRUCTORS_COLLECTION, 'instructor_id')]:
+            with self.latency_stats.timer('create_indexes'):
+                try:
+                    self._get_collection(collection_name).create_index(key, unique=True)
+                except OperationFailure as e:
+                    # e.g. duplicate documents from before the index existed
+                    print(f"Could not create unique index on {collection_name}.{key}: {e}")
+
+    def get_latency_stats(self) -> dict[str, dict]:
+        """ Retrieves the per-operation counters (count, errors, total/mean/max seconds). """
+        return self.latency_stats.as_dict()
 
     def get_workout_id_list(self) -> list[str]:
         """
-        _summary_
+        Gets the ID of every workout in the database (answered from the `workout_id`
+        index, without reading the documents themselves).
 
         Returns:
-            _description_
+            list[str]: Workout IDs
         """
-        with self.mongodb_client as client:
-            db = client.connection[MONGODB_DATABASE]
-            collection = db[MONGODB_COLLECTION]
-            workouts = collection.find()
-            workout_id_list = [workout['workout_id'] for workout in workouts]
-
-        return workout_id_list
-
-    def ingest_workouts(self) -> list[PelotonWorkoutData]:
+        with self.latency_stats.timer('get_workout_id_list'):
+            return self._get_collection().distinct('workout_id')
+
+    @staticmethod
+    def _decode_raw_payloads(document: dict) -> dict:
+        for name in RAW_PAYLOAD_FIELDS:
+            compressed = document.pop(f"{name}_zlib", None)
+            if compressed is not None:
+                document[name] = decompress_json(compressed)
+        return document
+
+    @staticmethod
+    def _make_update(workout: PelotonWorkoutData) -> dict:
+        ''' `$set`s everything but the raw payloads & metric series.  The raw payloads are only
+        written (compressed) if the workout has them loaded -- so upserting a lazily-ingested 
+        workout never erases them. '''
+        document = workout.model_dump(exclude={**{name: True for name in RAW_PAYLOAD_FIELDS}, 
+                                               **METRIC_VALUES_EXCLUDE})
+        if not workout.has_raw_payloads:
+            return {'$set': document}
+        document.update({f"{name}_zlib": Binary(compress_json(getattr(workout, name))) 
+                         for name in RAW_PAYLOAD_FIELDS})
+        return {'$set': document, '$unset': {name: '' for name in RAW_PAYLOAD_FIELDS}}
+
+    def ingest_workouts(self, include_raw: bool = False) -> list[PelotonWorkoutData]:
+        ''' Loads every workout; the raw API payloads are left in the database 
+        (see `get_raw_payloads`) unless `include_raw` is set. '''
         print("Getting workouts from MongoDB...")
-        with self.mongodb_client as client:
-            db = client.connection[MONGODB_DATABASE]
-            collection = db[MONGODB_COLLECTION]
-            workouts = collection.find()
-            workout_list = [PelotonWorkoutData(**workout) for workout in workouts]
-        
+        projection = {'_id': False, METRIC_VALUES_FIELD: False}
+        if not include_raw:
+            projection.update(RAW_PAYLOAD_PROJECTION)
+        with self.latency_stats.timer('ingest_workouts'):
+            workouts = self._get_collection().find(projection=projection)
+            workout_list = [PelotonWorkoutData(**self._decode_raw_payloads(workout)) for workout in workouts]
+
         return workout_list
 
+    def get_raw_payloads(self, workout_ids: list[str]) -> dict[str, tuple[dict, dict]]:
+        ''' `{workout_id: (summary_raw, metrics_raw)}` for each of `workout_ids` that has them. '''
+        projection = {'_id': False, 'workout_id': True, **{field: True for field in RAW_PAYLOAD_PROJECTION}}
+        with self.latency_stats.timer('get_raw_payloads'):
+            documents = self._get_collection().find({'workout_id': {'$in': list(workout_ids)}}, 
+                                                    projection=projection)
+            documents = [self._decode_raw_payloads(document) for document in documents]
+        return {document['workout_id']: (document['summary_raw'], document['metrics_raw']) 
+                for document in documents 
+                if document.get('summary_raw') is not None and document.get('metrics_raw') is not None}
+
+    def drop_metric_values(self, workout_ids: list[str]) -> int:
+        ''' Removes the per-interval series from the stored documents of `workout_ids` (call it 
+        once the metrics store has them; the raw payloads still hold the originals).
+
+        Returns:
+            int: Number of documents changed
+        '''
+        collection = self._get_collection()
+        num_changed = 0
+        for chunk in batched(workout_ids, MONGODB_BULK_WRITE_CHUNK_SIZE):
+            with self.latency_stats.timer('drop_metric_values'):
+                result = collection.update_many({'workout_id': {'$in': list(chunk)}, 
+                                                 METRIC_VALUES_FIELD: {'$exists': True}},
+                                                {'$unset': {'metrics.metrics.$[].values': ''}})
+            num_changed += result.modified_count
+        return num_changed
+
+    def upsert_workouts(self,
+                        workouts: Iterable[PelotonWorkoutData],
+                        chunk_size: int = MONGODB_BULK_WRITE_CHUNK_SIZE) -> int:
+        ''' Inserts or overwrites `workouts` (matched on `workout_id`) with unordered
+        `bulk_write` calls of up to `chunk_size` operations each.  Idempotent, so a
+        sync that died partway through can simply be re-run.
+
+        Returns:
+            int: Number of workouts written
+        '''
+        collection = self._get_collection()
+        num_written = 0
+        for chunk in batched(workouts, chunk_size):
+            operations = [UpdateOne(filter={'workout_id': workout.workout_id},
+                                    update=self._make_update(workout),
+                                    upsert=True)
+                          for workout in chunk]
+            with self.latency_stats.timer('upsert_workouts'):
+                collection.bulk_write(operations, ordered=False)
+            num_written += len(operations)
+        return num_written
+
     def export_workout(self, workout: PelotonWorkoutData) -> None:
         print(f"Exporting workout {workout.workout_id} to MongoDB...")
-        with self.mongodb_client as client:
-            db = client.connection[MONGODB_DATABASE]
-            collection = db[MONGODB_COLLECTION]
-            collection.insert_one(workout.model_dump())
-        
+        self.upsert_workouts([workout])
+
     def update_workout(self, workout: PelotonWorkoutData) -> None:
         print(f"Updating workout {workout.workout_id} on MongoDB with new data...")
-        with self.mongodb_client as client:
-            db = client.connection[MONGODB_DATABASE]
-            collection = db[MONGODB_COLLECTION]
-            collection.find_one_and_replace(
-                filter={'workout_id': workout.workout_id},
-                replacement=workout.model_dump())
+        self.upsert_workouts([workout])
 
     def get_workout(self, workout_id: str) -> PelotonWorkoutData:
-        with self.mongodb_client as client:
-            db = client.connection[MONGODB_DATABASE]
-            collection = db[MONGODB_COLLECTION]
-            workout = collection.find_one({'workout_id': workout_id})
-        return PelotonWorkoutData(**workout)
+        with self.latency_stats.timer('get_workout'):
+            workout = self._get_collection().find_one({'workout_id': workout_id},
+                                                      projection={'_id': False, METRIC_VALUES_FIELD: False})
+        return PelotonWorkoutData(**self._decode_raw_payloads(workout))
 
     def get_instructor(self, instructor_id: str) -> dict:
-        with self.mongodb_client as client: 
-            db = client.connection[MONGODB_DATABASE]
-            collection = db[MONGODB_INSTRUCTORS_COLLECTION]
-            instructor = collection.find_one({'instructor_id': instructor_id})
+        with self.latency_stats.timer('get_instructor'):
+            instructor = (self._get_collection(MONGODB_INSTRUCTORS_COLLECTION)
+                          .find_one({'instructor_id': instructor_id}))
         return instructor
 
     def add_instructor(self, instructor: dict) -> None:
-        with self.mongodb_client as client:
-            db = client.connection[MONGODB_DATABASE]
-            collection = db[MONGODB_INSTRUCTORS_COLLECTION]
-            collection.insert_one(instructor)
+        with self.latency_stats.timer('add_instructor'):
+            self._get_collection(MONGODB_INSTRUCTORS_COLLECTION).insert_one(instructor)
 
 
 def main():
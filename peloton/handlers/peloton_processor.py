@@ -3,27 +3,41 @@ import io
 import json
 from pathlib import Path
 from datetime import datetime
-from typing import Protocol
+from typing import Iterable, Protocol
 from enum import Enum
+from itertools import batched
 
+import numpy as np
 import pandas as pd
+from sqlalchemy import create_engine
 
-from peloton.helpers.constants import (DF_DTYPES_DICT, 
+from peloton.helpers.constants import (
                                        PELOTON_PASSWORD,
                                        PELOTON_USERNAME, 
-                                       WORKOUT_IMAGES_DIR, 
-                                       ACHIEVEMENT_IMAGES_DIR,
                                        INSTRUCTORS_JSON,
                                        DATA_DIR,
+                                       PELOTON_LAZY_RAW_PAYLOADS,
+                                       SQLITE_FILENAME,
                                        WORKOUTS_DIR,
                                        EASTERN_TIME)
 from peloton.helpers.exceptions import WorkoutMismatchError
-from peloton.helpers.functions import download_image, save_image, create_thumbnail
 from peloton.handlers import (PelotonChartMaker, PylotonZMV,
-                              PelotonPivots, PelotonMongoDB)
+                              PelotonPivots, PelotonMongoDB,
+                              PelotonImagePipeline, PelotonDataset,
+                              PelotonSQL, PelotonMetricsStore)
+from peloton.handlers.dataframe_builder import make_workouts_dataframe
+from peloton.handlers.metrics_store import METRICS_DTYPE, get_metrics_raw_series
+from peloton.handlers.pyloton_zmv import PelotonSyncWatermark
+from peloton.handlers.response_cache import PelotonResponseCache
+from peloton.handlers.sync_jobs import PelotonSyncJob
 from peloton.models import (PelotonMetrics, PelotonSummary,
                             PelotonWorkoutData)
 
+# New workouts are written to the database in batches of this size as they arrive during a sync.
+SYNC_PERSIST_BATCH_SIZE = 50
+# Raw payloads are loaded (and dropped again) in chunks of this size when a whole history needs them.
+RAW_PAYLOAD_BATCH_SIZE = 200
+
 
 class PelotonDatabase(Protocol):
     def get_workout_id_list(self) -> list[str]: 
@@ -34,12 +48,16 @@ class PelotonDatabase(Protocol):
             _description_
         """
         ...
-    def ingest_workouts(self) -> list[PelotonWorkoutData]: ...
+    def ingest_workouts(self, include_raw: bool = False) -> list[PelotonWorkoutData]: ...
+    def get_raw_payloads(self, workout_ids: list[str]) -> dict[str, tuple[dict, dict]]: ...
     def export_workout(self, workout: PelotonWorkoutData) -> None: ...
     def update_workout(self, workout: PelotonWorkoutData) -> None: ...
+    def drop_metric_values(self, workout_ids: list[str]) -> int: ...
+    def upsert_workouts(self, workouts: Iterable[PelotonWorkoutData], chunk_size: int = ...) -> int: ...
     def get_workout(self, workout_id: str) -> PelotonWorkoutData: ...
     def get_instructor(self, instructor_id: str) -> dict: ...
     def add_instructor(self, instructor: dict) -> None: ...   
+    def get_latency_stats(self) -> dict[str, dict]: ...
 
 
 class PelotonDBType(Enum):
@@ -53,6 +71,10 @@ class PelotonDBType(Enum):
 def get_peloton_db(db_type: PelotonDBType) -> PelotonDatabase:
     if db_type == PelotonDBType.MONGODB:
         return PelotonMongoDB()
+    elif db_type == PelotonDBType.SQLITE:
+        return PelotonSQL(create_engine(SQLITE_FILENAME))
+    else:
+        raise NotImplementedError(f"No database handler for {db_type.value}")
 
 
 class PelotonProcessor():   
@@ -64,14 +86,23 @@ class PelotonProcessor():
         Connection objeczt w/ methods for pulling data from Peloton
     db : PelotonDatabase
         Protocol class for internal database connector (defaults to PelotonMongoDB)
-    workouts : list[PelotonWorkoutData]
-        List of Pydantic models w/ workout data
+    dataset : PelotonDataset
+        Immutable snapshot of the workouts & everything derived from them; replaced 
+        wholesale (never modified) whenever the data changes
+    workouts : tuple[PelotonWorkoutData, ...]
+        Pydantic models w/ workout data (from the current `dataset`)
     processed_df : pd.DataFrame
-        Custom Pandas dataframe constructed from workout data
+        Custom Pandas dataframe constructed from workout data (from the current `dataset`)
     pivots : PelotonPivots
-        Object w/ methods for creating & printing pivot tables from workout data
+        Object w/ methods for creating & printing pivot tables from workout data (from the current `dataset`)
     chart_maker : PelotonChartMaker
-        Object w/ methods for creating chart tables & graphs from workout data
+        Object w/ methods for creating chart tables & graphs from workout data (from the current `dataset`)
+    image_pipeline : PelotonImagePipeline
+        Object w/ methods for downloading & saving workout/achievement images
+    metrics_store : PelotonMetricsStore
+        Columnar on-disk store of every workout's per-interval metric series
+    sync_watermark : PelotonSyncWatermark | None
+        Remote workout count & newest workout as of the last completed sync
 
     """
     
@@ -80,111 +111,190 @@ class PelotonProcessor():
                  password: str = PELOTON_PASSWORD,
                  db_type: PelotonDBType = PelotonDBType.MONGODB
                  ) -> None:
-        self.py_conn = PylotonZMV(username, password)
+        self.py_conn = PylotonZMV(username, password, response_cache=PelotonResponseCache())
         self.db = get_peloton_db(db_type)
-        self.workouts = self.db.ingest_workouts()
+        self.image_pipeline = PelotonImagePipeline()
+        self.metrics_store = PelotonMetricsStore()
+        workouts = self.db.ingest_workouts(include_raw=not PELOTON_LAZY_RAW_PAYLOADS)
+        self.backfill_metrics_store(workouts)
+        self.dataset = self.build_dataset(workouts)
         self.new_workouts = False
-        self.processed_df = self.make_dataframe() if len(self.workouts) > 0 else None
-        self.pivots = PelotonPivots(self.processed_df) if self.processed_df is not None else None
-        self.chart_maker = PelotonChartMaker(self.workouts, self.pivots)
+        self.sync_watermark = PelotonSyncWatermark.read_watermark_from_json()
     
-    def check_for_new_workouts(self) -> None:       
+    def check_for_new_workouts(self, progress: PelotonSyncJob | None = None) -> None:       
+        ''' Pulls any new workouts from Peloton, persists them, and rebuilds the processed data.
+
+        Args:
+            progress (PelotonSyncJob, optional): Receives per-stage progress (listing, fetching, 
+                persisting, images, rebuild) for the background-sync progress API.
+        '''
+        progress = progress if progress is not None else PelotonSyncJob()
+        
+        progress.start_stage('listing')
+        remote_watermark = self.py_conn.get_sync_watermark()
+        if self._watermark_is_current(remote_watermark):
+            print("No new workouts since last sync.")
+            self.new_workouts = False
+            progress.finish_stage('listing')
+            return None
+        
         new_workout_ids = self._get_new_workout_ids()
+        progress.advance('listing', len(new_workout_ids))
+        progress.finish_stage('listing')
         if len(new_workout_ids) == 0:
             self.new_workouts = False
-            self.workouts = self.db.ingest_workouts()
+            self._save_sync_watermark(remote_watermark)
             return None   # everything below will only happen if there are new workouts!
 
         print(f"New Workout IDs:  {new_workout_ids}")
+        progress.set_new_workouts(len(new_workout_ids))
+        progress.start_stage('fetching', total=len(new_workout_ids))
+        progress.start_stage('persisting', total=len(new_workout_ids))
+        # Workouts are persisted in small batches as they arrive, so a failed request partway
+        # through a big backfill doesn't throw away everything fetched before it (and since
+        # the writes are upserts, re-running a sync that died partway through is safe).
         new_workout_list: list[PelotonWorkoutData] = []
-        for workout_id in new_workout_ids:
-            summary_raw = self.py_conn.get_workout_summary_by_id(workout_id)
-            metrics_raw = self.py_conn.get_workout_metrics_by_id(workout_id)
-            workout_data = PelotonWorkoutData(
+        unsaved_workouts: list[PelotonWorkoutData] = []
+        for workout_id, summary_raw, metrics_raw in self.py_conn.get_workouts_by_ids(new_workout_ids):
+            progress.advance('fetching')
+            workout = PelotonWorkoutData(
                 workout_id=workout_id,
                 summary_raw=summary_raw,
                 metrics_raw=metrics_raw,
                 summary=PelotonSummary(**summary_raw),
                 metrics=PelotonMetrics(**metrics_raw)
                 )
-            new_workout_list.append(workout_data)
-
-        for workout in new_workout_list:
-            self.db.export_workout(workout)
             self.write_workout_to_json(workout)
-            self.download_workout_image(workout)
-            self.download_achievement_images(workout)
+            new_workout_list.append(workout)
+            unsaved_workouts.append(workout)
+            if len(unsaved_workouts) >= SYNC_PERSIST_BATCH_SIZE:
+                progress.advance('persisting', self.db.upsert_workouts(unsaved_workouts))
+                unsaved_workouts = []
+        if len(unsaved_workouts) > 0:
+            progress.advance('persisting', self.db.upsert_workouts(unsaved_workouts))
+        self.metrics_store.write_workouts(new_workout_list)
+        new_workout_list = [workout.without_metric_values() for workout in new_workout_list]
+        progress.finish_stage('fetching')
+        progress.finish_stage('persisting')
+
+        progress.start_stage('images')
+        progress.set_image_counts(self.download_images(new_workout_list, progress))
+        progress.finish_stage('images')
 
         self.new_workouts = True
         
-        self.workouts = self.db.ingest_workouts()
-        
-        self.processed_df = self.make_dataframe()
-        if self.pivots is not None:
-            self.pivots.regenerate_tables(self.processed_df)
-        self.chart_maker = PelotonChartMaker(self.workouts, self.pivots)
+        progress.start_stage('rebuild', total=3)
+        self.dataset = self.extend_dataset(new_workout_list)
+        progress.advance('rebuild')
         self.write_csv_files()
+        progress.advance('rebuild')
+        self._save_sync_watermark(remote_watermark)
+        progress.advance('rebuild')
+        progress.finish_stage('rebuild')
+
+    @property
+    def workouts(self) -> tuple[PelotonWorkoutData, ...]:
+        return self.dataset.workouts
+
+    @property
+    def processed_df(self) -> pd.DataFrame | None:
+        return self.dataset.processed_df
+
+    @property
+    def pivots(self) -> PelotonPivots | None:
+        return self.dataset.pivots
+
+    @property
+    def chart_maker(self) -> PelotonChartMaker:
+        return self.dataset.chart_maker
+
+    def build_dataset(self, workouts: list[PelotonWorkoutData]) -> PelotonDataset:
+        ''' Builds a complete new snapshot from `workouts` without touching the current one; 
+        assign the result to `self.dataset` to swap it in atomically. '''
+        current_dataset: PelotonDataset | None = getattr(self, 'dataset', None)
+        version = 1 if current_dataset is None else current_dataset.version + 1
+        processed_df = self.make_dataframe(workouts) if len(workouts) > 0 else None
+        return PelotonDataset.build(workouts, processed_df, version, self.metrics_store, self.load_raw_payloads)
+
+    def extend_dataset(self, new_workouts: list[PelotonWorkoutData]) -> PelotonDataset:
+        ''' Like `build_dataset`, but only processes `new_workouts` (appending them to the current
+        snapshot's DataFrame, pivots & stats) instead of re-ingesting the whole history.  Falls 
+        back to a full rebuild from the database if any of them are already in the snapshot. '''
+        current_dataset = self.dataset
+        if any(workout.workout_id in current_dataset.workout_index for workout in new_workouts):
+            return self.build_dataset(self.db.ingest_workouts(include_raw=not PELOTON_LAZY_RAW_PAYLOADS))
+        if PELOTON_LAZY_RAW_PAYLOADS:
+            new_workouts = [workout.without_raw_payloads() for workout in new_workouts]
+        return current_dataset.with_new_workouts(new_workouts, current_dataset.version + 1)
+
+    def backfill_metrics_store(self, workouts: list[PelotonWorkoutData]) -> None:
+        ''' Writes the series of any of `workouts` the metrics store doesn't have yet (read from
+        their raw payloads, a chunk at a time), then drops the series from the stored documents. '''
+        missing_workouts = [workout for workout in workouts if workout.workout_id not in self.metrics_store]
+        if len(missing_workouts) > 0:
+            print(f"Writing {len(missing_workouts)} workouts to the metrics store...")
+            series_by_id: dict[str, dict[str, np.ndarray]] = {}
+            for chunk in batched(missing_workouts, RAW_PAYLOAD_BATCH_SIZE):
+                for workout in self.load_raw_payloads(chunk):
+                    if workout.metrics_raw is not None:
+                        series_by_id[workout.workout_id] = {
+                            slug: np.asarray(values, dtype=METRICS_DTYPE) 
+                            for slug, values in get_metrics_raw_series(workout.metrics_raw).items()}
+            self.metrics_store.write_series(series_by_id)
+        self.db.drop_metric_values([workout.workout_id for workout in workouts 
+                                    if workout.workout_id in self.metrics_store])
+
+    def _watermark_is_current(self, remote_watermark: PelotonSyncWatermark) -> bool:
+        ''' Returns `True` if nothing has changed on Peloton since the last completed sync 
+        (and the newest remote workout is actually loaded locally). '''
+        if self.sync_watermark is None or remote_watermark != self.sync_watermark:
+            return False
+        return (remote_watermark.newest_workout_id is None 
+                or self.get_workout_object_from_id(remote_watermark.newest_workout_id) is not None)
+
+    def _save_sync_watermark(self, watermark: PelotonSyncWatermark) -> None:
+        watermark.write_watermark_to_json()
+        self.sync_watermark = watermark
 
     def get_workouts(self) -> list[PelotonWorkoutData]:
-        return self.db.ingest_workouts()
+        return self.db.ingest_workouts(include_raw=True)
+
+    def load_raw_payloads(self, workouts: Iterable[PelotonWorkoutData]) -> list[PelotonWorkoutData]:
+        ''' Returns `workouts` with their raw API payloads attached, fetching (from the database)
+        only those that were ingested without them. '''
+        workouts = list(workouts)
+        missing_ids = [workout.workout_id for workout in workouts if not workout.has_raw_payloads]
+        if len(missing_ids) == 0:
+            return workouts
+        raw_payloads = self.db.get_raw_payloads(missing_ids)
+        return [workout.with_raw_payloads(*raw_payloads[workout.workout_id]) 
+                if not workout.has_raw_payloads and workout.workout_id in raw_payloads else workout
+                for workout in workouts]
 
     def _get_new_workout_ids(self) -> list[str]:
-        workout_ids_on_peloton = self.py_conn.get_workout_ids()
-        workout_ids_on_disk = self.db.get_workout_id_list()
-        new_workout_ids = [workout_id for workout_id in workout_ids_on_peloton
-                            if workout_id not in workout_ids_on_disk]
+        workout_ids_on_disk = set(self.db.get_workout_id_list())
+        new_workout_ids = self.py_conn.get_workout_ids(known_ids=workout_ids_on_disk)
 
-        print(f"Total Workouts: {len(workout_ids_on_peloton)}")
         print(f"Workouts in Database: {len(workout_ids_on_disk)}")
         print(f"New Workouts to Write: {len(new_workout_ids)}")
 
         return new_workout_ids
 
-    def make_dataframe(self) -> pd.DataFrame:
+    def make_dataframe(self, workouts: list[PelotonWorkoutData] = None) -> pd.DataFrame:
         print("Creating processed Dataframe...")
-        workout_dict_list = [workout.create_dictionary() for workout in self.workouts]
-        output_df = (pd.DataFrame(workout_dict_list)
-                     .dropna(axis='columns', how='all')
-                     .drop(columns=['duration'])
-                     .sort_values(by='start_time')
-                     .reset_index(drop=True))
-        output_df = output_df.astype({key: value for key, value in DF_DTYPES_DICT.items() if key in output_df.columns}, errors='ignore')               
-        return output_df
-
-    def download_workout_image(self, workout: PelotonWorkoutData) -> None:
-        if workout.summary.ride.image_url is None:
-            print(f"No image available for workout {workout.workout_id}.")
-            return None
-        
-        print(f"Downloading image for workout {workout.workout_id}...")
-        image_data = download_image(workout.summary.ride.image_url)
-        image_filename = workout.summary.ride.image_local_filename
-        if image_data is not None:
-            print(f"Downloaded!  Saving to disk and creating thumbnail...")
-            save_image(image_data, image_filename, WORKOUT_IMAGES_DIR)
-            create_thumbnail(image_data, image_filename, WORKOUT_IMAGES_DIR)
-
-    def download_achievement_images(self, workout: PelotonWorkoutData) -> None:
-        num_achievements = len(workout.summary.achievements)
-        if num_achievements == 0:
-            return None
-        
-        print(f"Downloading {num_achievements} achievement images for workout {workout.workout_id}...")
-        for achievement in workout.summary.achievements:
-            if achievement.image_url is not None:
-                image_data = download_image(achievement.image_url)
-                image_filename = achievement.image_local_filename
-                if image_data is not None:
-                    print(f"Downloaded!  Saving to disk...")
-                    save_image(image_data, image_filename, ACHIEVEMENT_IMAGES_DIR)
-
-    def make_list_of_dicts(self) -> list[dict]:
-        return [workout.create_dictionary() for workout in self.workouts]
+        workouts = self.workouts if workouts is None else workouts
+        return make_workouts_dataframe(workouts)
+
+    def download_images(self, 
+                        workouts: list[PelotonWorkoutData], 
+                        progress: PelotonSyncJob | None = None) -> dict[str, int]:
+        ''' Downloads the ride images & achievement badges for `workouts` (skipping any already on disk);
+        any that fail are added to `progress` as warnings. '''
+        return self.image_pipeline.process_workouts(workouts, progress)
 
     def get_workout_object_from_id(self, workout_id: str) -> PelotonWorkoutData | None:
         ''' Get a `PelotonWorkoutData` object from its corresponding workout ID. '''
-        workouts_by_id = {workout.summary.workout_id: workout for workout in self.workouts}
-        return workouts_by_id.get(workout_id, None)
+        return self.dataset.workout_index.get(workout_id)
 
     def print_processed_data_to_stdout(self) -> None:
         df = self.processed_df.copy()
@@ -208,12 +318,12 @@ class PelotonProcessor():
         print(self.pivots.month_table)
 
     def write_csv_files(self) -> None:
-        self.processed_df.to_csv(DATA_DIR.joinpath('processed_workouts_data.csv'))
+        dataset = self.dataset
+        dataset.processed_df.to_csv(DATA_DIR.joinpath('processed_workouts_data.csv'))
 
-        self.pivots.regenerate_tables(self.processed_df)
-        self.pivots.year_table.to_csv(DATA_DIR.joinpath('year_table.csv'))
-        self.pivots.month_table.to_csv(DATA_DIR.joinpath('month_table.csv'))
-        self.pivots.totals_table.to_csv(DATA_DIR.joinpath('totals_table.csv'))
+        dataset.pivots.year_table.to_csv(DATA_DIR.joinpath('year_table.csv'))
+        dataset.pivots.month_table.to_csv(DATA_DIR.joinpath('month_table.csv'))
+        dataset.pivots.totals_table.to_csv(DATA_DIR.joinpath('totals_table.csv'))
 
     def get_workouts_from_json() -> list[PelotonWorkoutData]:
         try:
@@ -236,13 +346,16 @@ class PelotonProcessor():
     
     def write_workout_to_json(self, workout: PelotonWorkoutData) -> None:
         print(f"Writing JSON file for workout {workout.workout_id} to disk...")
+        if not workout.has_raw_payloads:
+            workout = self.load_raw_payloads([workout])[0]
         with open(WORKOUTS_DIR.joinpath(f"{workout.workout_id}.json"), 'w') as f:
             f.write(workout.model_dump_json(indent=4))
 
     def backup_all_workouts_to_json(self) -> None:
-        for workout in self.workouts:
-            print(f"Writing workout {workout.workout_id} to JSON...")
-            self.write_workout_to_json(workout)
+        for chunk in batched(self.workouts, RAW_PAYLOAD_BATCH_SIZE):
+            for workout in self.load_raw_payloads(chunk):
+                print(f"Writing workout {workout.workout_id} to JSON...")
+                self.write_workout_to_json(workout)
 
     def get_instructors_dict_from_json(self) -> dict:
         try:
@@ -270,7 +383,7 @@ class PelotonProcessor():
         workout_list = self.workouts if workout_list is None else workout_list
         
         output_list = []
-        for workout in workout_list:
+        for workout in self.load_raw_payloads(workout_list):
             workout_id = workout.workout_id
             summary_raw = workout.summary_raw
             metrics_raw = workout.metrics_raw
@@ -299,13 +412,20 @@ class PelotonProcessor():
         ''' Reprocesses the raw workout data in the database, 
         replaces the data in the database, and writes new JSON files. '''
         
-        new_workout_list = self._reprocess_workout_data()
-        self.workouts = new_workout_list
-        self.processed_df = self.make_dataframe()
-
-        for workout in self.workouts:
-            self.db.update_workout(workout)
-            self.write_workout_to_json(workout)
+        # In chunks, so only one chunk's raw payloads (and metric series) are ever in memory at once
+        new_workout_list: list[PelotonWorkoutData] = []
+        for chunk in batched(self.workouts, RAW_PAYLOAD_BATCH_SIZE):
+            reprocessed_chunk = self._reprocess_workout_data(list(chunk))
+            print(f"Updating {len(reprocessed_chunk)} workouts in the database...")
+            self.db.upsert_workouts(reprocessed_chunk)
+            self.metrics_store.write_workouts(reprocessed_chunk)
+            for workout in reprocessed_chunk:
+                self.write_workout_to_json(workout)
+            new_workout_list.extend(workout.without_raw_payloads().without_metric_values() 
+                                    if PELOTON_LAZY_RAW_PAYLOADS else workout.without_metric_values()
+                                    for workout in reprocessed_chunk)
+
+        self.dataset = self.build_dataset(new_workout_list)
 
 def main():
     print("This is a module, not a script.")
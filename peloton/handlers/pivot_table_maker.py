@@ -1,36 +1,123 @@
+import copy
+from dataclasses import dataclass
+
+import numpy as np
 import pandas as pd
+
 from peloton.helpers.constants import EASTERN_TIME
 
 
+# Columns of the year & month tables, in display order
+TABLE_COLUMNS = ['rides', 'days', 'total_hours', 'total_miles', 'avg_calories', 'avg_output/min']
+
+
+@dataclass(frozen=True)
+class PeriodTotals():
+    ''' Mergeable aggregates for the workouts in one year or month: counts, sums, the set of
+    distinct dates, and (sum, count) pairs for the running means.  Two `PeriodTotals` for
+    the same period combine with `+`, so new workouts never require re-reading old ones. '''
+    label: int | str
+    rides: int = 0
+    dates: frozenset[int] = frozenset()   # `YYYYMMDD` day keys
+    hours: float = 0.0
+    distance: float = 0.0
+    calories_sum: float = 0.0
+    calories_count: int = 0
+    output_sum: float = 0.0
+    output_count: int = 0
+
+    def __add__(self, other: 'PeriodTotals') -> 'PeriodTotals':
+        return PeriodTotals(label=self.label,
+                            rides=self.rides + other.rides,
+                            dates=self.dates | other.dates,
+                            hours=self.hours + other.hours,
+                            distance=self.distance + other.distance,
+                            calories_sum=self.calories_sum + other.calories_sum,
+                            calories_count=self.calories_count + other.calories_count,
+                            output_sum=self.output_sum + other.output_sum,
+                            output_count=self.output_count + other.output_count)
+
+    def as_row(self) -> dict:
+        return {
+            'rides': self.rides,
+            'days': len(self.dates),
+            'total_hours': self.hours,
+            'total_miles': self.distance,
+            'avg_calories': self.calories_sum / self.calories_count if self.calories_count > 0 else np.nan,
+            'avg_output/min': self.output_sum / self.output_count if self.output_count > 0 else np.nan,
+        }
+
+
 class PelotonPivots():
-    ''' Object for creating, printing, and saving pivot tables from Peloton data.'''
+    ''' Object for creating, printing, and saving pivot tables from Peloton data.
+
+    The tables are rendered from per-year and per-month `PeriodTotals`, so `with_new_rows` can
+    fold a sync's new workouts into just the periods they fall in and return a new object
+    (this one is left untouched, as it may still be part of a published dataset snapshot).
+    '''
     
     def __init__(self, df_processed: pd.DataFrame):
-        self.df_pivots = self.create_df_for_pivots(df_processed)
+        df_pivots = self.create_df_for_pivots(df_processed)
+        self._set_totals(year_totals=self.aggregate_periods(df_pivots, 'annual_periods', 'year'),
+                         month_totals=self.aggregate_periods(df_pivots, 'monthly_periods', 'month'))
+
+    def with_new_rows(self, new_df_processed: pd.DataFrame) -> 'PelotonPivots':
+        ''' A copy of these pivots with the workouts in `new_df_processed` (processed-DataFrame 
+        rows not already counted here) added; only the years & months they touch are updated. '''
+        df_pivots = self.create_df_for_pivots(new_df_processed)
+        pivots = copy.copy(self)
+        pivots._set_totals(
+            year_totals=merge_period_totals(self.year_totals, 
+                                            self.aggregate_periods(df_pivots, 'annual_periods', 'year')),
+            month_totals=merge_period_totals(self.month_totals,
+                                             self.aggregate_periods(df_pivots, 'monthly_periods', 'month')))
+        return pivots
+
+    def _set_totals(self,
+                    year_totals: dict[pd.Period, PeriodTotals],
+                    month_totals: dict[pd.Period, PeriodTotals]) -> None:
+        self.year_totals = year_totals
+        self.month_totals = month_totals
         self.year_table = self.create_year_table()
         self.month_table = self.create_month_table()
         self.totals_table = self.create_totals_table()
 
-
-    def regenerate_tables(self, new_df_processed: pd.DataFrame) -> None:
-        self.df_pivots = self.create_df_for_pivots(new_df_processed)
-        self.year_table = self.create_year_table()
-        self.month_table = self.create_month_table()
-        self.totals_table = self.create_totals_table()
-        
+    @staticmethod
+    def aggregate_periods(df_pivots: pd.DataFrame, period_column: str, label_column: str) -> dict[pd.Period, PeriodTotals]:
+        ''' `PeriodTotals` for each year or month (`period_column`) in `df_pivots`. '''
+        df = df_pivots.reindex(columns=[period_column, label_column, 'title', 'date', 
+                                        'hours', 'distance', 'calories', 'output/min'])
+        aggregated = df.groupby(period_column, sort=False).agg(
+            label=(label_column, 'first'),
+            rides=('title', 'count'),
+            dates=('date', 'unique'),
+            hours=('hours', 'sum'),
+            distance=('distance', 'sum'),
+            calories_sum=('calories', 'sum'),
+            calories_count=('calories', 'count'),
+            output_sum=('output/min', 'sum'),
+            output_count=('output/min', 'count'),
+        )
+        return {period: PeriodTotals(**{**row, 'dates': frozenset(row['dates'][pd.notna(row['dates'])].tolist())})
+                for period, row in zip(aggregated.index, aggregated.to_dict('records'))}
 
     def create_df_for_pivots(self, df: pd.DataFrame) -> pd.DataFrame:  
+        ''' Adds the calendar columns the tables group by, all derived with vectorized `.dt` 
+        accessors.  `date` is an integer day key (`YYYYMMDD`), only used to count distinct days. '''
         df = df.copy()     
-        df_dti_localized = pd.DatetimeIndex(df['start_time']).tz_convert(tz=EASTERN_TIME)
-        df_dti = df_dti_localized.tz_localize(tz=None)
-
-        df['annual_periods'] = [x.to_period(freq='Y') for x in df_dti]
-        df['monthly_periods'] = [x.to_period(freq='M') for x in df_dti]
-        df['weekly_periods'] = [x.to_period(freq='W') for x in df_dti]
-        df['month'] = [x.month_name() + " " + str(x.year) for x in df_dti_localized]
-        df['year'] = [x.year for x in df_dti_localized]
-        df['days'] = [x.day for x in df_dti_localized]
-        df['date'] = [f"{str(x.year)}-{str(x.month)}-{str(x.day)}" for x in df_dti_localized]
+        start_times = pd.Series(pd.DatetimeIndex(df['start_time']).tz_convert(tz=EASTERN_TIME), index=df.index)
+        naive_start_times = start_times.dt.tz_localize(tz=None)
+        years = start_times.dt.year.astype('int64')
+        months = start_times.dt.month.astype('int64')
+        days = start_times.dt.day.astype('int64')
+
+        df['annual_periods'] = naive_start_times.dt.to_period(freq='Y')
+        df['monthly_periods'] = naive_start_times.dt.to_period(freq='M')
+        df['weekly_periods'] = naive_start_times.dt.to_period(freq='W')
+        df['month'] = start_times.dt.month_name() + " " + years.astype(str)
+        df['year'] = years
+        df['days'] = days
+        df['date'] = years * 10_000 + months * 100 + days
 
         df = df.rename(columns={
             'duration_hrs': 'hours', 
@@ -40,89 +127,20 @@ class PelotonPivots():
         return df.reset_index(drop=True)
 
 
+    @staticmethod
+    def _make_table(period_totals: dict[pd.Period, PeriodTotals], label_column: str, ascending: bool) -> pd.DataFrame:
+        periods = sorted(period_totals, reverse=not ascending)
+        table = pd.DataFrame([period_totals[period].as_row() for period in periods], columns=TABLE_COLUMNS)
+        table.insert(0, label_column, [period_totals[period].label for period in periods])
+        return table.round(2)
+
     def create_year_table(self, ascending: bool = True) -> pd.DataFrame:
         """ Generates a year-by-year pivot table from Peloton data """
-        
-        year_table = self.df_pivots.pivot_table(
-            values=[
-                'title', 
-                'date',
-                'hours',
-                'calories',
-                'distance',
-                'output/min',
-                ], 
-            index=['annual_periods', 'year'],
-            aggfunc= {
-                'title': 'count', 
-                'date': pd.Series.nunique, 
-                'hours': 'sum', 
-                'calories': 'mean', 
-                'distance': 'sum', 
-                'output/min': 'mean',
-                }
-            )
-
-        year_table = year_table.sort_values(by=['annual_periods'], ascending=ascending)
-        year_table = year_table.reset_index().drop(columns=['annual_periods']).round(2)
-        year_table = year_table.rename(columns={
-            'date': 'days',
-            'title': 'rides',
-            'calories': 'avg_calories',
-            'hours': 'total_hours',
-            'distance': 'total_miles',
-            'output/min': "avg_output/min",
-        })
-        # Change the column order
-        year_table = year_table.reindex(columns=['year', 'rides', 'days', 'total_hours', 
-                                                'total_miles', 'avg_calories', 'avg_output/min'])
-        
-        return year_table
-
+        return self._make_table(self.year_totals, 'year', ascending)
 
     def create_month_table(self, ascending: bool = True) -> pd.DataFrame:
         """ Generates a month-by-month pivot table from Peloton data """
-        
-        month_table = self.df_pivots.pivot_table( 
-            values=[
-                'title', 
-                'date',
-                'hours',
-                'calories',
-                'distance',
-                'output/min',
-                ], 
-            index=[
-                'annual_periods', 
-                'monthly_periods', 
-                'month',
-                ], 
-            aggfunc= {
-                'title': 'count', 
-                'date': pd.Series.nunique, 
-                'hours': 'sum', 
-                'calories': 'mean', 
-                'distance': 'sum', 
-                'output/min': 'mean',
-                }
-            )
-
-        month_table = month_table.sort_values(by=['monthly_periods'], ascending=ascending)
-        month_table = month_table.reset_index().drop(columns=['annual_periods', 'monthly_periods']).round(2)
-        month_table = month_table.rename(columns={
-            'date': 'days',
-            'title': 'rides',
-            'calories': 'avg_calories',
-            'hours': 'total_hours',
-            'distance': 'total_miles',
-            'output/min': "avg_output/min",
-        })
-        # Change the column order
-        month_table = month_table.reindex(columns=['month', 'rides', 'days', 'total_hours', 
-                                                'total_miles', 'avg_calories', 'avg_output/min'])
-        
-        return month_table
-
+        return self._make_table(self.month_totals, 'month', ascending)
 
     def create_totals_table(self) -> pd.DataFrame:
         """Takes an annual pivot table and returns a DataFrame with the grand totals (or averages)"""
@@ -138,6 +156,15 @@ class PelotonPivots():
         return totals_table
 
 
+def merge_period_totals(totals: dict[pd.Period, PeriodTotals], 
+                        new_totals: dict[pd.Period, PeriodTotals]) -> dict[pd.Period, PeriodTotals]:
+    ''' `totals` with `new_totals` added in (a new dict; neither argument is modified). '''
+    merged = dict(totals)
+    for period, period_totals in new_totals.items():
+        merged[period] = merged[period] + period_totals if period in merged else period_totals
+    return merged
+
+
 def main():
     print("This is a module, not a script.")
 
@@ -1,14 +1,27 @@
+import json
+import threading
 import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime
 
 import requests
+from requests.adapters import HTTPAdapter
 from pydantic import BaseModel, Field, field_serializer
 from typing_extensions import Optional, Self
 
 from peloton.helpers.constants import (PELOTON_BASE_URL, EASTERN_TIME,
-                        PELOTON_USER_ID, SESSION_JSON)
+                        PELOTON_USER_ID, SESSION_JSON, SYNC_WATERMARK_JSON,
+                        PELOTON_MAX_CONCURRENT_REQUESTS, PELOTON_REQUESTS_PER_SECOND,
+                        PELOTON_MAX_RETRIES, API_CACHE_TTLS, API_CACHE_FINAL_WORKOUT_STATUSES)
                         
 from peloton.helpers.exceptions import PelotonInstructorNotFoundError
+from peloton.helpers.http import TokenBucket, backoff_delay
+from peloton.helpers.latency import LatencyStats
+from peloton.handlers.response_cache import PelotonResponseCache
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+AUTH_ERROR_STATUS_CODES = {401, 403}
 
 
 class PelotonSessionIDToken(BaseModel):
@@ -57,6 +70,36 @@ class PelotonSessionIDToken(BaseModel):
         print("Done.")
 
 
+class PelotonSyncWatermark(BaseModel):
+    """
+    Represents the state of the remote workout listing as of the last completed sync.
+
+    Attributes:
+        - `total_workouts` (int): The user's total number of workouts on Peloton.
+        - `newest_workout_id` (Optional[str]): The ID of the most recently created workout.
+        - `newest_created_at` (Optional[int]): The `created_at` timestamp of the most recently created workout.
+
+    """
+
+    total_workouts: int
+    newest_workout_id: Optional[str] = None
+    newest_created_at: Optional[int] = None
+
+    @classmethod
+    def read_watermark_from_json(cls, filename: str = SYNC_WATERMARK_JSON) -> Self | None:
+        """ Factory method: reads the last sync watermark from a JSON file, if there is one. """
+        try:
+            with open(filename, "r") as file:
+                return cls.model_validate_json(file.read())
+        except FileNotFoundError:
+            return None
+
+    def write_watermark_to_json(self, filename: str = SYNC_WATERMARK_JSON) -> None:
+        """ Writes this sync watermark to a JSON file on the filesystem. """
+        with open(filename, "w") as file:
+            file.write(self.model_dump_json(indent=4))
+
+
 class PylotonZMV():
     """
     A class representing an object for connecting to Peloton and retrieving data.
@@ -66,6 +109,14 @@ class PylotonZMV():
         - `password` (str): The password for authentication.
         - `session` (`requests.Session`): The session object for making HTTP requests.
         - `total_workouts_num` (int): The total number of workouts.
+        - `base_url` (str): The root URL of the Peloton API (overridable for local testing).
+        - `user_id` (str): The Peloton user ID whose workouts are listed.
+        - `max_concurrent_requests` (int): The default number of workouts fetched in parallel.
+        - `max_retries` (int): How many times a request is retried after a 429/5xx or connection error.
+        - `rate_limiter` (`TokenBucket`): Caps the request rate across all threads.
+        - `latency_stats` (`LatencyStats`): Per-endpoint request counters.
+        - `response_cache` (`PelotonResponseCache` | None): Optional on-disk cache for slow-changing endpoints.
+        - `cache_ttls` (dict[str, float]): Seconds before a cached response (by endpoint) must be revalidated.
 
     Methods:
         - `create_new_session()`:
@@ -80,12 +131,18 @@ class PylotonZMV():
         - `get_workout_ids()`:
             Retrieves a list of workout IDs.
 
+        - `get_sync_watermark()`:
+            Retrieves the total workout count and the newest workout in a single request.
+
         - `get_workout_summary_by_id()`:
             Retrieves the summary of a workout by its ID.
 
         - `get_workout_metrics_by_id()`:
             Retrieves the metrics of a workout by its ID.
 
+        - `get_workouts_by_ids()`:
+            Concurrently retrieves the summaries & metrics of many workouts, yielding each as it completes.
+
         - `get_user_id()`:
             Retrieves the user ID.
 
@@ -95,17 +152,45 @@ class PylotonZMV():
         - `get_instructor_by_id()`:
             Retrieves the details of an instructor by their ID.
 
+        - `get_latency_stats()`:
+            Retrieves the per-endpoint request counters.
+
     """
-    def __init__(self, username: str, password: str) -> None:
+    def __init__(self, 
+                 username: str, 
+                 password: str, 
+                 base_url: str = PELOTON_BASE_URL,
+                 user_id: str = PELOTON_USER_ID,
+                 max_concurrent_requests: int = PELOTON_MAX_CONCURRENT_REQUESTS,
+                 requests_per_second: float = PELOTON_REQUESTS_PER_SECOND,
+                 max_retries: int = PELOTON_MAX_RETRIES,
+                 response_cache: PelotonResponseCache | None = None,
+                 cache_ttls: dict[str, float] = API_CACHE_TTLS) -> None:
         self.username = username
         self.password = password
+        self.base_url = base_url
+        self.user_id = user_id
+        self.max_concurrent_requests = max_concurrent_requests
+        self.max_retries = max_retries
         self.session = None
         self.total_workouts_num = None
+        self.rate_limiter = TokenBucket(rate=requests_per_second, capacity=max_concurrent_requests)
+        self.latency_stats = LatencyStats()
+        self.response_cache = response_cache
+        self.cache_ttls = cache_ttls
+        self._session_lock = threading.Lock()
+        self._login_lock = threading.Lock()
+        self._login_generation = 0
 
     def create_new_session(self) -> requests.Session:
         """ Creates a new session and sets the login token. """
         
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, 
+                              pool_maxsize=self.max_concurrent_requests, 
+                              pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         try:
             self.login_token = PelotonSessionIDToken.read_token_from_json()
         except FileNotFoundError:
@@ -120,43 +205,141 @@ class PylotonZMV():
     def get_new_login_token(self) -> None:
         """ Retrieves a new login token and sets it in the session. """
         
-        print("Getting new session ID and resuming in 3 seconds...")
-        time.sleep(3)
-        auth_login_url = f"{PELOTON_BASE_URL}/auth/login"
+        print("Getting new session ID...")
+        auth_login_url = f"{self.base_url}/auth/login"
         auth_payload = {'username_or_email': self.username, 'password': self.password}
         headers = {'Content-Type': 'application/json', 'User-Agent': 'pyloton'}
-        resp = self.session.post(url=auth_login_url,json=auth_payload, headers=headers, timeout=10)
-        resp.raise_for_status()
+        with self.latency_stats.timer('login'):
+            resp = self.session.post(url=auth_login_url,json=auth_payload, headers=headers, timeout=10)
+            resp.raise_for_status()
         
         self.login_token = PelotonSessionIDToken(session_id=resp.json()['session_id'], 
                                                  user_id=resp.json()['user_id'])
         self.login_token.write_token_to_json()
         self.session.cookies.set('peloton_session_id', self.login_token.session_id)
 
-    def get_total_workouts_num(self) -> int:
-        """ Retrieves the total number of workouts for the user. """
-        
+    def _ensure_session(self) -> None:
         if self.session is None:
-            self.create_new_session()
-        try:
-            resp = self.session.get(f"{PELOTON_BASE_URL}/api/me", timeout=10)
-            resp.raise_for_status()
-            return resp.json()["total_workouts"]
-        except requests.HTTPError:
+            with self._session_lock:
+                if self.session is None:
+                    self.create_new_session()
+
+    def _refresh_login(self, seen_generation: int) -> None:
+        """ Single-flight re-login: only the first caller to notice an expired session logs in 
+        again; concurrent callers block on the lock and then retry with the new cookie. """
+        with self._login_lock:
+            if self._login_generation != seen_generation:
+                return None
             self.get_new_login_token()
-            resp = self.session.get(f"{PELOTON_BASE_URL}/api/me", timeout=10)
+            self._login_generation += 1
+
+    def _request(self, method: str, url: str, endpoint: str, **kwargs) -> requests.Response:
+        """
+        Sends a request through the shared session, handling everything the public methods 
+        used to do by hand: rate limiting, exponential backoff with jitter on 429/5xx and 
+        connection errors, a single re-login on 401/403, and per-endpoint latency counters.
+
+        Args:
+            - `method` (str): The HTTP method.
+            - `url` (str): The full URL.
+            - `endpoint` (str): A short label for the endpoint, used as the latency-counter key.
+
+        Raises:
+            requests.HTTPError: If the final response is still an error.
+        """
+        
+        self._ensure_session()
+        kwargs.setdefault('timeout', 10)
+        attempt = 0
+        logged_in_again = False
+        while True:
+            self.rate_limiter.acquire()
+            login_generation = self._login_generation
+            start = time.perf_counter()
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.latency_stats.record(endpoint, time.perf_counter() - start, error=True)
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+            self.latency_stats.record(endpoint, time.perf_counter() - start, error=(not resp.ok))
+
+            if resp.status_code in AUTH_ERROR_STATUS_CODES and not logged_in_again:
+                self._refresh_login(login_generation)
+                logged_in_again = True
+                continue
+            if resp.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                time.sleep(backoff_delay(attempt, retry_after=resp.headers.get('Retry-After')))
+                attempt += 1
+                continue
+            
             resp.raise_for_status()
-            return resp.json()["total_workouts"]
+            return resp
+
+    def _get_json(self, url: str, endpoint: str, is_final: Callable[[dict], bool] | None = None) -> dict:
+        """
+        GETs a JSON payload, going through the response cache for endpoints that have a TTL.
+        Fresh entries are returned without touching the network; stale entries are revalidated
+        with `If-None-Match` / `If-Modified-Since`, and a `304` just renews the cached copy.
+        Payloads for which `is_final` returns False (e.g. a workout still in progress) are 
+        returned but not cached.
+        """
+        
+        ttl = self.cache_ttls.get(endpoint)
+        if self.response_cache is None or ttl is None:
+            return self._request('GET', url, endpoint=endpoint).json()
+
+        cached = self.response_cache.get(url)
+        if cached is not None and cached.is_fresh(ttl):
+            self.response_cache.record_hit()
+            return json.loads(cached.body)
+
+        headers = cached.validators if cached is not None else {}
+        resp = self._request('GET', url, endpoint=endpoint, headers=headers)
+        if resp.status_code == 304 and cached is not None:
+            self.response_cache.mark_revalidated(url)
+            return json.loads(cached.body)
+
+        payload = resp.json()
+        if is_final is not None and not is_final(payload):
+            return payload
+        self.response_cache.put(url=url, 
+                                endpoint=endpoint, 
+                                body=resp.content,
+                                etag=resp.headers.get('ETag'),
+                                last_modified=resp.headers.get('Last-Modified'))
+        return payload
+
+    def get_latency_stats(self) -> dict[str, dict]:
+        """ Retrieves the per-endpoint request counters (count, errors, total/mean/max seconds),
+        plus the response cache's hit/miss counters if a cache is configured. """
+        stats = self.latency_stats.as_dict()
+        if self.response_cache is not None:
+            stats['response_cache'] = self.response_cache.get_stats()
+        return stats
+
+    def get_total_workouts_num(self) -> int:
+        """ Retrieves the total number of workouts for the user. """
+        
+        resp = self._request('GET', f"{self.base_url}/api/me", endpoint='me')
+        return resp.json()["total_workouts"]
 
-    def get_workout_ids(self, num_workouts: int = None) -> list[str]:
-        """ Retrieves a list of workout IDs.
+    def get_workout_ids(self, num_workouts: int = None, known_ids: set[str] = None) -> list[str]:
+        """ Retrieves a list of workout IDs, newest first.
 
         Args:
             - `num_workouts` (int, optional): The number of workouts to retrieve. If not provided, retrieves all workouts.
+            - `known_ids` (set[str], optional): IDs that are already stored locally.  If provided, only the IDs 
+            *not* in this set are returned, and paging stops at the first page whose remaining IDs (from the 
+            first known one onward) are entirely known.  Since the listing is sorted newest-first, a routine 
+            sync then only needs a single page.
         """
         
-        if self.session is None:
-            self.create_new_session()
+        if known_ids is not None:
+            return self._get_unknown_workout_ids(known_ids)
         if num_workouts is None:
             num_workouts = (self.get_total_workouts_num() if self.total_workouts_num is None 
                                                     else self.total_workouts_num)
@@ -165,23 +348,51 @@ class PylotonZMV():
         pages = (1 if limit < 100 
                    else ((num_workouts // limit) + min(1, (num_workouts % limit))))
            
-        base_workout_url = f"{PELOTON_BASE_URL}/api/user/{PELOTON_USER_ID}/workouts?sort_by=-created"
         workout_id_list = []
         for page in range(pages):
-            url = f"{base_workout_url}&page={page}&limit={limit}"
-            try:
-                resp = self.session.get(url, timeout=10)
-                resp.raise_for_status()
-            except requests.HTTPError:
-                self.get_new_login_token()
-                resp = self.session.get(url, timeout=10)
-                resp.raise_for_status()
-                
-            for dataset in resp.json()['data']:
+            for dataset in self._get_workout_ids_page(page, limit)['data']:
                 workout_id_list.append(dataset['id'])
 
         return workout_id_list
 
+    def get_sync_watermark(self) -> PelotonSyncWatermark:
+        """ Retrieves the total number of workouts and the newest workout's ID and `created_at` 
+        timestamp, using a single one-item request to the (newest-first) workout listing. """
+        
+        resp_json = self._get_workout_ids_page(page=0, limit=1)
+        total_workouts = resp_json.get('total')
+        if total_workouts is None:
+            total_workouts = self.get_total_workouts_num()
+        self.total_workouts_num = total_workouts
+
+        newest = resp_json['data'][0] if len(resp_json['data']) > 0 else {}
+        return PelotonSyncWatermark(total_workouts=total_workouts,
+                                    newest_workout_id=newest.get('id'),
+                                    newest_created_at=newest.get('created_at'))
+
+    def _get_unknown_workout_ids(self, known_ids: set[str], limit: int = 100) -> list[str]:
+        unknown_id_list = []
+        page = 0
+        while True:
+            page_ids = [dataset['id'] for dataset in self._get_workout_ids_page(page, limit)['data']]
+            is_known = [workout_id in known_ids for workout_id in page_ids]
+            unknown_id_list.extend(workout_id for workout_id, known in zip(page_ids, is_known) if not known)
+            if len(page_ids) < limit:
+                break
+            # Once we reach stored workouts, everything older is stored too -- unless an earlier 
+            # sync crashed partway, which would leave unknown IDs *after* the first known one.
+            first_known_idx = is_known.index(True) if True in is_known else None
+            if first_known_idx is not None and all(is_known[first_known_idx:]):
+                break
+            page += 1
+
+        print(f"Listed {page + 1} page(s) of workouts; found {len(unknown_id_list)} new.")
+        return unknown_id_list
+
+    def _get_workout_ids_page(self, page: int, limit: int) -> dict:
+        url = f"{self.base_url}/api/user/{self.user_id}/workouts?sort_by=-created&page={page}&limit={limit}"
+        return self._request('GET', url, endpoint='workout_list').json()
+
     def get_workout_summary_by_id(self, workout_id: str) -> dict:
         """
         Retrieves the summary of a workout by its ID.
@@ -190,72 +401,88 @@ class PylotonZMV():
             - `workout_id` (str): The ID of the workout.
         """
         
-        if self.session is None:
-            self.create_new_session()
-        url = f"{PELOTON_BASE_URL}/api/workout/{workout_id}"
-        try:
-            resp = self.session.get(url, timeout=10)
-            resp.raise_for_status()
-        except requests.HTTPError:
-            self.get_new_login_token()
-            resp = self.session.get(url, timeout=10)
-            resp.raise_for_status()
-            
-        output_dict: dict = resp.json()
+        url = f"{self.base_url}/api/workout/{workout_id}"
+        output_dict: dict = self._get_json(url, 
+                                           endpoint='workout_summary',
+                                           is_final=lambda payload: payload.get('status') in API_CACHE_FINAL_WORKOUT_STATUSES)
         output_dict.update({'workout_id': workout_id}) 
         return output_dict
 
-    def get_workout_metrics_by_id(self, workout_id: str, frequency: int = 5) -> dict:
+    def get_workout_metrics_by_id(self, workout_id: str, frequency: int = 5, workout_complete: bool = True) -> dict:
         """
         Retrieves the metrics of a workout by its ID.
 
         Args:
             - `workout_id` (str): The ID of the workout.
             - `frequency` (int, optional): The frequency of the metrics data points. Default is 5.
+            - `workout_complete` (bool, optional): Whether the workout has finished.  Metrics of 
+            unfinished workouts are not cached.  Default is True.
         """
         
-        if self.session is None:
-            self.create_new_session()
-        url = f"{PELOTON_BASE_URL}/api/workout/{workout_id}/performance_graph?every_n={frequency}"
-        try:
-            resp = self.session.get(url, timeout=10)
-            resp.raise_for_status()
-        except requests.HTTPError:
-            self.get_new_login_token()
-            resp = self.session.get(url, timeout=10)
-            resp.raise_for_status()
-            
-        output_dict: dict = resp.json()
+        url = f"{self.base_url}/api/workout/{workout_id}/performance_graph?every_n={frequency}"
+        output_dict: dict = self._get_json(url, 
+                                           endpoint='workout_metrics', 
+                                           is_final=lambda payload: workout_complete)
         output_dict.update({'workout_id': workout_id}) 
         return output_dict
 
+    def _get_workout_by_id(self, workout_id: str, frequency: int) -> tuple[str, dict, dict]:
+        summary_raw = self.get_workout_summary_by_id(workout_id)
+        metrics_raw = self.get_workout_metrics_by_id(
+            workout_id, frequency, workout_complete=(summary_raw.get('status') in API_CACHE_FINAL_WORKOUT_STATUSES))
+        return (workout_id, summary_raw, metrics_raw)
+
+    def get_workouts_by_ids(self, 
+                            workout_ids: Iterable[str], 
+                            max_concurrent_requests: int = None,
+                            frequency: int = 5) -> Iterator[tuple[str, dict, dict]]:
+        """
+        Concurrently retrieves the summaries & metrics of many workouts.  Results are yielded 
+        in completion order (not input order) as soon as both payloads for a workout have 
+        arrived, so callers can start validating and persisting before the last request finishes.
+
+        Args:
+            - `workout_ids` (Iterable[str]): The IDs of the workouts.
+            - `max_concurrent_requests` (int, optional): The number of workouts fetched in parallel. 
+            Defaults to `self.max_concurrent_requests`.
+            - `frequency` (int, optional): The frequency of the metrics data points. Default is 5.
+
+        Yields:
+            tuple[str, dict, dict]: The workout ID, the raw summary, and the raw metrics.
+        """
+        
+        self._ensure_session()
+        max_workers = max(1, max_concurrent_requests or self.max_concurrent_requests)
+        max_pending = max_workers * 2   # keeps the queue bounded for very large backfills
+
+        workout_id_iter = iter(workout_ids)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pyloton') as executor:
+            pending: set[Future] = set()
+            try:
+                for workout_id in workout_id_iter:
+                    pending.add(executor.submit(self._get_workout_by_id, workout_id, frequency))
+                    if len(pending) < max_pending:
+                        continue
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                        
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
     def get_user_id(self) -> str:
         """ Retrieves the user ID. """
-        if self.session is None:
-            self.create_new_session()
-        try:
-            resp = self.session.get(f"{PELOTON_BASE_URL}/api/me", timeout=10)
-            resp.raise_for_status()
-            return resp.json()["id"]
-        except requests.HTTPError:
-            self.get_new_login_token()
-            resp = self.session.get(f"{PELOTON_BASE_URL}/api/me", timeout=10)
-            resp.raise_for_status()
-            return resp.json()["id"]
+        resp = self._request('GET', f"{self.base_url}/api/me", endpoint='me')
+        return resp.json()["id"]
 
     def get_all_instructors(self) -> dict:
         """ Retrieves a dictionary of all instructors. """
-        if self.session is None:
-            self.create_new_session()
-        try:
-            resp = self.session.get(f"{PELOTON_BASE_URL}/api/instructor?page=0&limit=100", timeout=10)
-            resp.raise_for_status()
-            return resp.json()
-        except requests.HTTPError:
-            self.get_new_login_token()
-            resp = self.session.get(f"{PELOTON_BASE_URL}/api/instructor?page=0&limit=100", timeout=10)
-            resp.raise_for_status()
-            return resp.json()
+        return self._get_json(f"{self.base_url}/api/instructor?page=0&limit=100", endpoint='instructors')
 
     def get_instructor_by_id(self, instructor_id: str) -> dict | None:
         """
@@ -264,25 +491,15 @@ class PylotonZMV():
         Args:
             - `instructor_id` (str): The ID of the instructor.
         """
-        
-        if self.session is None:
-            self.create_new_session()
             
-        url = f"{PELOTON_BASE_URL}/api/instructor/{instructor_id}"
+        url = f"{self.base_url}/api/instructor/{instructor_id}"
         try:
-            resp = self.session.get(url, timeout=10)
-            resp.raise_for_status()
-        except requests.HTTPError:
-            if resp.status_code == 401:
-                self.get_new_login_token()
-                resp = self.session.get(url, timeout=10)
-                resp.raise_for_status()
-            elif resp.status_code == 404:
+            instructor_data = self._get_json(url, endpoint='instructor')
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
                 raise PelotonInstructorNotFoundError(f"Instructor ID '{instructor_id}' not found.")
-            else:
-                raise requests.HTTPError
+            raise
             
-        instructor_data = resp.json()
         return instructor_data
 
 
@@ -0,0 +1,151 @@
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+
+from peloton.helpers.constants import API_CACHE_DB, API_CACHE_MAX_BYTES
+
+
+@dataclass(frozen=True)
+class PelotonCachedResponse():
+    url: str
+    endpoint: str
+    body: bytes
+    etag: str | None
+    last_modified: str | None
+    fetched_at: float
+
+    def is_fresh(self, ttl_seconds: float) -> bool:
+        return (time.time() - self.fetched_at) < ttl_seconds
+
+    @property
+    def validators(self) -> dict[str, str]:
+        ''' Conditional-request headers for revalidating this response. '''
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class PelotonResponseCache():
+    ''' Persistent, size-bounded (LRU) cache of Peloton API response bodies, keyed by URL.
+
+    Stored in a single SQLite file; bodies are zlib-compressed.  Freshness is decided by the
+    caller (per-endpoint TTLs live in `API_CACHE_TTLS`), and stale entries keep their
+    ETag / Last-Modified validators so they can be revalidated with a conditional request.
+
+    The total size is summed once, on connect, and then kept up to date in memory (`_total_bytes`).
+    '''
+
+    def __init__(self, filename: Path = API_CACHE_DB, max_bytes: int = API_CACHE_MAX_BYTES):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'evicted': 0}
+        self._conn = None
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.filename, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)")
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return self._conn
+
+    def get(self, url: str) -> PelotonCachedResponse | None:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT endpoint, body, etag, last_modified, fetched_at FROM responses WHERE url = ?",
+                (url,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), url))
+
+        endpoint, body, etag, last_modified, fetched_at = row
+        return PelotonCachedResponse(url=url,
+                                     endpoint=endpoint,
+                                     body=zlib.decompress(body),
+                                     etag=etag,
+                                     last_modified=last_modified,
+                                     fetched_at=fetched_at)
+
+    def put(self,
+            url: str,
+            endpoint: str,
+            body: bytes,
+            etag: str | None = None,
+            last_modified: str | None = None) -> None:
+        compressed = zlib.compress(body, level=1)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            replaced = conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, endpoint, compressed, etag, last_modified, now, now, len(compressed)))
+            self._total_bytes += len(compressed) - (replaced[0] if replaced is not None else 0)
+            self._evict(conn)
+
+    def mark_revalidated(self, url: str) -> None:
+        ''' Resets the freshness clock of an entry after a `304 Not Modified`. '''
+        now = time.time()
+        with self._lock:
+            self._connect().execute(
+                "UPDATE responses SET fetched_at = ?, last_access = ? WHERE url = ?", (now, now, url))
+            self.stats['revalidated'] += 1
+
+    def record_hit(self) -> None:
+        with self._lock:
+            self.stats['hits'] += 1
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        if self._total_bytes <= self.max_bytes:
+            return None
+
+        excess = self._total_bytes - self.max_bytes
+        freed = 0
+        urls_to_evict = []
+        for url, size in conn.execute("SELECT url, size FROM responses ORDER BY last_access"):
+            urls_to_evict.append((url,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM responses WHERE url = ?", urls_to_evict)
+        self._total_bytes -= freed
+        self.stats['evicted'] += len(urls_to_evict)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM responses")
+            self._total_bytes = 0
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            conn = self._connect()
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {**self.stats, 'entries': entries, 'bytes': self._total_bytes, 'max_bytes': self.max_bytes}
+
+
+def main():
+    print("This is a module, not a script.")
+
+if __name__ == '__main__':
+    main()
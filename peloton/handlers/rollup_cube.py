@@ -0,0 +1,131 @@
+import copy
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from peloton.helpers.constants import EASTERN_TIME
+
+DIMENSIONS = ('fitness_discipline', 'instructor_name', 'workout_type')
+GRAIN_FREQS = {'day': 'D', 'week': 'W', 'month': 'M', 'year': 'Y', 'all': None}
+# processed-DataFrame column -> cube measure (summed within each cell)
+MEASURE_COLUMNS = {
+    'duration_hrs': 'hours',
+    'distance': 'distance',
+    'calories': 'calories_sum',
+    'output_per_min': 'output_sum',
+    'total_output': 'total_output',
+    'effort_score': 'effort_score',
+}
+
+
+class PelotonRollupCube():
+    ''' Pre-aggregated workout totals at daily grain, keyed by discipline, instructor and
+    workout type, that roll up on demand to any coarser grain, breakdown or date range.
+
+    `cells` holds one row per (day, fitness_discipline, instructor_name, workout_type) that
+    has workouts, with additive measures only (counts & sums -- means are kept as sum/count
+    pairs), so any rollup is a groupby-sum over the cells rather than a pass over the workouts,
+    and new workouts merge in with `with_new_rows`.
+    '''
+
+    def __init__(self, df_processed: pd.DataFrame):
+        self.cells = self.make_cells(df_processed)
+
+    @staticmethod
+    def make_cells(df_processed: pd.DataFrame) -> pd.DataFrame:
+        ''' Aggregates processed-DataFrame rows into daily cells. '''
+        df = df_processed.reindex(columns=['start_time', *DIMENSIONS, *MEASURE_COLUMNS])
+        cells = pd.DataFrame({
+            'day': pd.DatetimeIndex(df['start_time']).tz_convert(tz=EASTERN_TIME).tz_localize(tz=None).normalize(),
+            **{dimension: df[dimension].astype(object) for dimension in DIMENSIONS},
+            'workouts': np.ones(len(df), dtype='int64'),
+            **{measure: df[column].astype('float64') for column, measure in MEASURE_COLUMNS.items()},
+            'calories_count': df['calories'].notna().astype('int64'),
+            'output_count': df['output_per_min'].notna().astype('int64'),
+        })
+        return PelotonRollupCube._sum_cells(cells)
+
+    @staticmethod
+    def _sum_cells(cells: pd.DataFrame) -> pd.DataFrame:
+        return (cells.groupby(['day', *DIMENSIONS], dropna=False, sort=True)
+                .sum(min_count=0)
+                .reset_index())
+
+    def with_new_rows(self, new_df_processed: pd.DataFrame) -> 'PelotonRollupCube':
+        ''' A copy of this cube with the workouts in `new_df_processed` (processed-DataFrame rows
+        not already counted here) merged in; this one is left untouched. '''
+        cube = copy.copy(self)
+        cube.cells = self._sum_cells(pd.concat([self.cells, self.make_cells(new_df_processed)], ignore_index=True))
+        return cube
+
+    def rollup(self,
+               grain: str = 'month',
+               by: list[str] | tuple[str, ...] = (),
+               start: date | None = None,
+               end: date | None = None,
+               filters: dict[str, str] | None = None) -> pd.DataFrame:
+        '''
+        Rolls the cube up to `grain`, broken down by the `by` dimensions.
+
+        Args:
+            grain (str): 'day', 'week' (Monday-Sunday), 'month', 'year' or 'all' (no period column).
+            by (list[str]): Any of `DIMENSIONS` to break the totals down by.
+            start, end (date, optional): Only include workouts on or after `start` / on or before `end`.
+            filters (dict, optional): `{dimension: value}` pairs the workouts must match.
+
+        Returns:
+            pd.DataFrame: One row per period (and breakdown), sorted; with `rides`, `days`,
+                `total_hours`, `total_miles`, `avg_calories`, `avg_output/min`, `total_output`
+                & `total_effort_score`.
+        '''
+        filters = filters or {}
+        if grain not in GRAIN_FREQS:
+            raise ValueError(f"Unknown grain '{grain}' (expected one of: {', '.join(GRAIN_FREQS)})")
+        unknown_dimensions = [dimension for dimension in [*by, *filters] if dimension not in DIMENSIONS]
+        if len(unknown_dimensions) > 0:
+            raise ValueError(f"Unknown dimension(s): {', '.join(unknown_dimensions)} "
+                             f"(expected any of: {', '.join(DIMENSIONS)})")
+
+        cells = self.cells
+        mask = np.ones(len(cells), dtype=bool)
+        if start is not None:
+            mask &= (cells['day'] >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            mask &= (cells['day'] <= pd.Timestamp(end)).to_numpy()
+        for dimension, value in filters.items():
+            mask &= (cells[dimension] == value).fillna(False).to_numpy(dtype=bool)
+        cells = cells[mask]
+
+        keys = list(dict.fromkeys(by))
+        if GRAIN_FREQS[grain] is not None:
+            cells = cells.assign(period=cells['day'].dt.to_period(freq=GRAIN_FREQS[grain]))
+            keys = ['period', *keys]
+        grouped = cells.groupby(keys, dropna=False, sort=True) if len(keys) > 0 else cells.groupby(np.zeros(len(cells)))
+        table = grouped.agg(
+            rides=('workouts', 'sum'),
+            days=('day', 'nunique'),
+            total_hours=('hours', 'sum'),
+            total_miles=('distance', 'sum'),
+            calories_sum=('calories_sum', 'sum'),
+            calories_count=('calories_count', 'sum'),
+            output_sum=('output_sum', 'sum'),
+            output_count=('output_count', 'sum'),
+            total_output=('total_output', 'sum'),
+            total_effort_score=('effort_score', 'sum'),
+        )
+        table['avg_calories'] = table['calories_sum'] / table['calories_count'].where(table['calories_count'] > 0)
+        table['avg_output/min'] = table['output_sum'] / table['output_count'].where(table['output_count'] > 0)
+        table = (table.drop(columns=['calories_sum', 'calories_count', 'output_sum', 'output_count'])
+                 .reset_index(drop=(len(keys) == 0)))
+        if 'period' in table.columns:
+            table['period'] = table['period'].astype(str)
+        return table.reindex(columns=[*keys, 'rides', 'days', 'total_hours', 'total_miles', 'avg_calories',
+                                      'avg_output/min', 'total_output', 'total_effort_score']).round(2)
+
+
+def main():
+    print("This is a module, not a script.")
+
+if __name__ == '__main__':
+    main()
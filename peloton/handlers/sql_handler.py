@@ -1,53 +1,257 @@
 import json
+from collections.abc import Iterable
+from itertools import batched
 
 import sqlalchemy as db
-from sqlalchemy.dialects.sqlite import TEXT
+from sqlalchemy.dialects.sqlite import BLOB, INTEGER, REAL, TEXT, insert
 
+from peloton.helpers.constants import SQLITE_BATCH_SIZE
+from peloton.helpers.functions import compress_json, decompress_json
+from peloton.helpers.latency import LatencyStats
 from peloton.models import PelotonMetrics, PelotonSummary, PelotonWorkoutData
 
-metadata_obj = db.MetaData()
+# Scalar summary fields copied into their own (indexed) columns so filters can run in SQL.
+INDEXED_COLUMNS = ('start_time', 'fitness_discipline', 'instructor_id', 'workout_type')
+METRICS_SUMMARY_COLUMNS = ('total_output', 'distance', 'calories')
+RAW_PAYLOAD_COLUMNS = ('summary_raw', 'metrics_raw')
+# The per-interval series live in the metrics store, not in the `metrics` JSON
+METRIC_VALUES_EXCLUDE = {'metrics': {'__all__': {'values'}}}
+
+
+def enable_sqlite_wal(sql_engine: db.Engine) -> None:
+    ''' Puts every connection from `sql_engine` in WAL mode, so readers (the API)
+    don't block on, or get blocked by, a sync writing new workouts. '''
+    @db.event.listens_for(sql_engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
 
 class PelotonSQL():
-    def __init__(self, sql_engine: db.Engine, table_name: str = "peloton_json"):
+    ''' SQLite backend for `PelotonProcessor`.
+
+    Each workout is one row: the scalar summary fields (start time as a Unix timestamp,
+    discipline, instructor, output, distance...) in their own columns -- the commonly-filtered
+    ones indexed -- plus the full `summary`/`metrics` models as JSON text (minus the metric
+    series, which live in the metrics store) and the raw API payloads as zlib-compressed JSON 
+    (only read by `get_raw_payloads` & `get_workout`).
+    '''
+    def __init__(self,
+                 sql_engine: db.Engine,
+                 table_name: str = "peloton_workouts",
+                 instructors_table_name: str = "peloton_instructors"):
         self.sql_engine = sql_engine
+        if sql_engine.dialect.name == 'sqlite':
+            enable_sqlite_wal(sql_engine)
+        self.metadata_obj = db.MetaData()
         self.peloton_table = self.create_table(table_name)
+        self.instructors_table = self.create_instructors_table(instructors_table_name)
+        self.metadata_obj.create_all(self.sql_engine)
+        self.latency_stats = LatencyStats()
 
     def create_table(self, table_name: str) -> db.Table:
         peloton_table = db.Table(
             table_name,
-            metadata_obj,
+            self.metadata_obj,
             db.Column("workout_id", TEXT, primary_key=True),
-            db.Column("summary_raw", TEXT, nullable=False),
-            db.Column("metrics_raw", TEXT, nullable=False),
+            db.Column("start_time", INTEGER, nullable=False),
+            db.Column("end_time", INTEGER),
+            db.Column("fitness_discipline", TEXT),
+            db.Column("workout_type", TEXT),
+            db.Column("instructor_id", TEXT),
+            db.Column("title", TEXT),
+            db.Column("ride_duration", INTEGER),
+            db.Column("total_output", REAL),
+            db.Column("distance", REAL),
+            db.Column("calories", REAL),
+            db.Column("summary_raw", BLOB),
+            db.Column("metrics_raw", BLOB),
             db.Column("summary", TEXT, nullable=False),
             db.Column("metrics", TEXT, nullable=False),
+            *[db.Index(f"ix_{table_name}_{column}", column) for column in INDEXED_COLUMNS]
         )
         return peloton_table
 
-    def get_workout_id_list(self) -> list[str]: ...
+    def create_instructors_table(self, table_name: str) -> db.Table:
+        instructors_table = db.Table(
+            table_name,
+            self.metadata_obj,
+            db.Column("instructor_id", TEXT, primary_key=True),
+            db.Column("instructor", TEXT, nullable=False),
+        )
+        return instructors_table
+
+    def get_latency_stats(self) -> dict[str, dict]:
+        """ Retrieves the per-operation counters (count, errors, total/mean/max seconds). """
+        return self.latency_stats.as_dict()
+
+    @staticmethod
+    def _make_row(workout: PelotonWorkoutData) -> dict:
+        summary = workout.summary
+        metrics_summaries = {metric.slug: metric.value for metric in workout.metrics.summaries}
+        return {
+            'workout_id': workout.workout_id,
+            'start_time': int(summary.start_time.timestamp()),
+            'end_time': int(summary.end_time.timestamp()),
+            'fitness_discipline': summary.ride.fitness_discipline,
+            'workout_type': summary.workout_type,
+            'instructor_id': summary.ride.instructor_id,
+            'title': summary.ride.title,
+            'ride_duration': summary.ride.ride_duration,
+            **{column: metrics_summaries.get(column) for column in METRICS_SUMMARY_COLUMNS},
+            'summary_raw': compress_json(workout.summary_raw) if workout.has_raw_payloads else None,
+            'metrics_raw': compress_json(workout.metrics_raw) if workout.has_raw_payloads else None,
+            'summary': summary.model_dump_json(),
+            'metrics': workout.metrics.model_dump_json(exclude=METRIC_VALUES_EXCLUDE),
+        }
+
+    @staticmethod
+    def _make_workout(row: db.Row) -> PelotonWorkoutData:
+        row = row._mapping
+        summary_raw, metrics_raw = row.get('summary_raw'), row.get('metrics_raw')
+        metrics = json.loads(row['metrics'])
+        for metric in metrics['metrics']:
+            metric.pop('values', None)   # rows written before `drop_metric_values` ran
+        return PelotonWorkoutData(
+            workout_id=row['workout_id'],
+            summary_raw=decompress_json(summary_raw) if summary_raw is not None else None,
+            metrics_raw=decompress_json(metrics_raw) if metrics_raw is not None else None,
+            summary=PelotonSummary.model_validate_json(row['summary']),
+            metrics=PelotonMetrics.model_validate(metrics)
+        )
+
+    def _select_workouts(self, include_raw: bool = False) -> db.Select:
+        columns = [column for column in self.peloton_table.columns 
+                   if include_raw or column.name not in RAW_PAYLOAD_COLUMNS]
+        return db.select(*columns).order_by(self.peloton_table.c.start_time)
+
+    def get_workout_id_list(self) -> list[str]:
+        stmt = db.select(self.peloton_table.c.workout_id)
+        with self.latency_stats.timer('get_workout_id_list'):
+            with self.sql_engine.connect() as conn:
+                return list(conn.execute(stmt).scalars())
 
-    def ingest_workouts(self) -> list[PelotonWorkoutData]:
-        print("getting workouts from SQL")
-        stmt = db.select(self.peloton_table)
-        with self.sql_engine.connect() as conn:
-            workouts = [row for row in conn.execute(stmt)]
+    def ingest_workouts(self, include_raw: bool = False) -> list[PelotonWorkoutData]:
+        ''' Loads every workout, oldest first; the raw API payloads are left in the 
+        database (see `get_raw_payloads`) unless `include_raw` is set. '''
+        print("Getting workouts from SQLite...")
+        stmt = self._select_workouts(include_raw)
+        with self.latency_stats.timer('ingest_workouts'):
+            with self.sql_engine.connect() as conn:
+                return [self._make_workout(row) for row in conn.execute(stmt)]
+
+    def get_raw_payloads(self, workout_ids: list[str]) -> dict[str, tuple[dict, dict]]:
+        ''' `{workout_id: (summary_raw, metrics_raw)}` for each of `workout_ids` that has them. '''
+        table = self.peloton_table
+        output_dict = {}
+        with self.latency_stats.timer('get_raw_payloads'):
+            with self.sql_engine.connect() as conn:
+                for chunk in batched(workout_ids, SQLITE_BATCH_SIZE):   # stay under SQLite's variable limit
+                    stmt = (db.select(table.c.workout_id, table.c.summary_raw, table.c.metrics_raw)
+                            .where(table.c.workout_id.in_(chunk))
+                            .where(table.c.summary_raw.is_not(None), table.c.metrics_raw.is_not(None)))
+                    output_dict.update({row.workout_id: (decompress_json(row.summary_raw), 
+                                                         decompress_json(row.metrics_raw))
+                                        for row in conn.execute(stmt)})
+        return output_dict
+
+    def drop_metric_values(self, workout_ids: list[str]) -> int:
+        ''' Removes the per-interval series from the stored `metrics` JSON of `workout_ids` (call 
+        it once the metrics store has them; the raw payloads still hold the originals).
+
+        Returns:
+            int: Number of rows changed
+        '''
+        table = self.peloton_table
+        num_changed = 0
+        with self.latency_stats.timer('drop_metric_values'):
+            with self.sql_engine.begin() as conn:
+                for chunk in batched(workout_ids, SQLITE_BATCH_SIZE):
+                    stmt = (db.select(table.c.workout_id, table.c.metrics)
+                            .where(table.c.workout_id.in_(chunk))
+                            .where(table.c.metrics.like('%"values":[%')))
+                    updates = []
+                    for row in conn.execute(stmt).all():
+                        metrics = json.loads(row.metrics)
+                        for metric in metrics['metrics']:
+                            metric.pop('values', None)
+                        updates.append({'b_workout_id': row.workout_id, 'metrics': json.dumps(metrics)})
+                    if len(updates) > 0:
+                        conn.execute(table.update()
+                                     .where(table.c.workout_id == db.bindparam('b_workout_id'))
+                                     .values(metrics=db.bindparam('metrics')), updates)
+                    num_changed += len(updates)
+        return num_changed
+
+    def upsert_workouts(self,
+                        workouts: Iterable[PelotonWorkoutData],
+                        chunk_size: int = SQLITE_BATCH_SIZE) -> int:
+        ''' Inserts or overwrites `workouts` (matched on `workout_id`), one transaction
+        per `chunk_size` rows.  Idempotent, so a sync that died partway through can
+        simply be re-run.  Stored raw payloads are kept for workouts without them loaded.
+
+        Returns:
+            int: Number of workouts written
+        '''
+        def make_upsert(overwrite_raw: bool) -> db.Insert:
+            stmt = insert(self.peloton_table)
+            return stmt.on_conflict_do_update(
+                index_elements=[self.peloton_table.c.workout_id],
+                set_={column.name: stmt.excluded[column.name]
+                      for column in self.peloton_table.columns 
+                      if not column.primary_key and (overwrite_raw or column.name not in RAW_PAYLOAD_COLUMNS)})
         
-        return [PelotonWorkoutData(
-            workout_id=workout[0],
-            summary_raw=json.loads(workout[1]),
-            metrics_raw=json.loads(workout[2]),
-            summary=PelotonSummary.model_validate_json(workout[3]),
-            metrics=PelotonMetrics.model_validate_json(workout[4])
-        ) for workout in workouts]
+        stmt_with_raw, stmt_without_raw = make_upsert(overwrite_raw=True), make_upsert(overwrite_raw=False)
+        num_written = 0
+        for chunk in batched(workouts, chunk_size):
+            rows_with_raw = [self._make_row(workout) for workout in chunk if workout.has_raw_payloads]
+            rows_without_raw = [self._make_row(workout) for workout in chunk if not workout.has_raw_payloads]
+            with self.latency_stats.timer('upsert_workouts'):
+                with self.sql_engine.begin() as conn:
+                    if len(rows_with_raw) > 0:
+                        conn.execute(stmt_with_raw, rows_with_raw)
+                    if len(rows_without_raw) > 0:
+                        conn.execute(stmt_without_raw, rows_without_raw)
+            num_written += len(chunk)
+        return num_written
 
     def export_workout(self, workout: PelotonWorkoutData) -> None:
-        with self.sql_engine.connect() as conn:
-            conn.execute(
-                db.insert(self.peloton_table).values(workout.model_dump_json())
-            )
-            conn.commit()
-
-    def update_workout(self, workout: PelotonWorkoutData) -> None: ...
-    def get_workout(self, workout_id: str) -> PelotonWorkoutData: ...
-    def get_instructor(self, instructor_id: str) -> dict: ...
-    def add_instructor(self, instructor: dict) -> None: ...  
+        print(f"Exporting workout {workout.workout_id} to SQLite...")
+        self.upsert_workouts([workout])
+
+    def update_workout(self, workout: PelotonWorkoutData) -> None:
+        print(f"Updating workout {workout.workout_id} on SQLite with new data...")
+        self.upsert_workouts([workout])
+
+    def get_workout(self, workout_id: str) -> PelotonWorkoutData | None:
+        stmt = db.select(self.peloton_table).where(self.peloton_table.c.workout_id == workout_id)
+        with self.latency_stats.timer('get_workout'):
+            with self.sql_engine.connect() as conn:
+                row = conn.execute(stmt).one_or_none()
+        return self._make_workout(row) if row is not None else None
+
+    def get_instructor(self, instructor_id: str) -> dict | None:
+        stmt = (db.select(self.instructors_table.c.instructor)
+                .where(self.instructors_table.c.instructor_id == instructor_id))
+        with self.latency_stats.timer('get_instructor'):
+            with self.sql_engine.connect() as conn:
+                instructor = conn.execute(stmt).scalar_one_or_none()
+        return json.loads(instructor) if instructor is not None else None
+
+    def add_instructor(self, instructor: dict) -> None:
+        stmt = insert(self.instructors_table).values(instructor_id=instructor['instructor_id'],
+                                                     instructor=json.dumps(instructor))
+        stmt = stmt.on_conflict_do_update(index_elements=[self.instructors_table.c.instructor_id],
+                                          set_={'instructor': stmt.excluded.instructor})
+        with self.latency_stats.timer('add_instructor'):
+            with self.sql_engine.begin() as conn:
+                conn.execute(stmt)
+
+
+def main():
+    print("This is a module, not a script.")
+
+if __name__ == '__main__':
+    main()
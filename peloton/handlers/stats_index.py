@@ -0,0 +1,91 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+# A week counts towards the streak if any day from its Monday through the *following* Monday
+# (inclusive, i.e. 8 days) has a workout -- the window `make_stats_summary` has always used.
+STREAK_WINDOW_DAYS = 8
+
+
+def _as_number(value: np.number) -> int | float:
+    ''' A plain Python number (an `int` when the value is integral), so results stay JSON-friendly. '''
+    value = value.item()
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+
+class PelotonStatsIndex():
+    ''' Day-grained index over the workout history for fast window stats & weekly streaks.
+
+    Built from per-day totals (see `PelotonChartMaker.daily_totals`):
+        - `days`: sorted ordinals (`date.toordinal()`) of the days with workouts
+        - `prefix_sums`: running totals of workouts, duration, calories & strive score over
+          `days`, so the totals for any date range are two `searchsorted`s and a subtraction
+        - `active`: a per-day activity bitmap from the first to the last active day
+        - `week_streaks`: for each week (by Monday), the length of the run of consecutive
+          active weeks ending with it
+
+    Every query is O(log N) or O(1) in the number of workout days.
+    '''
+    MEASURES = ('workouts', 'duration', 'calories', 'strive_score')
+
+    def __init__(self, daily_totals: dict):
+        days = sorted(daily_totals)
+        self.days = np.array([day.toordinal() for day in days], dtype=np.int64)
+        self.prefix_sums = {
+            measure: np.concatenate([[0], np.cumsum(np.array([getattr(daily_totals[day], measure) for day in days],
+                                                              dtype=np.float64))])
+            for measure in self.MEASURES
+        }
+
+        first_day = days[0] if len(days) > 0 else date.today()
+        self.first_day = first_day.toordinal()
+        self.active = np.zeros(int(self.days[-1]) - self.first_day + 1 if len(days) > 0 else 0, dtype=bool)
+        self.active[self.days - self.first_day] = True
+
+        # every week whose 8-day window can include an active day: from the Monday a week before 
+        # the first active day's Monday, through the last active day's Monday
+        self.first_monday = self.first_day - first_day.weekday() - 7
+        num_weeks = (int(self.days[-1]) - self.first_monday) // 7 + 1 if len(days) > 0 else 0
+        mondays = self.first_monday + 7 * np.arange(num_weeks)
+        week_is_active = self.count_active_days(mondays, mondays + STREAK_WINDOW_DAYS - 1) > 0
+        weeks = np.arange(num_weeks)
+        last_inactive_week = np.maximum.accumulate(np.where(week_is_active, -1, weeks)) if num_weeks > 0 else weeks
+        self.week_streaks = np.where(week_is_active, weeks - last_inactive_week, 0)
+
+    def count_active_days(self, start_ordinals: np.ndarray | int, end_ordinals: np.ndarray | int) -> np.ndarray | int:
+        ''' Number of days with workouts in `[start, end]` (inclusive ordinals; vectorized). '''
+        return (np.searchsorted(self.days, end_ordinals, side='right')
+                - np.searchsorted(self.days, start_ordinals, side='left'))
+
+    def window_totals(self, start_date: date, end_date: date) -> dict[str, int | float]:
+        ''' Totals for the workouts from `start_date` through `end_date` (inclusive). '''
+        start = np.searchsorted(self.days, start_date.toordinal(), side='left')
+        end = np.searchsorted(self.days, end_date.toordinal(), side='right')
+        output_dict = {measure: _as_number(prefix_sums[end] - prefix_sums[start])
+                       for measure, prefix_sums in self.prefix_sums.items()}
+        output_dict['workout_days'] = int(end - start)
+        return output_dict
+
+    def is_active(self, day: date) -> bool:
+        index = day.toordinal() - self.first_day
+        return 0 <= index < len(self.active) and bool(self.active[index])
+
+    def _week_streak(self, monday: date) -> int:
+        week = (monday.toordinal() - self.first_monday) // 7
+        return int(self.week_streaks[week]) if 0 <= week < len(self.week_streaks) else 0
+
+    def active_weekly_streak(self, end_date: date) -> int:
+        ''' Consecutive active weeks up to the week of `end_date`; the current week doesn't
+        break the streak just because it has no workouts yet. '''
+        last_monday = end_date - timedelta(days=end_date.weekday())
+        current_week_streak = self._week_streak(last_monday)
+        if current_week_streak > 0:
+            return current_week_streak
+        return self._week_streak(last_monday - timedelta(weeks=1))
+
+
+def main():
+    print("This is a module, not a script.")
+
+if __name__ == '__main__':
+    main()
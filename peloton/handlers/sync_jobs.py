@@ -0,0 +1,181 @@
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Literal, Optional
+from uuid import uuid4
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+from peloton.helpers.constants import EASTERN_TIME
+
+SYNC_STAGES = ('listing', 'fetching', 'persisting', 'images', 'rebuild')
+MAX_FINISHED_JOBS = 20
+
+
+class PelotonSyncStageProgress(BaseModel):
+    name: str
+    status: Literal['pending', 'running', 'done'] = 'pending'
+    completed: int = 0
+    total: Optional[int] = None
+    seconds: Optional[float] = None
+    _started: Optional[float] = PrivateAttr(default=None)
+
+
+class PelotonSyncJob(BaseModel):
+    ''' A single sync run, doubling as the progress reporter that `check_for_new_workouts` updates.
+    All mutation goes through the methods below, which are safe to call from the worker thread
+    while API handlers read `snapshot()`. '''
+
+    job_id: str = Field(default_factory=lambda: uuid4().hex)
+    status: Literal['queued', 'running', 'succeeded', 'failed'] = 'queued'
+    trigger: Literal['manual', 'scheduled'] = 'manual'
+    created_at: datetime = Field(default_factory=lambda: datetime.now(tz=EASTERN_TIME))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    stages: dict[str, PelotonSyncStageProgress] = Field(
+        default_factory=lambda: {name: PelotonSyncStageProgress(name=name) for name in SYNC_STAGES})
+    new_workouts: int = 0
+    image_counts: dict[str, int] = Field(default_factory=dict)   # downloaded / skipped / deduplicated / failed
+    error: Optional[str] = None
+    warnings: list[str] = Field(default_factory=list)   # things that went wrong without failing the sync
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ('succeeded', 'failed')
+
+    def start_stage(self, name: str, total: int | None = None) -> None:
+        with self._lock:
+            stage = self.stages[name]
+            stage.status = 'running'
+            stage.total = total
+            stage._started = time.perf_counter()
+
+    def set_total(self, name: str, total: int) -> None:
+        with self._lock:
+            self.stages[name].total = total
+
+    def advance(self, name: str, count: int = 1) -> None:
+        with self._lock:
+            self.stages[name].completed += count
+
+    def finish_stage(self, name: str) -> None:
+        with self._lock:
+            stage = self.stages[name]
+            if stage._started is None:
+                stage._started = time.perf_counter()
+            stage.status = 'done'
+            stage.seconds = round(time.perf_counter() - stage._started, 3)
+
+    def set_new_workouts(self, count: int) -> None:
+        with self._lock:
+            self.new_workouts = count
+
+    def set_image_counts(self, counts: dict[str, int]) -> None:
+        with self._lock:
+            self.image_counts = dict(counts)
+
+    def add_warning(self, message: str) -> None:
+        with self._lock:
+            self.warnings.append(message)
+
+    def _set_status(self, status: str, error: str | None = None) -> None:
+        with self._lock:
+            self.status = status
+            if status == 'running':
+                self.started_at = datetime.now(tz=EASTERN_TIME)
+            elif status in ('succeeded', 'failed'):
+                self.finished_at = datetime.now(tz=EASTERN_TIME)
+                self.error = error
+
+    def snapshot(self) -> 'PelotonSyncJob':
+        ''' A consistent copy of the job, safe to serialize while the job keeps running. '''
+        with self._lock:
+            return self.model_copy(update={'stages': {name: stage.model_copy() 
+                                                      for name, stage in self.stages.items()},
+                                           'warnings': list(self.warnings),
+                                           'image_counts': dict(self.image_counts)})
+
+
+class PelotonSyncManager():
+    ''' Runs syncs on a background thread (one at a time), keeps recent jobs around for the
+    progress API, and optionally triggers a sync every `interval_seconds`.  `on_finished` (if 
+    given) runs after every sync, successful or not, before the job is marked as finished. '''
+
+    def __init__(self, 
+                 sync_func: Callable[[PelotonSyncJob], None],
+                 on_finished: Callable[[PelotonSyncJob], None] | None = None):
+        self.sync_func = sync_func
+        self.on_finished = on_finished
+        self.jobs: OrderedDict[str, PelotonSyncJob] = OrderedDict()
+        self._lock = threading.Lock()
+        self._current_job: PelotonSyncJob | None = None
+        self._scheduler_thread: threading.Thread | None = None
+        self._scheduler_stop = threading.Event()
+
+    def start_job(self, trigger: str = 'manual') -> PelotonSyncJob:
+        ''' Starts a sync in the background and returns its job.  If a sync is already
+        running, that job is returned instead of starting a second one. '''
+        with self._lock:
+            if self._current_job is not None and not self._current_job.is_finished:
+                return self._current_job
+            job = PelotonSyncJob(trigger=trigger)
+            self._current_job = job
+            self.jobs[job.job_id] = job
+            while len(self.jobs) > MAX_FINISHED_JOBS:
+                self.jobs.popitem(last=False)
+
+        threading.Thread(target=self._run_job, args=(job,), name=f"sync-{job.job_id}", daemon=True).start()
+        return job
+
+    def _run_job(self, job: PelotonSyncJob) -> None:
+        job._set_status('running')
+        error = None
+        try:
+            self.sync_func(job)
+        except Exception as e:
+            traceback.print_exc()
+            error = f"{type(e).__name__}: {e}"
+        if self.on_finished is not None:
+            try:
+                self.on_finished(job)
+            except Exception:
+                traceback.print_exc()
+        if error is not None:
+            job._set_status('failed', error=error)
+        else:
+            job._set_status('succeeded')
+
+    def get_job(self, job_id: str) -> PelotonSyncJob | None:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def get_current_job(self) -> PelotonSyncJob | None:
+        with self._lock:
+            return self._current_job
+
+    def start_scheduler(self, interval_seconds: float) -> None:
+        ''' Starts a daemon thread that kicks off a sync every `interval_seconds`. '''
+        if self._scheduler_thread is not None and self._scheduler_thread.is_alive():
+            return None
+        self._scheduler_stop.clear()
+
+        def run_scheduler():
+            while not self._scheduler_stop.wait(interval_seconds):
+                self.start_job(trigger='scheduled')
+
+        self._scheduler_thread = threading.Thread(target=run_scheduler, name='sync-scheduler', daemon=True)
+        self._scheduler_thread.start()
+        print(f"Scheduled a Peloton sync every {interval_seconds / 60:g} minutes.")
+
+    def stop_scheduler(self) -> None:
+        self._scheduler_stop.set()
+
+
+def main():
+    print("This is a module, not a script.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import Image
+
+from peloton.helpers.constants import THUMBNAIL_CACHE_DIR, THUMBNAIL_CACHE_MAX_BYTES
+
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'jpg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
+}
+MIN_THUMBNAIL_WIDTH = 16
+MAX_THUMBNAIL_WIDTH = 1920
+
+
+class PelotonThumbnailCache():
+    ''' Generates resized (and optionally re-encoded) copies of local images on first request
+    and keeps them in a size-bounded directory, evicting the least-recently-used files.
+
+    Thumbnails are keyed by the source's full path and mtime, so same-named images in different
+    directories don't collide and a replaced source gets a new thumbnail.  Last-use order is 
+    tracked in memory (`_sizes`, oldest first); file mtimes are only read once, at startup, to 
+    restore the order from the previous run. '''
+
+    def __init__(self, cache_dir: Path = THUMBNAIL_CACHE_DIR, max_bytes: int = THUMBNAIL_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        file_stats = {file: file.stat() for file in self.cache_dir.iterdir() if file.is_file()}
+        self._sizes: OrderedDict[Path, int] = OrderedDict(
+            (file, stat.st_size) for file, stat in sorted(file_stats.items(), key=lambda item: item[1].st_mtime))
+        self._total_bytes = sum(self._sizes.values())
+
+    @staticmethod
+    def get_media_type(image_format: str) -> str:
+        return THUMBNAIL_FORMATS[image_format.lower()][1]
+
+    def get_thumbnail(self, image_path: Path, width: int, image_format: str | None = None) -> Path:
+        ''' Returns the path of a copy of `image_path` at most `width` pixels wide, encoded as
+        `image_format` (defaults to the original's format), generating it if it isn't cached.
+
+        Raises:
+            FileNotFoundError: If `image_path` doesn't exist.
+            ValueError: If `image_format` isn't one of `THUMBNAIL_FORMATS`.
+        '''
+        image_format = (image_format or image_path.suffix.lstrip('.')).lower()
+        if image_format not in THUMBNAIL_FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        width = min(MAX_THUMBNAIL_WIDTH, max(MIN_THUMBNAIL_WIDTH, width))
+        source_key = hashlib.blake2b(f"{image_path.resolve()}:{image_path.stat().st_mtime_ns}".encode(), 
+                                     digest_size=8).hexdigest()
+        thumb_path = self.cache_dir.joinpath(f"{image_path.stem}_{source_key}_w{width}.{image_format}")
+
+        with self._lock:
+            if thumb_path in self._sizes:
+                try:
+                    os.utime(thumb_path)   # so the order survives a restart
+                except FileNotFoundError:
+                    self._total_bytes -= self._sizes.pop(thumb_path)   # deleted behind our back; regenerate
+                else:
+                    self._sizes.move_to_end(thumb_path)
+                    return thumb_path
+
+        image = Image.open(image_path)
+        image.thumbnail(size=(width, width * 10))   # constrain width only
+        if THUMBNAIL_FORMATS[image_format][0] == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        tmp_path = thumb_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        image.save(tmp_path, format=THUMBNAIL_FORMATS[image_format][0])
+        os.replace(tmp_path, thumb_path)
+
+        with self._lock:
+            size = thumb_path.stat().st_size
+            self._total_bytes += size - self._sizes.get(thumb_path, 0)
+            self._sizes[thumb_path] = size
+            self._sizes.move_to_end(thumb_path)
+            self._evict(keep=thumb_path)
+        return thumb_path
+
+    def _evict(self, keep: Path) -> None:
+        while self._total_bytes > self.max_bytes:
+            file = next(iter(self._sizes))
+            if file == keep:
+                break   # `keep` is the newest, so everything else is already gone
+            file.unlink(missing_ok=True)
+            self._total_bytes -= self._sizes.pop(file)
+
+
+def main():
+    print("This is a module, not a script.")
+
+if __name__ == '__main__':
+    main()
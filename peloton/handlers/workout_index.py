@@ -0,0 +1,86 @@
+from collections.abc import Iterable
+from types import MappingProxyType
+from typing import Mapping
+
+import numpy as np
+
+from peloton.models import PelotonWorkoutData
+
+
+def _start_timestamp(workout: PelotonWorkoutData) -> float:
+    return workout.summary.start_time.timestamp()
+
+
+def _merge_sorted_with_times(workouts: tuple[PelotonWorkoutData, ...],
+                             start_times: np.ndarray,
+                             new_workouts: list[PelotonWorkoutData]) -> tuple[tuple[PelotonWorkoutData, ...], np.ndarray]:
+    ''' Merges start-time-sorted `workouts` (with their `start_times`) and `new_workouts` (sorted 
+    here); stable, so ties keep arrival order.  The insert positions come from `searchsorted`, so 
+    the existing workouts are copied in slices rather than compared one by one. '''
+    new_workouts = sorted(new_workouts, key=_start_timestamp)
+    new_start_times = np.array([_start_timestamp(workout) for workout in new_workouts], dtype=np.float64)
+    positions = np.searchsorted(start_times, new_start_times, side='right')
+    merged_workouts = []
+    previous_position = 0
+    for position, workout in zip(positions.tolist(), new_workouts):
+        merged_workouts.extend(workouts[previous_position:position])
+        merged_workouts.append(workout)
+        previous_position = position
+    merged_workouts.extend(workouts[previous_position:])
+    return tuple(merged_workouts), np.insert(start_times, positions, new_start_times)
+
+
+class PelotonWorkoutIndex():
+    ''' Read-only lookup structures over one snapshot's workouts, shared by the processor,
+    the chart maker and the routes:
+
+        - `by_id`: workout ID -> workout
+        - `sorted_workouts` / `start_times`: every workout, oldest first, with their start
+          times as Unix timestamps (so a sync's workouts are merged in with `searchsorted`); 
+          `newest_first` is the same list reversed
+
+    Built once per snapshot; `with_new_workouts` returns a new index with a sync's workouts
+    merged in, leaving this one untouched.
+    '''
+
+    def __init__(self, workouts: Iterable[PelotonWorkoutData] = ()):
+        workouts = list(workouts)
+        sorted_workouts, start_times = _merge_sorted_with_times((), np.zeros(0), workouts)
+        self._set_workouts(by_id={workout.workout_id: workout for workout in workouts},
+                           sorted_workouts=sorted_workouts,
+                           start_times=start_times)
+
+    def _set_workouts(self,
+                      by_id: dict[str, PelotonWorkoutData],
+                      sorted_workouts: tuple[PelotonWorkoutData, ...],
+                      start_times: np.ndarray) -> None:
+        self.by_id: Mapping[str, PelotonWorkoutData] = MappingProxyType(by_id)
+        self.sorted_workouts = sorted_workouts
+        self.start_times = start_times
+        self.newest_first = sorted_workouts[::-1]
+
+    def with_new_workouts(self, new_workouts: Iterable[PelotonWorkoutData]) -> 'PelotonWorkoutIndex':
+        ''' A new index with `new_workouts` (none of which are in this one) added. '''
+        new_workouts = list(new_workouts)
+        sorted_workouts, start_times = _merge_sorted_with_times(self.sorted_workouts, self.start_times, new_workouts)
+        index = PelotonWorkoutIndex.__new__(PelotonWorkoutIndex)
+        index._set_workouts(by_id={**self.by_id, **{workout.workout_id: workout for workout in new_workouts}},
+                            sorted_workouts=sorted_workouts,
+                            start_times=start_times)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __contains__(self, workout_id: str) -> bool:
+        return workout_id in self.by_id
+
+    def get(self, workout_id: str) -> PelotonWorkoutData | None:
+        return self.by_id.get(workout_id)
+
+
+def main():
+    print("This is a module, not a script.")
+
+if __name__ == '__main__':
+    main()
@@ -14,6 +14,8 @@ MONGODB_DATABASE = 'peloton'
 MONGODB_COLLECTION = 'peloton'
 MONGODB_INSTRUCTORS_COLLECTION = 'peloton_instructors'
 MONGODB_HOSTNAME = os.getenv('MONGODB_HOSTNAME')
+MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', 16))
+MONGODB_BULK_WRITE_CHUNK_SIZE = int(os.getenv('MONGODB_BULK_WRITE_CHUNK_SIZE', 500))
 
 # PylotonCycle setup
 PELOTON_USERNAME = os.getenv('PELOTON_USERNAME')
@@ -21,6 +23,11 @@ PELOTON_PASSWORD = os.getenv('PELOTON_PASSWORD')
 PELOTON_USER_ID = os.getenv('PELOTON_USER_ID')
 PELOTON_SPREADSHEET = os.getenv('PELOTON_SPREADSHEET')
 PELOTON_BASE_URL = 'https://api.onepeloton.com'
+PELOTON_MAX_CONCURRENT_REQUESTS = int(os.getenv('PELOTON_MAX_CONCURRENT_REQUESTS', 8))
+PELOTON_REQUESTS_PER_SECOND = float(os.getenv('PELOTON_REQUESTS_PER_SECOND', 10))
+PELOTON_MAX_RETRIES = int(os.getenv('PELOTON_MAX_RETRIES', 4))
+PELOTON_SYNC_INTERVAL_MINUTES = float(os.getenv('PELOTON_SYNC_INTERVAL_MINUTES', 0))   # 0 = no scheduled syncs
+PELOTON_LAZY_RAW_PAYLOADS = os.getenv('PELOTON_LAZY_RAW_PAYLOADS', 'true').lower() in ('1', 'true', 'yes')   # raw API payloads loaded on demand
 
 # Path objects
 ROOT_DIR = Path.home().joinpath('python', 'peloton')
@@ -29,11 +36,44 @@ DATA_DIR = ROOT_DIR.joinpath('data')
 WORKOUTS_DIR = ROOT_DIR.joinpath('data', 'workouts')
 WORKOUT_IMAGES_DIR = ROOT_DIR.joinpath('data', 'workout_images')
 ACHIEVEMENT_IMAGES_DIR = ROOT_DIR.joinpath('data', 'achievement_images')
+THUMBNAIL_CACHE_DIR = ROOT_DIR.joinpath('data', 'thumbnail_cache')
 STATIC_DIR = ROOT_DIR.joinpath('static')
 SESSION_JSON = ROOT_DIR.joinpath('data', 'session_id.json')
+SYNC_WATERMARK_JSON = ROOT_DIR.joinpath('data', 'sync_watermark.json')
+IMAGE_MANIFEST_JSON = ROOT_DIR.joinpath('data', 'image_manifest.json')
+API_CACHE_DB = ROOT_DIR.joinpath('data', 'api_cache.sqlite3')
+METRICS_STORE_DIR = ROOT_DIR.joinpath('data', 'metrics_store')
 INSTRUCTORS_JSON = ROOT_DIR.joinpath('data', 'peloton_instructors.json')
 
+# On-disk Peloton API response cache (seconds until an entry must be revalidated;
+# endpoints not listed here are never cached)
+API_CACHE_MAX_BYTES = int(os.getenv('PELOTON_API_CACHE_MAX_MB', 256)) * 1024 * 1024
+API_CACHE_TTLS = {
+    'instructor': 60 * 60 * 24 * 30,
+    'instructors': 60 * 60 * 24,
+    'workout_summary': 60 * 60 * 24 * 30,
+    'workout_metrics': 60 * 60 * 24 * 365,
+}
+API_CACHE_FINAL_WORKOUT_STATUSES = ('COMPLETE',)   # summaries & metrics of workouts in any other state are never cached
+
+# On-demand thumbnails for `/workout_images/{filename}?w=...`
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv('PELOTON_THUMBNAIL_CACHE_MAX_MB', 128)) * 1024 * 1024
+
+# In-memory cache of rendered table/chart responses (cleared after every sync)
+ENDPOINT_CACHE_MAX_BYTES = int(os.getenv('PELOTON_ENDPOINT_CACHE_MAX_MB', 64)) * 1024 * 1024
+
+# Metrics-store segments (one per write) allowed to pile up before they're compacted into one
+METRICS_STORE_MAX_SEGMENTS = int(os.getenv('PELOTON_METRICS_STORE_MAX_SEGMENTS', 16))
+
+# Built `/line_chart` series kept in memory, per (workout, points, method)
+LINE_CHART_CACHE_MAX_ENTRIES = int(os.getenv('PELOTON_LINE_CHART_CACHE_ENTRIES', 64))
+
+# `/dataframe` pages (HTMX requests are always paged; JSON only when `limit` is given)
+DATAFRAME_PAGE_SIZE = int(os.getenv('PELOTON_DATAFRAME_PAGE_SIZE', 50))
+DATAFRAME_MAX_PAGE_SIZE = 1000
+
 SQLITE_FILENAME = f'sqlite:///{DATA_DIR.joinpath('peloton.db').resolve()}'
+SQLITE_BATCH_SIZE = int(os.getenv('SQLITE_BATCH_SIZE', 500))   # rows per write transaction
 
 DF_DTYPES_DICT = {
     'workout_id': 'string', 
@@ -8,4 +8,8 @@ class NaiveDatetimeError(Exception):
     def __init__(self, dt, message="Input datetime object is not timezone-aware"):
         self.dt = dt
         self.message = message
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+
+
+class PelotonImageError(Exception):
+    pass
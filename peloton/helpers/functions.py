@@ -1,12 +1,18 @@
 import urllib3
 import io
+import hashlib
+import json
+import zlib
 from pathlib import Path
 from PIL import Image
 
+# One pool for every image download (rather than a new `PoolManager` per call), so
+# connections to the image CDN are reused across downloads and threads.
+HTTP_POOL = urllib3.PoolManager(num_pools=4, maxsize=16, block=True)
+
 def download_image(image_url: str) -> io.BytesIO | None:
-    http = urllib3.PoolManager()
     try:
-        response = http.request('GET', image_url)           
+        response = HTTP_POOL.request('GET', image_url)
     except urllib3.exceptions.LocationValueError as e:
         print(e)
     else:
@@ -32,9 +38,50 @@ def create_thumbnail(image_data: io.BytesIO, image_filename: str, local_dir: Pat
     image.save(thumb_filename)
 
 
+def get_thumbnail_filename(image_filename: str, size: int) -> str:
+    ''' `abc.jpg` -> `abc_thumb.jpg` for the default 250px size, `abc_thumb_500.jpg` otherwise. '''
+    image_path = Path(image_filename)
+    suffix = '_thumb' if size == 250 else f"_thumb_{size}"
+    return f"{image_path.stem}{suffix}{image_path.suffix}"
+
+
+def hash_image_bytes(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def process_image(image_bytes: bytes,
+                  image_filename: str,
+                  local_dir: Path,
+                  thumbnail_sizes: tuple[int, ...] = ()) -> list[Path]:
+    ''' Decodes an image once, then saves the full-size image and every requested thumbnail
+    from that single decode. '''
+    local_filename = local_dir.joinpath(image_filename)
+    image = Image.open(io.BytesIO(image_bytes))
+    image.load()
+    image.save(local_filename)
+    output_files = [local_filename]
+
+    for size in thumbnail_sizes:
+        thumb_filename = local_dir.joinpath(get_thumbnail_filename(image_filename, size))
+        thumb = image.copy()
+        thumb.thumbnail(size=(size, size))
+        thumb.save(thumb_filename)
+        output_files.append(thumb_filename)
+
+    return output_files
+
+
+def compress_json(obj: dict) -> bytes:
+    ''' Compact JSON, zlib-compressed (raw API payloads shrink ~10x). '''
+    return zlib.compress(json.dumps(obj, separators=(',', ':')).encode('utf-8'))
+
+
+def decompress_json(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data))
+
 
 def main():
     ...
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,50 @@
+import random
+import threading
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket():
+    ''' Thread-safe token-bucket rate limiter: allows bursts of up to `capacity` requests, 
+    refilled at `rate` tokens per second.  A `rate` of zero (or less) disables limiting. '''
+    
+    def __init__(self, rate: float, capacity: int = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        ''' Blocks until a token is available, then consumes it. '''
+        if self.rate <= 0:
+            return None
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return None
+                wait_seconds = (1 - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+
+def backoff_delay(attempt: int, 
+                  base: float = 0.5, 
+                  cap: float = 30.0, 
+                  retry_after: str | None = None) -> float:
+    ''' Exponential backoff with full jitter.  A server-supplied `Retry-After` header 
+    (in seconds or as an HTTP date) takes precedence when present. '''
+    if retry_after is not None:
+        try:
+            return min(cap, max(0.0, float(retry_after)))
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                return min(cap, max(0.0, (retry_at - datetime.now(tz=retry_at.tzinfo)).total_seconds()))
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,43 @@
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+
+class LatencyStats():
+    ''' Thread-safe per-operation latency counters (count, errors, total/mean/max seconds). '''
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+
+    def record(self, name: str, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(name, {'count': 0, 'errors': 0, 
+                                                  'total_seconds': 0.0, 'max_seconds': 0.0})
+            stats['count'] += 1
+            stats['errors'] += int(error)
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        ''' Context manager that records the duration of the wrapped block under `name`. '''
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, error)
+
+    def as_dict(self) -> dict[str, dict]:
+        with self._lock:
+            return {name: {**stats, 'mean_seconds': (stats['total_seconds'] / stats['count'])}
+                    for name, stats in sorted(self._stats.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
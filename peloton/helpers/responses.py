@@ -0,0 +1,72 @@
+import json
+from collections.abc import Iterator
+from typing import Any, Literal
+
+import pandas as pd
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+
+JSONLayout = Literal['records', 'columns', 'ndjson']
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+NDJSON_CHUNK_ROWS = 1000
+
+
+def dataframe_to_json_bytes(df: pd.DataFrame, layout: JSONLayout = 'records') -> bytes:
+    ''' Encodes `df` in one pass (pandas' C encoder, no intermediate Python objects):
+
+        - `records`: `[{"column": value, ...}, ...]`
+        - `columns`: `{"columns": [...], "data": [[...], ...]}` -- each column name once
+        - `ndjson`: one record object per line
+    '''
+    if layout == 'records':
+        output = df.to_json(orient='records', force_ascii=False)
+    elif layout == 'columns':
+        output = df.to_json(orient='split', index=False, force_ascii=False)
+    elif layout == 'ndjson':
+        output = df.to_json(orient='records', lines=True, force_ascii=False) if len(df) > 0 else ''
+    else:
+        raise ValueError(f"Unknown JSON layout '{layout}' (expected one of: records, columns, ndjson)")
+    return output.encode('utf-8')
+
+
+class PelotonJSONResponse(Response):
+    ''' A `JSONResponse` that encodes DataFrames (in any `JSONLayout`) and pydantic models
+    straight to bytes, instead of `json.loads(df.to_json())` followed by a second `json.dumps`.
+    Anything else is encoded the way `JSONResponse` does it. '''
+    media_type = 'application/json'
+
+    def __init__(self, content: Any, layout: JSONLayout = 'records', **kwargs):
+        self.layout = layout
+        if layout == 'ndjson':
+            self.media_type = NDJSON_MEDIA_TYPE
+        super().__init__(content, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        if isinstance(content, pd.DataFrame):
+            return dataframe_to_json_bytes(content, self.layout)
+        if isinstance(content, BaseModel):
+            return content.model_dump_json(by_alias=True).encode('utf-8')
+        return json.dumps(content, ensure_ascii=False, allow_nan=False,
+                          indent=None, separators=(',', ':')).encode('utf-8')
+
+
+class PelotonNDJSONStreamingResponse(StreamingResponse):
+    ''' Streams a (large) DataFrame as NDJSON, `chunk_rows` records per chunk, so neither the
+    whole payload nor its records ever exist in memory at once. '''
+
+    def __init__(self, df: pd.DataFrame, chunk_rows: int = NDJSON_CHUNK_ROWS, **kwargs):
+        super().__init__(self._iter_chunks(df, chunk_rows), media_type=NDJSON_MEDIA_TYPE, **kwargs)
+
+    @staticmethod
+    def _iter_chunks(df: pd.DataFrame, chunk_rows: int) -> Iterator[bytes]:
+        for start in range(0, len(df), chunk_rows):
+            yield dataframe_to_json_bytes(df.iloc[start:start + chunk_rows], layout='ndjson')
+
+
+def main():
+    print("This is a module, not a script.")
+
+if __name__ == '__main__':
+    main()
@@ -2,14 +2,12 @@ from typing import Optional
 from zoneinfo import ZoneInfo
 from uuid import UUID, uuid4
 from datetime import datetime
-from pathlib import Path
 from decimal import Decimal
 
 from pydantic import BaseModel, ConfigDict, AliasChoices, Field, field_validator, computed_field
 
-from peloton.helpers.constants import WORKOUT_IMAGES_DIR
-
 LOCAL_TZ = ZoneInfo('America/New_York') 
+TABLE_THUMBNAIL_WIDTH = 110   # `.table-pic` is 55px wide; 2x for high-DPI screens
 
 class PelotonPivotTableRow(BaseModel):
     model_config = ConfigDict(frozen=True, populate_by_name=True)
@@ -118,8 +116,6 @@ class PelotonDataFrameRow(BaseModel):
         image_local_filename = self.image_url.split(sep='/')[-1]
         image_local_url = f"/workout_images/{image_local_filename}"
 
-        image_local_path = Path(image_local_filename)
-        thumb_local_filename = f"{image_local_path.stem}_thumb{image_local_path.suffix}"
-        thumb_local_url = f"/workout_images/{thumb_local_filename}"
+        thumb_local_url = f"/workout_images/{image_local_filename}?w={TABLE_THUMBNAIL_WIDTH}&fmt=webp"
 
-        return f"<a href=\"{image_local_url}\" target=\"_blank\"><img class=\"table-pic\" src={thumb_local_url}></img></a>"
\ No newline at end of file
+        return f"<a href=\"{image_local_url}\" target=\"_blank\"><img class=\"table-pic\" src=\"{thumb_local_url}\"></img></a>"
\ No newline at end of file
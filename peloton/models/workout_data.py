@@ -1,3 +1,5 @@
+from typing import Optional
+
 import pandas as pd
 from pydantic import (BaseModel, ConfigDict, Field, computed_field,
                       field_validator)
@@ -9,8 +11,9 @@ from .summary import PelotonSummary
 class PelotonWorkoutData(BaseModel):
     model_config = ConfigDict(frozen=True)
     workout_id: str
-    summary_raw: dict = Field(repr=False)
-    metrics_raw: dict = Field(repr=False)
+    # Raw API payloads; `None` when ingested lazily (see `PelotonProcessor.load_raw_payloads`)
+    summary_raw: Optional[dict] = Field(default=None, repr=False)
+    metrics_raw: Optional[dict] = Field(default=None, repr=False)
     summary: PelotonSummary
     metrics: PelotonMetrics
 
@@ -22,6 +25,22 @@ class PelotonWorkoutData(BaseModel):
         else:
             return workout_id
 
+    @property
+    def has_raw_payloads(self) -> bool:
+        return self.summary_raw is not None and self.metrics_raw is not None
+
+    def with_raw_payloads(self, summary_raw: dict, metrics_raw: dict) -> 'PelotonWorkoutData':
+        return self.model_copy(update={'summary_raw': summary_raw, 'metrics_raw': metrics_raw})
+
+    def without_raw_payloads(self) -> 'PelotonWorkoutData':
+        return self.model_copy(update={'summary_raw': None, 'metrics_raw': None})
+
+    def without_metric_values(self) -> 'PelotonWorkoutData':
+        ''' A copy without the per-interval series (`metrics.metrics[].values`), which live in
+        the metrics store once the workout has been written there. '''
+        metrics = [metric.model_copy(update={'values': None}) for metric in self.metrics.metrics]
+        return self.model_copy(update={'metrics': self.metrics.model_copy(update={'metrics': metrics})})
+
     @computed_field
     @property
     def output_per_min(self) -> float | None:
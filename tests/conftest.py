@@ -0,0 +1,68 @@
+import importlib
+import json
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import ModuleType, SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import peloton
+from peloton.helpers.constants import EASTERN_TIME, INSTRUCTOR_NAMES_DICT
+from peloton.models import PelotonWorkoutData
+
+SAMPLE_DIR = Path(__file__).resolve().parent.parent.joinpath('data', 'workouts')
+FIRST_START = datetime(2023, 12, 20, 6, 15, tzinfo=EASTERN_TIME)
+# hours between consecutive workouts: some days get several, some none; spans a new year
+GAP_HOURS = (3, 20, 7, 50, 2, 30)
+DISCIPLINES = ('cycling', 'cycling', 'strength', 'running')
+WORKOUT_TYPES = ('class', 'scenic', 'class')
+INSTRUCTOR_IDS = (None, *list(INSTRUCTOR_NAMES_DICT)[:3])
+
+
+@pytest.fixture(scope='session')
+def sample_workouts() -> list[PelotonWorkoutData]:
+    ''' 60 workouts in start-time order, copied from the samples in `data/workouts` with their
+    own IDs, start times, disciplines, workout types and instructors (raw payloads dropped). '''
+    samples = [json.loads(file.read_text()) for file in sorted(SAMPLE_DIR.glob('*.json'))]
+    workouts = []
+    start_time = FIRST_START
+    for i in range(60):
+        document = json.loads(json.dumps(samples[i % len(samples)]))
+        document['summary_raw'] = document['metrics_raw'] = None
+        workout_id = f"{i + 1:032x}"
+        document['workout_id'] = document['summary']['workout_id'] = document['metrics']['workout_id'] = workout_id
+        document['summary']['start_time'] = start_time.isoformat()
+        document['summary']['end_time'] = (start_time + timedelta(minutes=30)).isoformat()
+        document['summary']['workout_type'] = WORKOUT_TYPES[i % len(WORKOUT_TYPES)]
+        document['summary']['ride']['fitness_discipline'] = DISCIPLINES[i % len(DISCIPLINES)]
+        document['summary']['ride']['instructor_id'] = INSTRUCTOR_IDS[i % len(INSTRUCTOR_IDS)]
+        workouts.append(PelotonWorkoutData.model_validate(document))
+        start_time += timedelta(hours=GAP_HOURS[i % len(GAP_HOURS)])
+    return workouts
+
+
+@pytest.fixture
+def routes_client(monkeypatch):
+    ''' Serves the real routes from a stand-in processor (no database needed): call it with the
+    `dataset` the processor should hold, and it returns a test client and the freshly imported
+    routes module (whose `peloton` is the stand-in, so a test can swap in another dataset). '''
+    module_names = ('peloton.api', 'peloton.api.routes')
+
+    def make_client(dataset) -> tuple[TestClient, ModuleType]:
+        fake_processor = SimpleNamespace(dataset=dataset, check_for_new_workouts=lambda progress=None: None)
+        monkeypatch.setattr(peloton, 'PelotonProcessor', lambda: fake_processor)
+        monkeypatch.delattr(peloton, 'api', raising=False)
+        for module_name in module_names:
+            monkeypatch.delitem(sys.modules, module_name, raising=False)
+        routes = importlib.import_module('peloton.api.routes')
+        app = FastAPI()
+        app.include_router(routes.router)
+        return TestClient(app), routes
+
+    yield make_client
+    for module_name in module_names:
+        sys.modules.pop(module_name, None)
+    vars(peloton).pop('api', None)
@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from peloton.handlers.chart_series import (downsample_series_df, lttb_positions, make_series_df,
+                                           minmax_positions)
+from peloton.helpers.constants import EASTERN_TIME
+
+START_TIME = datetime(2024, 3, 1, 7, 30, tzinfo=EASTERN_TIME)
+
+
+def make_values(num_values: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(150, 40, num_values).round(1)
+
+
+def make_df(num_values: int, num_columns: int = 3) -> pd.DataFrame:
+    return make_series_df(START_TIME, {f"metric{i}": make_values(num_values, seed=i) for i in range(num_columns)})
+
+
+@pytest.mark.parametrize('points', [3, 4, 10, 99, 500])
+def test_lttb_keeps_points_samples_including_the_endpoints(points):
+    values = make_values(1000)
+
+    positions = lttb_positions(values, points)
+
+    assert len(positions) == points
+    assert positions[0] == 0 and positions[-1] == len(values) - 1
+    assert np.all(np.diff(positions) > 0)
+
+
+@pytest.mark.parametrize('points', [2, 5, 1000, 2000])
+def test_lttb_short_or_tiny_budgets(points):
+    values = make_values(1000)
+
+    positions = lttb_positions(values, points)
+
+    assert positions[0] == 0 and positions[-1] == len(values) - 1
+    assert len(positions) == min(points, len(values))
+
+
+@pytest.mark.parametrize('points', [2, 10, 99, 500])
+def test_minmax_keeps_the_extremes_in_order(points):
+    values = make_values(1000)
+
+    positions = minmax_positions(values, points)
+
+    assert len(positions) <= points
+    assert np.all(np.diff(positions) > 0)
+    assert np.argmin(values) in positions and np.argmax(values) in positions
+
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_downsample_series_df_caps_rows_and_keeps_the_ends(method):
+    df = make_df(1000)
+
+    output_df = downsample_series_df(df, 120, method)
+
+    assert len(output_df) <= 120
+    assert output_df.index.is_monotonic_increasing
+    pd.testing.assert_frame_equal(output_df, df.loc[output_df.index])
+    if method == 'lttb':
+        assert output_df.index[0] == df.index[0] and output_df.index[-1] == df.index[-1]
+
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_downsample_series_df_leaves_short_series_alone(method):
+    df = make_df(4)
+
+    assert downsample_series_df(df, 5, method) is df   # a budget too small to split is fine when nothing is cut
+
+
+def test_downsample_series_df_rejects_budgets_too_small_to_split():
+    with pytest.raises(ValueError):
+        downsample_series_df(make_df(1000), 5, 'minmax')
+
+
+def test_downsample_series_df_rejects_unknown_methods():
+    with pytest.raises(ValueError):
+        downsample_series_df(make_df(10), 5, 'average')
@@ -0,0 +1,127 @@
+from datetime import date
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from peloton.handlers.dataframe_index import PelotonDataFrameIndex
+
+TITLES = ['45 min Power Zone Ride', '30 min Climb Ride', '20 min HIIT Ride', '30 min Pop Ride', None]
+
+
+def make_processed_df(num_rows: int = 40) -> pd.DataFrame:
+    ''' A processed-DataFrame stand-in: sorted by start time, with plenty of tied outputs. '''
+    return pd.DataFrame({
+        'workout_id': [f"workout{i:03d}" for i in range(num_rows)],
+        'start_time': pd.date_range('2024-01-01 06:00', periods=num_rows, freq='12h', tz='America/New_York'),
+        'title': [TITLES[i % len(TITLES)] for i in range(num_rows)],
+        'fitness_discipline': ['cycling' if i % 3 else 'strength' for i in range(num_rows)],
+        'instructor_name': ['Matt Wilpers' if i % 2 else 'Denis Morton' for i in range(num_rows)],
+        'instructor_id': ['matt' if i % 2 else 'denis' for i in range(num_rows)],
+        'total_output': [float(100 + 50 * (i % 4)) if i % 7 else np.nan for i in range(num_rows)],
+        'achievements': [[{'name': 'Streak' if i % 2 else 'Best Output'}] for i in range(num_rows)],
+    })
+
+
+@pytest.fixture
+def dataframe_index() -> PelotonDataFrameIndex:
+    return PelotonDataFrameIndex(make_processed_df())
+
+
+def test_title_filter_matches_case_insensitive_substrings(dataframe_index):
+    page = dataframe_index.query(title='CLIMB', sort='start_time')
+    df = dataframe_index.df
+
+    expected = df[df['title'].str.contains('climb', case=False, na=False)]
+    assert page.rows['workout_id'].tolist() == expected['workout_id'].tolist()
+    assert page.total == len(expected)
+
+
+def test_filters_combine(dataframe_index):
+    page = dataframe_index.query(start=date(2024, 1, 3), end=date(2024, 1, 12), discipline='Cycling',
+                                 instructor='matt wilpers', title='ride', sort='start_time')
+    df = dataframe_index.df
+    start_dates = df['start_time'].dt.date
+
+    expected = df[(start_dates >= date(2024, 1, 3)) & (start_dates <= date(2024, 1, 12))
+                  & (df['fitness_discipline'] == 'cycling') & (df['instructor_id'] == 'matt')
+                  & df['title'].notna()]
+    assert page.rows['workout_id'].tolist() == expected['workout_id'].tolist()
+
+
+@pytest.mark.parametrize('sort', ['-start_time', 'total_output', '-total_output', 'title'])
+def test_cursor_pages_cover_every_row_once(dataframe_index, sort):
+    everything = dataframe_index.query(sort=sort)
+    workout_ids, cursor = [], None
+    while True:
+        page = dataframe_index.query(sort=sort, cursor=cursor, limit=7)
+        workout_ids.extend(page.rows['workout_id'])
+        assert page.total == len(dataframe_index.df)
+        if page.next_cursor is None:
+            break
+        assert page.next_cursor == workout_ids[-1]
+        cursor = page.next_cursor
+
+    assert workout_ids == everything.rows['workout_id'].tolist()
+
+
+def test_cursor_and_offset_pages_agree(dataframe_index):
+    first_page = dataframe_index.query(sort='-total_output', limit=10)
+    by_cursor = dataframe_index.query(sort='-total_output', cursor=first_page.next_cursor, limit=10)
+    by_offset = dataframe_index.query(sort='-total_output', offset=first_page.next_offset, limit=10)
+
+    pd.testing.assert_frame_equal(by_cursor.rows, by_offset.rows)
+
+
+def test_unknown_cursor_is_rejected(dataframe_index):
+    with pytest.raises(ValueError):
+        dataframe_index.query(cursor='no-such-workout')
+
+
+def test_descending_sort_keeps_ties_in_start_time_order(dataframe_index):
+    rows = dataframe_index.query(sort='-total_output').rows
+    present = rows[rows['total_output'].notna()]
+
+    assert present['total_output'].is_monotonic_decreasing
+    for _, tied_rows in present.groupby('total_output'):
+        assert tied_rows['start_time'].is_monotonic_increasing
+    assert rows['total_output'].iloc[len(present):].isna().all()   # missing values last
+
+
+def test_descending_sort_matches_pandas(dataframe_index):
+    df = dataframe_index.df
+    expected = pd.concat([df[df['total_output'].notna()].sort_values('total_output', ascending=False, kind='stable'),
+                          df[df['total_output'].isna()]])
+
+    pd.testing.assert_frame_equal(dataframe_index.query(sort='-total_output').rows, expected)
+
+
+@pytest.mark.parametrize('sort', ['no_such_column', '-no_such_column', 'achievements'])
+def test_unsortable_columns_raise_value_error(dataframe_index, sort):
+    with pytest.raises(ValueError):
+        dataframe_index.query(sort=sort)
+
+
+@pytest.fixture
+def dataframe_client(routes_client, dataframe_index) -> TestClient:
+    client, _ = routes_client(SimpleNamespace(dataframe_index=dataframe_index))
+    return client
+
+
+def test_dataframe_route_pages_with_headers(dataframe_client):
+    resp = dataframe_client.get('/dataframe', params={'sort': '-total_output', 'limit': 5, 'fields': 'workout_id'})
+
+    assert resp.status_code == 200
+    assert len(resp.json()) == 5
+    assert resp.headers['X-Total-Count'] == '40'
+    assert resp.headers['X-Next-Cursor'] == resp.json()[-1]['workout_id']
+
+
+@pytest.mark.parametrize('sort', ['no_such_column', 'achievements'])
+def test_dataframe_route_rejects_bad_sort_with_422(dataframe_client, sort):
+    resp = dataframe_client.get('/dataframe', params={'sort': sort})
+
+    assert resp.status_code == 422
+    assert 'sort' in resp.json()['detail']
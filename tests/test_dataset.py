@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from peloton.handlers.dataframe_builder import make_workouts_dataframe
+from peloton.handlers.dataset import PelotonDataset
+from peloton.helpers.constants import EASTERN_TIME
+
+
+def build(workouts) -> PelotonDataset:
+    return PelotonDataset.build(workouts, make_workouts_dataframe(workouts), version=1)
+
+
+def assert_same_dataset(dataset: PelotonDataset, expected: PelotonDataset) -> None:
+    pd.testing.assert_frame_equal(dataset.processed_df, expected.processed_df)
+    pd.testing.assert_frame_equal(dataset.pivots.year_table, expected.pivots.year_table)
+    pd.testing.assert_frame_equal(dataset.pivots.month_table, expected.pivots.month_table)
+    pd.testing.assert_frame_equal(dataset.pivots.totals_table, expected.pivots.totals_table)
+    pd.testing.assert_frame_equal(dataset.rollup_cube.cells, expected.rollup_cube.cells)
+    assert ([workout.workout_id for workout in dataset.workout_index.sorted_workouts]
+            == [workout.workout_id for workout in expected.workout_index.sorted_workouts])
+    assert dataset.chart_maker.daily_totals == pytest.approx(expected.chart_maker.daily_totals)
+    end_date = max(workout.summary.start_time for workout in expected.workouts)
+    assert dataset.chart_maker.make_stats_summary(end_date) == expected.chart_maker.make_stats_summary(end_date)
+
+
+@pytest.mark.parametrize('split', ['append', 'interleave', 'single'])
+def test_with_new_workouts_matches_full_build(sample_workouts, split):
+    if split == 'append':
+        old_workouts, new_workouts = sample_workouts[:40], sample_workouts[40:]
+    elif split == 'interleave':     # new workouts fall between (and before) the old ones
+        old_workouts, new_workouts = sample_workouts[1::2], sample_workouts[::2]
+    else:
+        old_workouts, new_workouts = sample_workouts[:-1], sample_workouts[-1:]
+
+    dataset = build(old_workouts).with_new_workouts(new_workouts, version=2)
+
+    assert dataset.version == 2
+    assert len(dataset.workouts) == len(sample_workouts)
+    assert_same_dataset(dataset, build(old_workouts + new_workouts))
+
+
+def test_with_new_workouts_adds_columns_only_new_workouts_have(sample_workouts):
+    # no instructor among the old workouts, so their DataFrame has no `instructor_name` column
+    old_workouts = [workout for workout in sample_workouts if workout.summary.ride.instructor_name is None]
+    new_workouts = [workout for workout in sample_workouts if workout.summary.ride.instructor_name is not None]
+    old_dataset = build(old_workouts)
+    assert 'instructor_name' not in old_dataset.processed_df.columns
+
+    dataset = old_dataset.with_new_workouts(new_workouts, version=2)
+
+    assert_same_dataset(dataset, build(old_workouts + new_workouts))
+
+
+def test_with_new_workouts_leaves_snapshot_untouched(sample_workouts):
+    old_dataset = build(sample_workouts[:40])
+    processed_df = old_dataset.processed_df.copy()
+    month_table = old_dataset.pivots.month_table.copy()
+    end_date = datetime(2024, 2, 15, tzinfo=EASTERN_TIME)
+    stats_summary = old_dataset.chart_maker.make_stats_summary(end_date)
+
+    old_dataset.with_new_workouts(sample_workouts[40:], version=2)
+
+    pd.testing.assert_frame_equal(old_dataset.processed_df, processed_df)
+    pd.testing.assert_frame_equal(old_dataset.pivots.month_table, month_table)
+    assert old_dataset.chart_maker.make_stats_summary(end_date) == stats_summary
+    assert len(old_dataset.workout_index) == 40
+
+
+def test_with_new_workouts_from_empty_snapshot(sample_workouts):
+    empty_dataset = PelotonDataset.build([], None, version=1)
+
+    dataset = empty_dataset.with_new_workouts(sample_workouts, version=2)
+
+    assert_same_dataset(dataset, build(sample_workouts))
@@ -0,0 +1,96 @@
+import pytest
+
+from peloton.handlers.dataframe_builder import make_workouts_dataframe
+from peloton.handlers.dataset import PelotonDataset
+from peloton.handlers.endpoint_cache import PelotonCachedEndpoint, PelotonEndpointCache
+
+
+def make_dataset(workouts, version: int) -> PelotonDataset:
+    return PelotonDataset.build(workouts, make_workouts_dataframe(workouts), version=version)
+
+
+def test_matches_if_none_match_lists():
+    entry = PelotonCachedEndpoint.from_body(b'body', 'application/json')
+
+    assert entry.matches(entry.etag)
+    assert entry.matches(f'"other", W/{entry.etag}')
+    assert entry.matches('*')
+    assert not entry.matches('"other"')
+    assert not entry.matches(None)
+    assert entry.etag == PelotonCachedEndpoint.from_body(b'body', 'text/html').etag
+
+
+def test_put_evicts_least_recently_used():
+    cache = PelotonEndpointCache(max_bytes=30)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, PelotonCachedEndpoint.from_body(b'x' * 10, 'application/json'))
+    cache.get('a')      # now newer than b
+
+    cache.put('d', PelotonCachedEndpoint.from_body(b'x' * 10, 'application/json'))
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get_stats()['bytes'] == 30
+    assert cache.get_stats()['evicted'] == 1
+
+
+def test_oversized_and_failed_entries_are_not_cached():
+    cache = PelotonEndpointCache(max_bytes=10)
+    cache.put('big', PelotonCachedEndpoint.from_body(b'x' * 11, 'application/json'))
+
+    def fail() -> PelotonCachedEndpoint:
+        raise RuntimeError("render failed")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_create('failed', fail)
+    assert cache.get_stats()['entries'] == 0
+
+
+@pytest.fixture
+def table_client(routes_client, sample_workouts):
+    return routes_client(make_dataset(sample_workouts[:40], version=1))
+
+
+def test_matching_etag_gets_empty_304(table_client):
+    client, routes = table_client
+    resp = client.get('/year_table')
+    etag = resp.headers['ETag']
+
+    not_modified = client.get('/year_table', headers={'If-None-Match': etag})
+    weak_match = client.get('/year_table', headers={'If-None-Match': f'"stale", W/{etag}'})
+    mismatch = client.get('/year_table', headers={'If-None-Match': '"stale"'})
+
+    assert resp.status_code == 200
+    assert resp.headers['Cache-Control'] == 'no-cache'
+    assert not_modified.status_code == weak_match.status_code == 304
+    assert not_modified.content == b''
+    assert not_modified.headers['ETag'] == etag
+    assert mismatch.status_code == 200
+    assert mismatch.content == resp.content
+    assert routes.endpoint_cache.get_stats()['misses'] == 1
+
+
+def test_query_parameters_get_their_own_entry(table_client):
+    client, routes = table_client
+    records = client.get('/year_table')
+    columns = client.get('/year_table', params={'layout': 'columns'})
+
+    assert records.headers['ETag'] != columns.headers['ETag']
+    assert client.get('/year_table', headers={'If-None-Match': records.headers['ETag']},
+                      params={'layout': 'columns'}).status_code == 200
+    assert routes.endpoint_cache.get_stats()['entries'] == 2
+
+
+def test_new_dataset_version_keeps_etag_of_unchanged_table(table_client, sample_workouts):
+    client, routes = table_client
+    etag = client.get('/year_table').headers['ETag']
+
+    routes.peloton.dataset = make_dataset(sample_workouts[:40], version=2)
+    unchanged = client.get('/year_table', headers={'If-None-Match': etag})
+    routes.peloton.dataset = make_dataset(sample_workouts, version=3)
+    changed = client.get('/year_table', headers={'If-None-Match': etag})
+
+    assert unchanged.status_code == 304
+    assert routes.endpoint_cache.get_stats()['misses'] == 3
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
@@ -0,0 +1,41 @@
+import io
+from pathlib import Path
+
+from PIL import Image
+
+from peloton.handlers import image_pipeline
+from peloton.handlers.image_pipeline import PelotonImagePipeline
+from peloton.handlers.sync_jobs import PelotonSyncJob
+from peloton.models import PelotonWorkoutData
+
+SAMPLE_DIR = Path(__file__).resolve().parent.parent.joinpath('data', 'workouts')
+
+
+def test_process_workouts_reports_progress(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_pipeline, 'WORKOUT_IMAGES_DIR', tmp_path.joinpath('workout_images'))
+    monkeypatch.setattr(image_pipeline, 'ACHIEVEMENT_IMAGES_DIR', tmp_path.joinpath('achievement_images'))
+    tmp_path.joinpath('workout_images').mkdir()
+    tmp_path.joinpath('achievement_images').mkdir()
+    workouts = [PelotonWorkoutData.model_validate_json(file.read_text()) for file in sorted(SAMPLE_DIR.glob('*.json'))]
+    failing_url = workouts[0].summary.ride.image_url
+
+    def fake_download_image(image_url: str) -> io.BytesIO | None:
+        if image_url == failing_url:
+            return None
+        image_bytes = io.BytesIO()
+        Image.new('RGB', (8, 8), 'red').save(image_bytes, format='PNG')
+        return image_bytes
+
+    monkeypatch.setattr(image_pipeline, 'download_image', fake_download_image)
+    pipeline = PelotonImagePipeline(manifest_file=tmp_path.joinpath('manifest.json'))
+    num_images = len(pipeline.make_jobs(workouts))
+    progress = PelotonSyncJob()
+    progress.start_stage('images')
+
+    counts = pipeline.process_workouts(workouts, progress)
+
+    stage = progress.snapshot().stages['images']
+    assert stage.total == stage.completed == num_images
+    assert counts['failed'] == 1
+    assert counts['downloaded'] + counts['deduplicated'] == num_images - 1
+    assert len(progress.warnings) == 1
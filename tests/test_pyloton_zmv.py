@@ -0,0 +1,284 @@
+''' `PylotonZMV` against a local stand-in for the Peloton API (no network access needed). '''
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from peloton.handlers import pyloton_zmv
+from peloton.handlers.pyloton_zmv import PelotonSessionIDToken, PylotonZMV
+from peloton.handlers.response_cache import PelotonResponseCache
+
+USER_ID = 'testuser'
+VALID_SESSION_ID = 'valid-session'
+
+
+class FakePelotonState():
+    ''' What the stand-in server serves, plus what it saw. '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.workout_ids: list[str] = []
+        self.scripted_statuses: dict[str, list[int]] = {}   # path -> statuses returned (in order) before the real response
+        self.blocked_workouts: dict[str, threading.Event] = {}   # workout_id -> summary held until the event is set
+        self.in_progress_workouts: set[str] = set()
+        self.request_delay = 0.0
+        self.logins = 0
+        self.listing_pages: list[int] = []
+        self.request_counts: dict[str, int] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+
+class FakePelotonHandler(BaseHTTPRequestHandler):
+    state: FakePelotonState
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict | None = None) -> None:
+        body = json.dumps(payload if payload is not None else {}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _next_scripted_status(self, path: str) -> int | None:
+        with self.state.lock:
+            self.state.request_counts[path] = self.state.request_counts.get(path, 0) + 1
+            statuses = self.state.scripted_statuses.get(path)
+            return statuses.pop(0) if statuses else None
+
+    def do_POST(self):
+        if self.path != '/auth/login':
+            return self._send_json(404)
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.state.lock:
+            self.state.logins += 1
+        self._send_json(200, {'session_id': VALID_SESSION_ID, 'user_id': USER_ID})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        status = self._next_scripted_status(url.path)
+        if status is not None:
+            return self._send_json(status)
+        if f"peloton_session_id={VALID_SESSION_ID}" not in self.headers.get('Cookie', ''):
+            return self._send_json(401)
+
+        if url.path == '/api/me':
+            return self._send_json(200, {'id': USER_ID, 'total_workouts': len(self.state.workout_ids)})
+
+        if url.path == f"/api/user/{USER_ID}/workouts":
+            query = parse_qs(url.query)
+            page, limit = int(query['page'][0]), int(query['limit'][0])
+            with self.state.lock:
+                self.state.listing_pages.append(page)
+            page_ids = self.state.workout_ids[page * limit:(page + 1) * limit]
+            return self._send_json(200, {'data': [{'id': workout_id} for workout_id in page_ids],
+                                         'total': len(self.state.workout_ids)})
+
+        if url.path.startswith('/api/workout/'):
+            workout_id = url.path.split('/')[3]
+            with self.state.lock:
+                self.state.in_flight += 1
+                self.state.max_in_flight = max(self.state.max_in_flight, self.state.in_flight)
+            try:
+                if url.path.endswith('/performance_graph'):
+                    payload = {'metrics': []}
+                else:
+                    blocked = self.state.blocked_workouts.get(workout_id)
+                    if blocked is not None:
+                        blocked.wait(timeout=5)
+                    payload = {'id': workout_id,
+                               'status': 'IN_PROGRESS' if workout_id in self.state.in_progress_workouts else 'COMPLETE'}
+                time.sleep(self.state.request_delay)
+            finally:
+                with self.state.lock:
+                    self.state.in_flight -= 1
+            return self._send_json(200, payload)
+
+        self._send_json(404)
+
+
+@pytest.fixture
+def fake_peloton():
+    state = FakePelotonState()
+    handler = type('BoundFakePelotonHandler', (FakePelotonHandler,), {'state': state})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    state.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_client(fake_peloton, monkeypatch):
+    ''' Builds clients whose stored session token is `session_id` (nothing is read from or written to disk). '''
+    monkeypatch.setattr(pyloton_zmv, 'backoff_delay', lambda attempt, retry_after=None: 0)
+    monkeypatch.setattr(PelotonSessionIDToken, 'write_token_to_json', lambda self, filename=None: None)
+
+    def _make_client(session_id: str = VALID_SESSION_ID, **kwargs) -> PylotonZMV:
+        monkeypatch.setattr(PelotonSessionIDToken, 'read_token_from_json',
+                            classmethod(lambda cls, filename=None: cls(session_id=session_id, user_id=USER_ID)))
+        kwargs.setdefault('requests_per_second', 0)
+        return PylotonZMV('username', 'password', base_url=fake_peloton.base_url, user_id=USER_ID, **kwargs)
+
+    return _make_client
+
+
+def test_get_workouts_by_ids_returns_every_workout(fake_peloton, make_client):
+    workout_ids = [f"workout{i:03d}" for i in range(25)]
+    client = make_client(max_concurrent_requests=4)
+
+    results = list(client.get_workouts_by_ids(workout_ids))
+
+    assert sorted(workout_id for workout_id, _, _ in results) == workout_ids
+    for workout_id, summary_raw, metrics_raw in results:
+        assert summary_raw['id'] == summary_raw['workout_id'] == workout_id
+        assert metrics_raw['workout_id'] == workout_id
+
+
+def test_get_workouts_by_ids_yields_in_completion_order(fake_peloton, make_client):
+    slow = threading.Event()
+    fake_peloton.blocked_workouts['slow'] = slow
+    client = make_client(max_concurrent_requests=3)
+
+    results = client.get_workouts_by_ids(['slow', 'fast1', 'fast2'])
+    first_two = {next(results)[0], next(results)[0]}
+    slow.set()
+
+    assert first_two == {'fast1', 'fast2'}
+    assert next(results)[0] == 'slow'
+    assert next(results, None) is None
+
+
+def test_get_workouts_by_ids_caps_concurrency(fake_peloton, make_client):
+    fake_peloton.request_delay = 0.02
+    client = make_client(max_concurrent_requests=3)
+
+    results = list(client.get_workouts_by_ids([f"workout{i:03d}" for i in range(20)]))
+
+    assert len(results) == 20
+    assert fake_peloton.max_in_flight == 3
+
+
+def test_get_workouts_by_ids_pulls_ids_lazily(fake_peloton, make_client):
+    pulled = []
+
+    def workout_ids():
+        for i in range(100):
+            pulled.append(i)
+            yield f"workout{i:03d}"
+
+    client = make_client(max_concurrent_requests=2)
+    results = client.get_workouts_by_ids(workout_ids())
+    next(results)
+
+    assert len(pulled) == 4   # two per worker are queued, not the whole backfill
+    results.close()
+
+
+@pytest.mark.parametrize('status', [429, 500, 502, 503, 504])
+def test_request_retries_on_transient_errors(fake_peloton, make_client, status):
+    fake_peloton.scripted_statuses['/api/me'] = [status, status]
+    client = make_client(max_retries=2)
+
+    assert client.get_user_id() == USER_ID
+    assert fake_peloton.request_counts['/api/me'] == 3
+    assert client.get_latency_stats()['me']['errors'] == 2
+
+
+def test_request_gives_up_after_max_retries(fake_peloton, make_client):
+    fake_peloton.scripted_statuses['/api/me'] = [503, 503, 503]
+    client = make_client(max_retries=2)
+
+    with pytest.raises(requests.HTTPError) as exc_info:
+        client.get_user_id()
+    assert exc_info.value.response.status_code == 503
+    assert fake_peloton.request_counts['/api/me'] == 3
+
+
+def test_request_does_not_retry_other_client_errors(fake_peloton, make_client):
+    fake_peloton.scripted_statuses['/api/me'] = [404]
+    client = make_client(max_retries=2)
+
+    with pytest.raises(requests.HTTPError):
+        client.get_user_id()
+    assert fake_peloton.request_counts['/api/me'] == 1
+
+
+def test_request_logs_in_again_on_401(fake_peloton, make_client):
+    client = make_client(session_id='expired-session')
+
+    assert client.get_user_id() == USER_ID
+    assert fake_peloton.logins == 1
+    assert fake_peloton.request_counts['/api/me'] == 2
+
+
+def test_request_logs_in_again_only_once(fake_peloton, make_client):
+    fake_peloton.scripted_statuses['/api/me'] = [401, 401]
+    client = make_client()
+
+    with pytest.raises(requests.HTTPError) as exc_info:
+        client.get_user_id()
+    assert exc_info.value.response.status_code == 401
+    assert fake_peloton.logins == 1
+    assert fake_peloton.request_counts['/api/me'] == 2
+
+
+def test_concurrent_401s_share_one_login(fake_peloton, make_client):
+    client = make_client(session_id='expired-session', max_concurrent_requests=4)
+
+    results = list(client.get_workouts_by_ids([f"workout{i:03d}" for i in range(8)]))
+
+    assert len(results) == 8
+    assert fake_peloton.logins == 1
+
+
+def test_unknown_workout_ids_stops_at_first_known_page(fake_peloton, make_client):
+    fake_peloton.workout_ids = [f"workout{i:03d}" for i in range(250)]
+    client = make_client()
+
+    new_ids = client.get_workout_ids(known_ids=set(fake_peloton.workout_ids[30:]))
+
+    assert new_ids == fake_peloton.workout_ids[:30]
+    assert fake_peloton.listing_pages == [0]
+
+
+def test_unknown_workout_ids_keeps_paging_past_a_gap(fake_peloton, make_client):
+    fake_peloton.workout_ids = [f"workout{i:03d}" for i in range(250)]
+    known_ids = set(fake_peloton.workout_ids[30:]) - {fake_peloton.workout_ids[70]}
+    client = make_client()
+
+    new_ids = client.get_workout_ids(known_ids=known_ids)
+
+    assert new_ids == fake_peloton.workout_ids[:30] + [fake_peloton.workout_ids[70]]
+    assert fake_peloton.listing_pages == [0, 1]
+
+
+def test_unknown_workout_ids_lists_everything_when_nothing_is_known(fake_peloton, make_client):
+    fake_peloton.workout_ids = [f"workout{i:03d}" for i in range(250)]
+    client = make_client()
+
+    assert client.get_workout_ids(known_ids=set()) == fake_peloton.workout_ids
+    assert fake_peloton.listing_pages == [0, 1, 2]
+
+
+def test_in_progress_workouts_are_not_cached(fake_peloton, make_client, tmp_path):
+    fake_peloton.in_progress_workouts.add('live')
+    client = make_client(response_cache=PelotonResponseCache(filename=tmp_path.joinpath('cache.sqlite3')))
+
+    for _ in range(2):
+        list(client.get_workouts_by_ids(['live', 'done']))
+
+    assert fake_peloton.request_counts['/api/workout/live'] == 2
+    assert fake_peloton.request_counts['/api/workout/live/performance_graph'] == 2
+    assert fake_peloton.request_counts['/api/workout/done'] == 1
+    assert fake_peloton.request_counts['/api/workout/done/performance_graph'] == 1
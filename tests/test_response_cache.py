@@ -0,0 +1,40 @@
+from peloton.handlers.response_cache import PelotonResponseCache
+
+
+def make_cache(tmp_path, max_bytes: int) -> PelotonResponseCache:
+    return PelotonResponseCache(filename=tmp_path.joinpath('cache.sqlite3'), max_bytes=max_bytes)
+
+
+def test_put_replaces_without_double_counting(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=1024 * 1024)
+    cache.put('url', 'instructor', b'a' * 1000)
+    first_size = cache.get_stats()['bytes']
+    cache.put('url', 'instructor', b'a' * 1000)
+
+    assert cache.get_stats()['bytes'] == first_size
+    assert cache.get_stats()['entries'] == 1
+
+
+def test_put_evicts_least_recently_used(tmp_path):
+    bodies = {f"url{i}": bytes(range(256)) * 4 for i in range(3)}
+    cache = make_cache(tmp_path, max_bytes=1024 * 1024)
+    for url, body in bodies.items():
+        cache.put(url, 'instructor', body)
+    entry_size = cache.get_stats()['bytes'] // 3
+    cache.max_bytes = entry_size * 3
+    cache.get('url0')   # now newer than url1
+
+    cache.put('url3', 'instructor', bodies['url0'])
+
+    assert cache.get('url1') is None
+    assert cache.get('url0') is not None
+    assert cache.get_stats()['bytes'] == entry_size * 3
+    assert cache.get_stats()['evicted'] == 1
+
+
+def test_total_survives_reopening(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=1024 * 1024)
+    cache.put('url', 'instructor', b'payload')
+    cache.put('url2', 'instructor', b'other payload')
+
+    assert make_cache(tmp_path, max_bytes=1024 * 1024).get_stats()['bytes'] == cache.get_stats()['bytes']
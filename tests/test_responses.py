@@ -0,0 +1,73 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from peloton.handlers.dataframe_builder import make_workouts_dataframe
+from peloton.helpers.responses import (NDJSON_MEDIA_TYPE, PelotonJSONResponse, PelotonNDJSONStreamingResponse,
+                                       dataframe_to_json_bytes)
+
+
+@pytest.fixture(scope='module')
+def processed_df(sample_workouts) -> pd.DataFrame:
+    ''' Datetimes, nulls, nested lists/dicts and non-ASCII text -- everything `/dataframe` sends. '''
+    df = make_workouts_dataframe(sample_workouts)
+    df.loc[::5, 'total_output'] = np.nan
+    df.loc[::3, 'title'] = '20 min Zürich Ride — Café'
+    return df
+
+
+def old_records(df: pd.DataFrame) -> list:
+    ''' What the routes sent before `PelotonJSONResponse`: `JSONResponse(json.loads(df.to_json(orient='records')))`. '''
+    return json.loads(JSONResponse(json.loads(df.to_json(orient='records'))).body)
+
+
+def test_records_match_old_encoding(processed_df):
+    resp = PelotonJSONResponse(processed_df)
+
+    assert resp.media_type == 'application/json'
+    assert json.loads(resp.body) == old_records(processed_df)
+    assert '20 min Zürich Ride — Café'.encode('utf-8') in resp.body
+
+
+def test_columns_layout_holds_the_same_records(processed_df):
+    content = json.loads(PelotonJSONResponse(processed_df, layout='columns').body)
+
+    assert content['columns'] == processed_df.columns.tolist()
+    assert [dict(zip(content['columns'], row)) for row in content['data']] == old_records(processed_df)
+
+
+def test_ndjson_layout_has_one_record_per_line(processed_df):
+    resp = PelotonJSONResponse(processed_df, layout='ndjson')
+
+    assert resp.media_type == NDJSON_MEDIA_TYPE
+    assert [json.loads(line) for line in resp.body.splitlines()] == old_records(processed_df)
+    assert dataframe_to_json_bytes(processed_df.iloc[:0], layout='ndjson') == b''
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 7, 60, 1000])
+def test_streamed_ndjson_matches_unstreamed(processed_df, chunk_rows):
+    chunks = list(PelotonNDJSONStreamingResponse._iter_chunks(processed_df, chunk_rows))
+
+    assert len(chunks) == -(-len(processed_df) // chunk_rows)
+    assert [json.loads(line) for line in b''.join(chunks).splitlines()] == old_records(processed_df)
+
+
+def test_models_match_fastapi_encoding(sample_workouts):
+    workout = sample_workouts[0]
+
+    assert json.loads(PelotonJSONResponse(workout).body) == jsonable_encoder(workout)
+
+
+def test_other_content_matches_json_response():
+    content = {'title': 'Café Ride', 'values': [1, 2.5, None], 'nested': {'ok': True}}
+
+    assert PelotonJSONResponse(content).body == JSONResponse(content).body
+
+
+def test_unknown_layout_raises_value_error(processed_df):
+    with pytest.raises(ValueError):
+        dataframe_to_json_bytes(processed_df, layout='split')
@@ -0,0 +1,66 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from peloton.handlers.dataframe_builder import make_workouts_dataframe
+from peloton.handlers.rollup_cube import GRAIN_FREQS, PelotonRollupCube
+
+
+@pytest.fixture(scope='module')
+def processed_df(sample_workouts) -> pd.DataFrame:
+    return make_workouts_dataframe(sample_workouts)
+
+
+@pytest.fixture(scope='module')
+def merged_cube(sample_workouts) -> PelotonRollupCube:
+    # the second batch overlaps the first one's days, so some cells get merged
+    return (PelotonRollupCube(make_workouts_dataframe(sample_workouts[::3]))
+            .with_new_rows(make_workouts_dataframe([workout for i, workout in enumerate(sample_workouts) if i % 3])))
+
+
+def test_merged_cells_match_rebuild(processed_df, merged_cube):
+    pd.testing.assert_frame_equal(merged_cube.cells, PelotonRollupCube(processed_df).cells)
+
+
+@pytest.mark.parametrize('grain', GRAIN_FREQS)
+@pytest.mark.parametrize('by', [(), ('fitness_discipline',), ('instructor_name', 'workout_type')])
+def test_merged_rollup_matches_rebuild(processed_df, merged_cube, grain, by):
+    pd.testing.assert_frame_equal(merged_cube.rollup(grain=grain, by=by),
+                                  PelotonRollupCube(processed_df).rollup(grain=grain, by=by))
+
+
+def test_merge_leaves_cube_untouched(sample_workouts):
+    cube = PelotonRollupCube(make_workouts_dataframe(sample_workouts[:30]))
+    cells = cube.cells.copy()
+
+    cube.with_new_rows(make_workouts_dataframe(sample_workouts[30:]))
+
+    pd.testing.assert_frame_equal(cube.cells, cells)
+
+
+def test_rollup_matches_workout_rows(processed_df):
+    cube = PelotonRollupCube(processed_df)
+
+    table = cube.rollup(grain='all', by=['fitness_discipline'], start=date(2024, 1, 1),
+                        filters={'workout_type': 'class'})
+
+    df = processed_df[(processed_df['start_time'].dt.date >= date(2024, 1, 1))
+                      & (processed_df['workout_type'] == 'class')]
+    expected = df.groupby('fitness_discipline').agg(rides=('workout_id', 'count'),
+                                                    total_miles=('distance', 'sum'))
+    assert len(table) > 1
+    assert table['fitness_discipline'].tolist() == expected.index.tolist()
+    assert table['rides'].tolist() == expected['rides'].tolist()
+    assert table['total_miles'].tolist() == expected['total_miles'].round(2).tolist()
+    assert table['days'].tolist() == (df.groupby('fitness_discipline')['start_time']
+                                      .agg(lambda start_times: start_times.dt.date.nunique()).tolist())
+
+
+def test_rollup_rejects_unknown_grain_and_dimension(processed_df):
+    cube = PelotonRollupCube(processed_df)
+
+    with pytest.raises(ValueError):
+        cube.rollup(grain='fortnight')
+    with pytest.raises(ValueError):
+        cube.rollup(by=['title'])
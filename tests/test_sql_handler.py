@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import pytest
+import sqlalchemy as db
+
+from peloton.handlers.sql_handler import PelotonSQL
+from peloton.models import PelotonWorkoutData
+
+SAMPLE_DIR = Path(__file__).resolve().parent.parent.joinpath('data', 'workouts')
+
+
+@pytest.fixture
+def peloton_sql(tmp_path) -> PelotonSQL:
+    return PelotonSQL(db.create_engine(f"sqlite:///{tmp_path.joinpath('peloton.db')}"))
+
+
+def dump_table(peloton_sql: PelotonSQL) -> list[tuple]:
+    with peloton_sql.sql_engine.connect() as conn:
+        return [tuple(row) for row in conn.execute(db.select(peloton_sql.peloton_table)
+                                                   .order_by(peloton_sql.peloton_table.c.workout_id))]
+
+
+def test_upsert_is_idempotent(peloton_sql, sample_workouts):
+    assert peloton_sql.upsert_workouts(sample_workouts, chunk_size=7) == len(sample_workouts)
+    rows = dump_table(peloton_sql)
+
+    assert peloton_sql.upsert_workouts(sample_workouts) == len(sample_workouts)
+    assert peloton_sql.upsert_workouts(sample_workouts[10:25], chunk_size=4) == 15
+
+    assert dump_table(peloton_sql) == rows
+    assert len(rows) == len(sample_workouts)
+    assert sorted(peloton_sql.get_workout_id_list()) == sorted(workout.workout_id for workout in sample_workouts)
+
+
+def test_upsert_overwrites_changed_workouts(peloton_sql, sample_workouts):
+    peloton_sql.upsert_workouts(sample_workouts)
+    workout = sample_workouts[3]
+    ride = workout.summary.ride.model_copy(update={'title': '45 min Retitled Ride'})
+    changed = workout.model_copy(update={'summary': workout.summary.model_copy(update={'ride': ride})})
+
+    peloton_sql.update_workout(changed)
+
+    assert peloton_sql.get_workout(workout.workout_id).summary.ride.title == '45 min Retitled Ride'
+    assert len(peloton_sql.get_workout_id_list()) == len(sample_workouts)
+
+
+def test_ingest_round_trips_without_metric_values(peloton_sql, sample_workouts):
+    peloton_sql.upsert_workouts(sample_workouts[::-1])
+
+    workouts = peloton_sql.ingest_workouts()
+
+    assert workouts == [workout.without_metric_values() for workout in sample_workouts]
+    assert peloton_sql.get_workout(sample_workouts[0].workout_id) == sample_workouts[0].without_metric_values()
+    assert peloton_sql.get_workout('f' * 32) is None
+
+
+def test_upsert_without_raw_payloads_keeps_stored_ones(peloton_sql):
+    file = sorted(SAMPLE_DIR.glob('*.json'))[0]
+    workout = PelotonWorkoutData.model_validate_json(file.read_text())
+    assert workout.has_raw_payloads
+
+    peloton_sql.upsert_workouts([workout])
+    peloton_sql.upsert_workouts([workout.without_raw_payloads()])
+
+    assert peloton_sql.get_raw_payloads([workout.workout_id]) == {
+        workout.workout_id: (workout.summary_raw, workout.metrics_raw)}
+    assert peloton_sql.get_workout(workout.workout_id).has_raw_payloads
+    assert not any(workout.has_raw_payloads for workout in peloton_sql.ingest_workouts())
+
+
+def test_add_instructor_is_idempotent(peloton_sql):
+    instructor = {'instructor_id': 'a' * 32, 'name': 'Denis Morton'}
+
+    peloton_sql.add_instructor(instructor)
+    peloton_sql.add_instructor(instructor)
+    peloton_sql.add_instructor({**instructor, 'name': 'Denis M.'})
+
+    assert peloton_sql.get_instructor('a' * 32) == {**instructor, 'name': 'Denis M.'}
+    with peloton_sql.sql_engine.connect() as conn:
+        assert conn.execute(db.select(db.func.count()).select_from(peloton_sql.instructors_table)).scalar() == 1
@@ -0,0 +1,89 @@
+from datetime import date, timedelta
+
+import pytest
+
+from peloton.handlers.chart_maker import DayTotals
+from peloton.handlers.stats_index import PelotonStatsIndex
+
+FIRST_DAY = date(2023, 11, 27)
+# active stretches separated by gaps of a few days (streak continues) up to several weeks (streak breaks)
+GAPS = [1, 1, 2, 5, 1, 9, 3, 1, 1, 16, 2, 8, 1, 1, 1, 30, 4, 6, 1, 2]
+
+
+def make_daily_totals() -> dict[date, DayTotals]:
+    daily_totals = {}
+    day = FIRST_DAY
+    for i in range(120):
+        daily_totals[day] = DayTotals(workouts=1 + i % 3, duration=600 * (1 + i % 4),
+                                      calories=150.5 * (1 + i % 2), strive_score=12.25 * (i % 5))
+        day += timedelta(days=GAPS[i % len(GAPS)])
+    return daily_totals
+
+
+def loop_window_totals(daily_totals: dict[date, DayTotals], start_date: date, end_date: date) -> dict:
+    ''' The day-by-day loop `make_stats_summary` used before the stats index. '''
+    days = [daily_totals[day] for day in (start_date + timedelta(days=x) for x in range((end_date - start_date).days + 1))
+            if day in daily_totals]
+    totals = sum(days, start=DayTotals())
+    return {'workouts': totals.workouts, 'duration': totals.duration, 'calories': totals.calories,
+            'strive_score': totals.strive_score, 'workout_days': len(days)}
+
+
+def loop_weekly_streak(daily_totals: dict[date, DayTotals], end_date: date) -> int:
+    ''' The week-by-week loop `make_stats_summary` used before the stats index. '''
+    active_weekly_streak = 0
+    last_monday = (end_date - timedelta(days=end_date.weekday()))
+    test_date = last_monday
+    while True:
+        if any((test_date + timedelta(days=x)) in daily_totals for x in range(8)):
+            active_weekly_streak += 1
+            test_date = test_date - timedelta(weeks=1)
+        elif test_date == last_monday:
+            test_date = test_date - timedelta(weeks=1)
+        else:
+            break
+    return active_weekly_streak
+
+
+@pytest.fixture(scope='module')
+def daily_totals() -> dict[date, DayTotals]:
+    return make_daily_totals()
+
+
+@pytest.fixture(scope='module')
+def stats_index(daily_totals) -> PelotonStatsIndex:
+    return PelotonStatsIndex(daily_totals)
+
+
+def end_dates(daily_totals: dict[date, DayTotals]) -> list[date]:
+    ''' Every day from two weeks before the first workout to three weeks after the last one. '''
+    first_day, last_day = min(daily_totals), max(daily_totals)
+    return [first_day + timedelta(days=x) for x in range(-14, (last_day - first_day).days + 22)]
+
+
+def test_window_totals_match_loop(daily_totals, stats_index):
+    for end_date in end_dates(daily_totals):
+        start_date = end_date - timedelta(days=30)
+        assert stats_index.window_totals(start_date, end_date) == pytest.approx(
+            loop_window_totals(daily_totals, start_date, end_date)), end_date
+
+
+def test_weekly_streak_matches_loop(daily_totals, stats_index):
+    streaks = [stats_index.active_weekly_streak(end_date) for end_date in end_dates(daily_totals)]
+
+    assert streaks == [loop_weekly_streak(daily_totals, end_date) for end_date in end_dates(daily_totals)]
+    assert max(streaks) > 3
+
+
+def test_is_active(daily_totals, stats_index):
+    for day in end_dates(daily_totals):
+        assert stats_index.is_active(day) == (day in daily_totals)
+
+
+def test_empty_history():
+    stats_index = PelotonStatsIndex({})
+
+    assert stats_index.window_totals(date(2024, 1, 1), date(2024, 1, 31)) == loop_window_totals(
+        {}, date(2024, 1, 1), date(2024, 1, 31))
+    assert stats_index.active_weekly_streak(date(2024, 1, 31)) == 0
+    assert not stats_index.is_active(date(2024, 1, 1))
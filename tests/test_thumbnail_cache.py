@@ -0,0 +1,50 @@
+import os
+
+from PIL import Image
+
+from peloton.handlers.thumbnail_cache import PelotonThumbnailCache
+
+
+def make_image(path, color: str, size: tuple[int, int] = (400, 200)):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new('RGB', size, color).save(path, format='PNG')
+    return path
+
+
+def test_deleted_thumbnail_is_regenerated(tmp_path):
+    image_path = make_image(tmp_path.joinpath('images', 'workout.png'), 'red')
+    cache = PelotonThumbnailCache(cache_dir=tmp_path.joinpath('thumbs'), max_bytes=1024 * 1024)
+    thumb_path = cache.get_thumbnail(image_path, width=100)
+    size = thumb_path.stat().st_size
+    thumb_path.unlink()
+
+    assert cache.get_thumbnail(image_path, width=100) == thumb_path
+    assert thumb_path.is_file()
+    assert cache._total_bytes == size
+
+
+def test_same_filename_in_different_directories(tmp_path):
+    red_path = make_image(tmp_path.joinpath('a', 'workout.png'), 'red')
+    blue_path = make_image(tmp_path.joinpath('b', 'workout.png'), 'blue')
+    cache = PelotonThumbnailCache(cache_dir=tmp_path.joinpath('thumbs'), max_bytes=1024 * 1024)
+
+    red_thumb = cache.get_thumbnail(red_path, width=100)
+    blue_thumb = cache.get_thumbnail(blue_path, width=100)
+
+    assert red_thumb != blue_thumb
+    assert Image.open(red_thumb).getpixel((0, 0)) == (255, 0, 0)
+    assert Image.open(blue_thumb).getpixel((0, 0)) == (0, 0, 255)
+
+
+def test_replaced_source_gets_a_new_thumbnail(tmp_path):
+    image_path = make_image(tmp_path.joinpath('images', 'workout.png'), 'red')
+    cache = PelotonThumbnailCache(cache_dir=tmp_path.joinpath('thumbs'), max_bytes=1024 * 1024)
+    old_thumb = cache.get_thumbnail(image_path, width=100)
+
+    make_image(image_path, 'blue')
+    stat = image_path.stat()
+    os.utime(image_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    new_thumb = cache.get_thumbnail(image_path, width=100)
+
+    assert new_thumb != old_thumb
+    assert Image.open(new_thumb).getpixel((0, 0)) == (0, 0, 255)
@@ -0,0 +1,61 @@
+import numpy as np
+
+from peloton.handlers.workout_index import PelotonWorkoutIndex
+
+
+def workout_ids(workouts) -> list[str]:
+    return [workout.workout_id for workout in workouts]
+
+
+def assert_same_index(index: PelotonWorkoutIndex, expected: PelotonWorkoutIndex) -> None:
+    assert workout_ids(index.sorted_workouts) == workout_ids(expected.sorted_workouts)
+    assert workout_ids(index.newest_first) == workout_ids(expected.newest_first)
+    np.testing.assert_array_equal(index.start_times, expected.start_times)
+    assert dict(index.by_id) == dict(expected.by_id)
+
+
+def test_with_new_workouts_matches_full_index(sample_workouts):
+    old_workouts, new_workouts = sample_workouts[1::2], sample_workouts[::2][::-1]     # unsorted batch
+
+    index = PelotonWorkoutIndex(old_workouts).with_new_workouts(new_workouts)
+
+    assert_same_index(index, PelotonWorkoutIndex(sample_workouts))
+    assert workout_ids(index.sorted_workouts) == workout_ids(sample_workouts)
+    assert len(index) == len(sample_workouts)
+
+
+def test_with_new_workouts_after_and_before_everything(sample_workouts):
+    middle = PelotonWorkoutIndex(sample_workouts[20:40])
+
+    index = middle.with_new_workouts(sample_workouts[40:]).with_new_workouts(sample_workouts[:20])
+
+    assert_same_index(index, PelotonWorkoutIndex(sample_workouts))
+
+
+def test_with_new_workouts_leaves_index_untouched(sample_workouts):
+    index = PelotonWorkoutIndex(sample_workouts[:30])
+
+    new_index = index.with_new_workouts(sample_workouts[30:])
+
+    assert_same_index(index, PelotonWorkoutIndex(sample_workouts[:30]))
+    assert sample_workouts[45].workout_id in new_index
+    assert sample_workouts[45].workout_id not in index
+    assert index.get(sample_workouts[45].workout_id) is None
+
+
+def test_ties_keep_arrival_order(sample_workouts):
+    start_time = sample_workouts[0].summary.start_time
+    tied = [workout.model_copy(update={'summary': workout.summary.model_copy(update={'start_time': start_time})})
+            for workout in sample_workouts[:4]]
+
+    index = PelotonWorkoutIndex(tied[:2]).with_new_workouts(tied[2:])
+
+    assert workout_ids(index.sorted_workouts) == workout_ids(tied)
+    assert workout_ids(PelotonWorkoutIndex(tied).sorted_workouts) == workout_ids(tied)
+
+
+def test_with_no_new_workouts(sample_workouts):
+    index = PelotonWorkoutIndex(sample_workouts)
+
+    assert_same_index(index.with_new_workouts([]), index)
+    assert_same_index(PelotonWorkoutIndex().with_new_workouts(sample_workouts), index)